@@ -1,8 +1,12 @@
 # server\app.py
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
-from utils.read_transcript_from_yt import get_transcript
-from controllers.analysis_controller import hand_analysis
+from config import settings
+from utils.transcript_cache import get_cached_transcript
+from controllers.analysis_controller import hand_analysis, hand_analysis_batch
+from utils.job_ledger import JobLedger
+from utils.warmup import readiness
+import json
 import logging
 
 # Configure logging
@@ -26,6 +30,12 @@ def home():
         "status": "running"
     })
 
+@app.route('/api/ready')
+def ready_route():
+    """Readiness probe: 200 once this worker has finished warming up, 503 until then"""
+    status = readiness()
+    return jsonify(status), 200 if status['ready'] else 503
+
 @app.route('/api/transcript', methods=['GET'])
 def transcript_route():
     url = request.args.get('url')
@@ -34,7 +44,25 @@ def transcript_route():
             "status": "error",
             "message": "URL parameter is required"
         }), 400
-    return get_transcript(url)
+    result = get_cached_transcript(url=url)
+    if not result['success']:
+        return result
+
+    # Transcripts never change once published, so clients can revalidate cheaply
+    resp = jsonify(result)
+    resp.set_etag(result['etag'])
+    return resp.make_conditional(request)
+
+def parse_num_results():
+    try:
+        num_results = int(request.args.get('numResults', 5))
+        if num_results < 1 or num_results > 20:  # Set reasonable limits
+            num_results = 5
+            logger.warning(f"Invalid numResults value, defaulting to 5")
+    except (TypeError, ValueError):
+        num_results = 5
+        logger.warning(f"Invalid numResults format, defaulting to 5")
+    return num_results
 
 @app.route('/api/analyze', methods=['POST'])
 def transcript_analysis_route():
@@ -47,14 +75,7 @@ def transcript_analysis_route():
             "message": "userInput parameter is required"
         }), 400
         
-    try:
-        num_results = int(request.args.get('numResults', 5))
-        if num_results < 1 or num_results > 20:  # Set reasonable limits
-            num_results = 5
-            logger.warning(f"Invalid numResults value, defaulting to 5")
-    except (TypeError, ValueError):
-        num_results = 5
-        logger.warning(f"Invalid numResults format, defaulting to 5")
+    num_results = parse_num_results()
 
     try:
         resp = hand_analysis(query, num_results)
@@ -66,5 +87,82 @@ def transcript_analysis_route():
             "message": "An error occurred during analysis"
         }), 500
 
+@app.route('/api/analyze/batch', methods=['POST'])
+def batch_analysis_route():
+    """Streams one JSON object per line (NDJSON) as each query's analysis completes"""
+    data = request.get_json(silent=True) or {}
+    queries = data.get('queries')
+    if not isinstance(queries, list) or not queries or not all(isinstance(q, str) and q for q in queries):
+        return jsonify({
+            "status": "error",
+            "message": "queries must be a non-empty list of strings"
+        }), 400
+    if len(queries) > settings.BATCH_MAX_QUERIES:
+        return jsonify({
+            "status": "error",
+            "message": f"At most {settings.BATCH_MAX_QUERIES} queries per batch"
+        }), 400
+
+    num_results = parse_num_results()
+    logger.debug(f"Received batch of {len(queries)} queries")
+
+    def generate():
+        try:
+            for result in hand_analysis_batch(queries, num_results):
+                yield json.dumps(result) + "\n"
+        except Exception as e:
+            logger.error(f"Error in batch hand analysis: {str(e)}", exc_info=True)
+            yield json.dumps({
+                "status": "error",
+                "result": "An error occurred during analysis"
+            }) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/api/ingest', methods=['POST'])
+def ingest_route():
+    """Queue a video for background extraction + embedding; returns a job id to poll"""
+    data = request.get_json(silent=True) or {}
+    url = data.get('url')
+    if not url:
+        return jsonify({
+            "status": "error",
+            "message": "url is required"
+        }), 400
+
+    try:
+        job = JobLedger().submit(url)
+    except Exception as e:
+        logger.error(f"Error queueing ingest job: {str(e)}", exc_info=True)
+        return jsonify({
+            "status": "error",
+            "message": "Unable to queue video for ingestion"
+        }), 500
+    if job is None:
+        return jsonify({
+            "status": "error",
+            "message": "No valid video ID found"
+        }), 400
+
+    return jsonify({"status": "success", **job}), 202
+
+@app.route('/api/ingest/<int:job_id>', methods=['GET'])
+def ingest_status_route(job_id):
+    try:
+        job = JobLedger().get_job(job_id)
+    except Exception as e:
+        logger.error(f"Error reading ingest job {job_id}: {str(e)}", exc_info=True)
+        return jsonify({
+            "status": "error",
+            "message": "Unable to read ingest job"
+        }), 500
+    if job is None:
+        return jsonify({
+            "status": "error",
+            "message": "Job not found"
+        }), 404
+
+    return jsonify({"status": "success", **job})
+
 if __name__ == '__main__':
     app.run("0.0.0.0", debug=True)
\ No newline at end of file
@@ -0,0 +1,77 @@
+"""
+Compare loading hand_embeddings through pgvector's text form with the binary
+COPY loader in utils/embedding_loader.py.
+
+    python benchmarks/embedding_load.py
+    python benchmarks/embedding_load.py --types hybrid_situation --text-limit 5000
+
+The text path is timed on at most --text-limit rows (it's slow) and
+extrapolated; both paths are checked to produce the same vectors.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(SERVER_DIR)
+
+from config.db import get_db_connection
+from utils.embedding_loader import load_embeddings
+
+
+def load_text(conn, embedding_types, limit: int):
+    """The old way: fetch embedding::text and parse each vector through Python floats"""
+    with conn.cursor() as cur:
+        where = "WHERE embedding_type = ANY(%s)" if embedding_types else ""
+        params = [list(embedding_types)] if embedding_types else []
+        cur.execute(f"""
+            SELECT id, embedding::text FROM hand_embeddings {where}
+            ORDER BY id LIMIT %s
+        """, params + [limit])
+        rows = cur.fetchall()
+    ids = np.array([row[0] for row in rows], dtype=np.int64)
+    matrix = np.array([json.loads(row[1]) for row in rows], dtype=np.float32)
+    return ids, matrix
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark bulk loading of hand_embeddings")
+    parser.add_argument('--types', nargs='*', help="embedding types to load (default: all)")
+    parser.add_argument('--text-limit', type=int, default=20000)
+    args = parser.parse_args()
+
+    conn = get_db_connection()
+    try:
+        start = time.perf_counter()
+        embeddings = load_embeddings(conn, embedding_types=args.types)
+        binary_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        text_ids, text_matrix = load_text(conn, args.types, args.text_limit)
+        text_seconds = time.perf_counter() - start
+        conn.commit()
+    finally:
+        conn.close()
+
+    rows = len(embeddings)
+    if len(text_ids) == 0:
+        print("No embeddings to load")
+        return
+    matches = np.array_equal(embeddings.ids[:len(text_ids)], text_ids) and np.allclose(
+        embeddings.matrix[:len(text_ids)], text_matrix
+    )
+    text_estimate = text_seconds / len(text_ids) * rows
+    print(f"binary COPY: {rows} rows x {embeddings.dimensions} in {binary_seconds:.2f}s "
+          f"({rows / max(binary_seconds, 1e-9):,.0f} rows/s)")
+    print(f"text:        {len(text_ids)} rows in {text_seconds:.2f}s, ~{text_estimate:.1f}s for all rows "
+          f"({text_estimate / max(binary_seconds, 1e-9):.1f}x slower)")
+    print(f"vectors match: {matches}")
+    sys.exit(0 if matches else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+Worker startup guard: how long importing the app takes, and which heavy
+packages it drags in.
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --module controllers.analysis_controller --max-ms 800
+
+Runs `python -X importtime -c "import <module>"` a few times and reports the
+median cumulative import time and the slowest top-level imports. Exits 1 if
+the median exceeds --max-ms or if any --forbid package is imported at all;
+provider SDKs and data-science libraries belong behind lazy imports.
+"""
+import os
+import re
+import sys
+import argparse
+import statistics
+import subprocess
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Packages a gunicorn worker must not import at boot
+DEFAULT_FORBIDDEN = ['anthropic', 'voyageai', 'sklearn', 'pandas', 'sqlalchemy']
+
+LINE_PATTERN = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$')
+
+
+def import_profile(module: str):
+    """[(package, self_us, cumulative_us, depth)] from one fresh interpreter"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=SERVER_DIR, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        sys.exit(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+    rows = []
+    for line in result.stderr.splitlines():
+        match = LINE_PATTERN.match(line)
+        if match:
+            self_us, cumulative_us, indent, package = match.groups()
+            # importtime indents nested imports by two spaces per level
+            rows.append((package, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return rows
+
+
+def module_subtree(rows, module: str):
+    """
+    Rows imported on behalf of module. importtime prints children before their
+    parent, so they are the nested rows directly above the module's own row.
+    """
+    index = next(i for i, row in enumerate(rows) if row[0] == module)
+    start = index
+    while start > 0 and rows[start - 1][3] > 0:
+        start -= 1
+    return rows[start:index + 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time benchmark for worker startup")
+    parser.add_argument('--module', default='app', help="module a worker imports (default: app)")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--max-ms', type=float, default=float(os.environ.get('IMPORT_BUDGET_MS', 2000)),
+                        help="fail if the median import time exceeds this (default $IMPORT_BUDGET_MS or 2000)")
+    parser.add_argument('--forbid', nargs='*', default=DEFAULT_FORBIDDEN,
+                        help="top-level packages that must not be imported")
+    parser.add_argument('--top', type=int, default=15)
+    args = parser.parse_args()
+
+    # The first run also compiles .pyc files; it isn't counted
+    import_profile(args.module)
+    profiles = [import_profile(args.module) for _ in range(args.runs)]
+
+    totals = [
+        next(cumulative for package, _, cumulative, _ in profile if package == args.module)
+        for profile in profiles
+    ]
+    median_ms = statistics.median(totals) / 1000
+
+    # Slowest direct imports of the module, from the median run
+    median_profile = profiles[totals.index(sorted(totals)[len(totals) // 2])]
+    subtree = module_subtree(median_profile, args.module)
+    imported = {package.split('.')[0] for package, _, _, _ in subtree}
+    top_level = sorted(
+        (row for row in subtree if row[3] == 1),
+        key=lambda row: row[2], reverse=True
+    )
+
+    print(f"import {args.module}: median {median_ms:.1f} ms over {args.runs} runs "
+          f"(min {min(totals) / 1000:.1f}, max {max(totals) / 1000:.1f})")
+    print(f"{'cumulative ms':>14}  package")
+    for package, _, cumulative, _ in top_level[:args.top]:
+        print(f"{cumulative / 1000:14.1f}  {package}")
+
+    failures = []
+    forbidden = sorted(set(args.forbid) & imported)
+    if forbidden:
+        failures.append(f"imports {', '.join(forbidden)} at startup")
+    if median_ms > args.max_ms:
+        failures.append(f"median {median_ms:.1f} ms exceeds budget {args.max_ms:.0f} ms")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
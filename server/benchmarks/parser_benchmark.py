@@ -0,0 +1,89 @@
+"""
+Correctness check and microbenchmark for HandQueryParser.
+
+    python benchmarks/parser_benchmark.py
+    python benchmarks/parser_benchmark.py --baseline <git ref>
+
+Every query in parser_corpus.json must parse to its 'expected' output;
+entries with a 'legacy' output document where the compiled parser
+deliberately differs from the original substring scan. With --baseline,
+the parser at that git ref is timed on the same corpus for comparison.
+Timings depend on the machine and Python version; compare runs made on the
+same host rather than quoting a fixed speedup.
+"""
+import os
+import sys
+import json
+import types
+import timeit
+import argparse
+import subprocess
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(SERVER_DIR)
+
+from utils.hand_query_parser import HandQueryParser
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'parser_corpus.json')
+
+
+def load_baseline(ref: str):
+    """HandQueryParser class as of a git ref, loaded without touching the working tree"""
+    source = subprocess.check_output(
+        ['git', 'show', f'{ref}:./utils/hand_query_parser.py'],
+        cwd=SERVER_DIR
+    ).decode('utf-8')
+    module = types.ModuleType('baseline_hand_query_parser')
+    exec(compile(source, f'{ref}:hand_query_parser.py', 'exec'), module.__dict__)
+    return module.HandQueryParser
+
+
+def check_corpus(parser, corpus) -> int:
+    failures = 0
+    for entry in corpus:
+        parsed = parser.parse_query(entry['query'])
+        if parsed != entry['expected']:
+            failures += 1
+            print(f"MISMATCH: {entry['query']!r}\n  expected {entry['expected']}\n  got      {parsed}")
+    changed = sum('legacy' in entry for entry in corpus)
+    print(f"Corpus: {len(corpus) - failures}/{len(corpus)} match ({changed} intentional changes from legacy)")
+    return failures
+
+
+def time_parser(label: str, parser, queries, repeat: int) -> float:
+    """Prints per-query timings; returns the parse_query time in seconds"""
+    per_query = min(timeit.repeat(
+        lambda: [parser.parse_query(query) for query in queries],
+        number=1, repeat=repeat
+    )) / len(queries)
+    print(f"{label:>10} parse_query: {per_query * 1e6:8.2f} us/query")
+    if hasattr(parser, 'parse_many'):
+        batch = queries * 20
+        per_batch_query = min(timeit.repeat(lambda: parser.parse_many(batch), number=1, repeat=repeat)) / len(batch)
+        print(f"{label:>10} parse_many:  {per_batch_query * 1e6:8.2f} us/query")
+    return per_query
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="HandQueryParser correctness corpus and microbenchmark")
+    arg_parser.add_argument('--baseline', help="git ref of a parser to time against, e.g. HEAD~1")
+    arg_parser.add_argument('--repeat', type=int, default=50)
+    args = arg_parser.parse_args()
+
+    with open(CORPUS_PATH, encoding='utf-8') as f:
+        corpus = json.load(f)
+    queries = [entry['query'] for entry in corpus]
+
+    parser = HandQueryParser()
+    failures = check_corpus(parser, corpus)
+
+    current = time_parser('current', parser, queries, args.repeat)
+    if args.baseline:
+        baseline = time_parser(args.baseline, load_baseline(args.baseline)(), queries, args.repeat)
+        print(f"parse_query vs {args.baseline}: {baseline / current:.2f}x on this host")
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+"""
+Retrieval quality per stored embedding type and query chunk, to decide which
+types ingestion should compute (settings.EMBEDDING_PLAN).
+
+    python benchmarks/retrieval_eval.py --queries labelled.json
+    python benchmarks/retrieval_eval.py --silver 300 --save-silver silver.json
+    python benchmarks/retrieval_eval.py --silver 300 --types hybrid_situation street_based_context
+
+A labelled query set is a JSON list of
+    {"query": "...", "relevant": {"<hand id>": grade, ...}}
+with grade 2 for a close match and 1 for a related hand. --silver builds one
+from the corpus instead: a query is written from a sampled hand's cards,
+stakes and preflop action; hands with the same starting-hand class are
+relevant (grade 2 if the stakes match too). The sampled hand itself is
+excluded from the results.
+
+Every stored type of one embedding version (the active one unless
+--version picks e.g. a version being built) is searched exactly (cosine,
+in memory) with every query chunk embedded by that version's model, so
+this measures the embeddings, not the ANN index. Reports
+recall@k (relevant hands found / min(k, relevant hands)) and nDCG@k.
+"""
+import os
+import sys
+import json
+import math
+import random
+import argparse
+from collections import defaultdict
+
+import numpy as np
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(SERVER_DIR)
+
+from config import settings
+from config.db import get_db_connection
+from data.pwds import Pwds
+from utils.card_features import hand_class_index, parse_cards
+from utils.embedding_loader import load_embeddings
+from utils.embedding_plan import embedding_plan
+from utils.embedding_versions import fetch_active_version, get_version
+from utils.preflop_grid import normalize_stakes
+from utils.query_embedding_processor import QueryEmbeddingProcessor
+
+
+def silver_queries(conn, count: int, seed: int):
+    """Queries written from sampled hands, labelled by starting-hand class and stakes"""
+    with conn.cursor() as cur:
+        cur.execute("SELECT id, caller_cards, stakes, preflop_action FROM transcript_analysis")
+        hands = cur.fetchall()
+
+    by_class = defaultdict(list)
+    info = {}
+    for hand_id, cards, stakes, preflop_action in hands:
+        hand_class = hand_class_index(parse_cards(cards)[:2])
+        if hand_class < 0:
+            continue
+        stakes = normalize_stakes(stakes) if stakes else None
+        info[hand_id] = (hand_class, stakes, cards, preflop_action)
+        by_class[hand_class].append(hand_id)
+
+    # Only hands that have at least one other hand of the same class
+    candidates = sorted(hand_id for hand_id, (hand_class, *_) in info.items() if len(by_class[hand_class]) > 1)
+    random.Random(seed).shuffle(candidates)
+    queries = []
+    for hand_id in candidates[:count]:
+        hand_class, stakes, cards, preflop_action = info[hand_id]
+        query = f"I have {cards}"
+        if stakes:
+            query += f" at {stakes}"
+        if preflop_action:
+            query += f". Preflop: {preflop_action}"
+        relevant = {
+            str(other): 2 if stakes and info[other][1] == stakes else 1
+            for other in by_class[hand_class] if other != hand_id
+        }
+        queries.append({'query': query, 'relevant': relevant, 'exclude': [hand_id]})
+    return queries
+
+
+def ranked_hands(scores: np.ndarray, hand_ids: np.ndarray, exclude, k: int):
+    """Top-k distinct hand ids by score"""
+    order = np.argsort(-scores, kind='stable')
+    ranked = []
+    for index in order:
+        hand_id = int(hand_ids[index])
+        if hand_id in exclude or hand_id in ranked:
+            continue
+        ranked.append(hand_id)
+        if len(ranked) == k:
+            break
+    return ranked
+
+
+def recall_at_k(ranked, relevant, k: int) -> float:
+    if not relevant:
+        return 0.0
+    found = sum(1 for hand_id in ranked[:k] if str(hand_id) in relevant)
+    return found / min(k, len(relevant))
+
+
+def ndcg_at_k(ranked, relevant, k: int) -> float:
+    dcg = sum(
+        (2 ** relevant.get(str(hand_id), 0) - 1) / math.log2(position + 2)
+        for position, hand_id in enumerate(ranked[:k])
+    )
+    ideal = sorted(relevant.values(), reverse=True)[:k]
+    idcg = sum((2 ** grade - 1) / math.log2(position + 2) for position, grade in enumerate(ideal))
+    return dcg / idcg if idcg else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate retrieval per embedding type and query chunk")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--queries', help="labelled query set (JSON)")
+    source.add_argument('--silver', type=int, help="build this many labelled queries from the corpus")
+    parser.add_argument('--save-silver', help="write the generated query set here")
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--types', nargs='+', help="stored embedding types to evaluate (default: all stored)")
+    parser.add_argument('--k', type=int, nargs='+', default=[5, 10])
+    parser.add_argument('--version', type=int,
+                        help="embedding version to evaluate, e.g. one being built (default: the active one)")
+    parser.add_argument('--json', help="also write the results table here")
+    args = parser.parse_args()
+
+    conn = get_db_connection()
+    try:
+        if args.queries:
+            with open(args.queries, encoding='utf-8') as f:
+                queries = json.load(f)
+        else:
+            queries = silver_queries(conn, args.silver, args.seed)
+            if args.save_silver:
+                with open(args.save_silver, 'w', encoding='utf-8') as f:
+                    json.dump(queries, f, indent=2)
+        with conn.cursor() as cur:
+            version = fetch_active_version(cur) if args.version is None else get_version(cur, args.version)
+            if version is None:
+                raise ValueError(f"No embedding version {args.version}")
+            types = args.types
+            if types is None:
+                cur.execute(
+                    "SELECT DISTINCT embedding_type FROM hand_embeddings WHERE embedding_version = %s ORDER BY 1",
+                    (version['id'],)
+                )
+                types = [row[0] for row in cur.fetchall()]
+        stored = {
+            embedding_type: load_embeddings(conn, embedding_types=[embedding_type], embedding_version=version['id'])
+            for embedding_type in types
+        }
+        conn.commit()
+    finally:
+        conn.close()
+    print(f"{len(queries)} queries, {len(types)} stored types, embedding version {version['id']} ({version['model']})")
+
+    processor = QueryEmbeddingProcessor(api_key=Pwds.VOYAGE_AI_API_KEY)
+    query_embeddings = processor.embed_queries([q['query'] for q in queries], model=version['model'])
+    chunk_types = sorted({chunk for embeddings in query_embeddings if embeddings for chunk in embeddings})
+
+    max_k = max(args.k)
+    results = []
+    for embedding_type, matrix in stored.items():
+        if len(matrix) == 0:
+            continue
+        unit = matrix.unit()
+        for chunk_type in chunk_types:
+            metrics = defaultdict(list)
+            for query, embeddings in zip(queries, query_embeddings):
+                vector = (embeddings or {}).get(chunk_type)
+                if not vector:
+                    continue
+                vector = np.asarray(vector, dtype=np.float32)
+                scores = unit @ (vector / (np.linalg.norm(vector) or 1))
+                ranked = ranked_hands(scores, matrix.hand_ids, set(query.get('exclude', [])), max_k)
+                for k in args.k:
+                    metrics[f'recall@{k}'].append(recall_at_k(ranked, query['relevant'], k))
+                    metrics[f'ndcg@{k}'].append(ndcg_at_k(ranked, query['relevant'], k))
+            if metrics:
+                results.append({
+                    'embedding_type': embedding_type,
+                    'query_chunk': chunk_type,
+                    'queries': len(metrics[f'ndcg@{max_k}']),
+                    **{name: float(np.mean(values)) for name, values in metrics.items()},
+                })
+
+    sort_key = f'ndcg@{max_k}'
+    results.sort(key=lambda row: row[sort_key], reverse=True)
+    columns = [f'{metric}@{k}' for k in args.k for metric in ('recall', 'ndcg')]
+    print(f"{'embedding type':<32} {'query chunk':<18} " + ' '.join(f'{c:>10}' for c in columns))
+    for row in results:
+        marker = '*' if row['embedding_type'] == settings.SEARCH_EMBEDDING_TYPE and row['query_chunk'] == 'situation' else ' '
+        print(f"{row['embedding_type']:<32}{marker}{row['query_chunk']:<18} "
+              + ' '.join(f"{row[c]:>10.3f}" for c in columns))
+    print("* = the pair the query path uses today")
+    print(f"Current EMBEDDING_PLAN: {','.join(embedding_plan())}")
+    if results:
+        print(f"Best by {sort_key}: {results[0]['embedding_type']} with the {results[0]['query_chunk']} chunk")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,32 +1,117 @@
 import os
+import threading
 import psycopg2
+from psycopg2 import pool as pg_pool
 from urllib.parse import urlparse
 
 import logging
 
+from config import settings
+
 # Configure logging
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# One pool per process; a forked worker must not reuse its parent's sockets
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
 
 
-def get_db_connection():
+def _connect_params() -> dict:
     if 'DB_PASSWORD' in os.environ:
-        pwd = os.environ['DB_PASSWORD']
-        conn = psycopg2.connect(
+        return dict(
             host="localhost",
             database="clp",
             user="postgres",
-            password=pwd,
+            password=os.environ['DB_PASSWORD'],
             port="5432"
         )
-    else:
-        # Local development
-        from data.pwds import Pwds
-        conn = psycopg2.connect(
-            host=Pwds.pg_host,
-            database="clp",
-            user="postgres",
-            password=Pwds.pg_pwd,
-            port="5432",
-            client_encoding="utf-8"
-        )
-    return conn
+    # Local development
+    from data.pwds import Pwds
+    return dict(
+        host=Pwds.pg_host,
+        database="clp",
+        user="postgres",
+        password=Pwds.pg_pwd,
+        port="5432",
+        client_encoding="utf-8"
+    )
+
+
+class PooledConnection:
+    """
+    A psycopg2 connection on loan from the process pool. Behaves like the
+    connection itself; close() hands it back instead of disconnecting.
+    """
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise psycopg2.InterfaceError('connection already returned to the pool')
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return self._conn.__exit__(exc_type, exc_value, traceback)
+
+    @property
+    def closed(self) -> int:
+        return 1 if self._conn is None else self._conn.closed
+
+    def close(self):
+        conn, self._conn = self._conn, None
+        if conn is None:
+            return
+        try:
+            if not conn.closed and conn.autocommit:
+                conn.autocommit = False
+            # putconn rolls back an open transaction and drops broken connections
+            self._pool.putconn(conn, close=bool(conn.closed))
+        except Exception as e:
+            logger.warning(f"Discarding pooled connection: {str(e)}")
+            try:
+                self._pool.putconn(conn, close=True)
+            except Exception:
+                pass
+
+
+def get_pool():
+    """This process's connection pool, opened on first use"""
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = pg_pool.ThreadedConnectionPool(
+                settings.DB_POOL_MIN, settings.DB_POOL_MAX, **_connect_params()
+            )
+            _pool_pid = os.getpid()
+            logger.info(f"Opened connection pool ({settings.DB_POOL_MIN}-{settings.DB_POOL_MAX}) for pid {_pool_pid}")
+        return _pool
+
+
+def get_db_connection(pooled: bool = True):
+    """
+    A database connection; call close() when done as usual.
+    Pooled connections go back to the per-process pool on close. Use
+    pooled=False for connections held open indefinitely (e.g. LISTEN).
+    """
+    if not pooled or settings.DB_POOL_MAX <= 0:
+        return psycopg2.connect(**_connect_params())
+
+    pool = get_pool()
+    try:
+        conn = pool.getconn()
+    except pg_pool.PoolError:
+        # Every pooled connection is in use; don't make the caller wait
+        logger.warning("Connection pool exhausted, opening a direct connection")
+        return psycopg2.connect(**_connect_params())
+    if conn.closed:
+        pool.putconn(conn, close=True)
+        conn = pool.getconn()
+    return PooledConnection(pool, conn)
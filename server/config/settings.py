@@ -0,0 +1,127 @@
+# server\config\settings.py
+import os
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_list(name: str, default: list) -> list:
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+# Total time a single /api/analyze request may spend on external calls.
+# Kept below the gunicorn worker timeout so we can still respond.
+REQUEST_BUDGET_SECONDS = _env_float('REQUEST_BUDGET_SECONDS', 25.0)
+
+# gunicorn worker timeout. Sync workers can't heartbeat while streaming, so
+# it has to cover a full /api/analyze/batch stream: BATCH_MAX_QUERIES
+# analyses, BATCH_ANALYSIS_CONCURRENCY at a time, CLAUDE_STAGE_SECONDS each.
+WORKER_TIMEOUT_SECONDS = _env_int('WORKER_TIMEOUT_SECONDS', 300)
+
+# Upper bounds for each stage of the query path, carved out of the budget
+EMBED_STAGE_SECONDS = _env_float('EMBED_STAGE_SECONDS', 4.0)
+CLAUDE_STAGE_SECONDS = _env_float('CLAUDE_STAGE_SECONDS', 20.0)
+
+# Retry policy for provider calls
+RETRY_ATTEMPTS = _env_int('RETRY_ATTEMPTS', 3)
+RETRY_BASE_DELAY = _env_float('RETRY_BASE_DELAY', 0.25)
+RETRY_MAX_DELAY = _env_float('RETRY_MAX_DELAY', 4.0)
+
+# Circuit breaker: open after this many consecutive failures, probe again after the cooldown
+BREAKER_FAILURE_THRESHOLD = _env_int('BREAKER_FAILURE_THRESHOLD', 5)
+BREAKER_RESET_SECONDS = _env_float('BREAKER_RESET_SECONDS', 30.0)
+
+# Hedged embed requests fire a duplicate once the first exceeds the observed p95
+HEDGE_MIN_DELAY = _env_float('HEDGE_MIN_DELAY', 0.3)
+HEDGE_DEFAULT_DELAY = _env_float('HEDGE_DEFAULT_DELAY', 1.0)
+
+# Size of the last-known-good caches served while a provider is down
+FALLBACK_CACHE_SIZE = _env_int('FALLBACK_CACHE_SIZE', 512)
+
+# Token budget for the retrieved-hands context in the analysis prompt
+CONTEXT_TOKEN_BUDGET = _env_int('CONTEXT_TOKEN_BUDGET', 6000)
+
+# Batch analysis: most queries per request and concurrent Claude analyses
+BATCH_MAX_QUERIES = _env_int('BATCH_MAX_QUERIES', 50)
+BATCH_ANALYSIS_CONCURRENCY = _env_int('BATCH_ANALYSIS_CONCURRENCY', 4)
+
+# Hands of one video extracted by Claude at the same time
+EXTRACTION_CONCURRENCY = _env_int('EXTRACTION_CONCURRENCY', 4)
+
+# Most texts Voyage accepts in a single embed request
+VOYAGE_MAX_BATCH_TEXTS = _env_int('VOYAGE_MAX_BATCH_TEXTS', 1000)
+
+# Single-flight coalescing of identical /api/analyze requests. Within a worker
+# it's free and always on; across workers it costs a flight-table round trip
+# per request, so it's opt-in (worth it when many workers see bursts of the
+# same query). Followers poll for the leader's result, a leader silent this long is presumed
+# dead, and a finished result is still served to late followers for the TTL
+SINGLE_FLIGHT_SHARED = _env_int('SINGLE_FLIGHT_SHARED', 0)
+SINGLE_FLIGHT_POLL_SECONDS = _env_float('SINGLE_FLIGHT_POLL_SECONDS', 0.2)
+SINGLE_FLIGHT_WAIT_SECONDS = _env_float('SINGLE_FLIGHT_WAIT_SECONDS', REQUEST_BUDGET_SECONDS)
+SINGLE_FLIGHT_STALE_SECONDS = _env_float('SINGLE_FLIGHT_STALE_SECONDS', 60.0)
+SINGLE_FLIGHT_RESULT_TTL = _env_float('SINGLE_FLIGHT_RESULT_TTL', 10.0)
+
+# Semantic query cache: serve an earlier answer when a query with the same
+# parsed cards/position embeds within this cosine similarity of it
+SEMANTIC_CACHE_SIZE = _env_int('SEMANTIC_CACHE_SIZE', 1024)
+SEMANTIC_CACHE_THRESHOLD = _env_float('SEMANTIC_CACHE_THRESHOLD', 0.97)
+SEMANTIC_CACHE_TTL_SECONDS = _env_float('SEMANTIC_CACHE_TTL_SECONDS', 3600.0)
+# Fraction of hits re-checked against a fresh retrieval
+SEMANTIC_CACHE_AUDIT_RATE = _env_float('SEMANTIC_CACHE_AUDIT_RATE', 0.05)
+
+# Weight of card-structure similarity when reranking retrieved hands
+# (0 keeps pure embedding order)
+STRUCTURAL_RERANK_WEIGHT = _env_float('STRUCTURAL_RERANK_WEIGHT', 0.3)
+
+# Per-process Postgres connection pool (0 max disables pooling)
+DB_POOL_MIN = _env_int('DB_POOL_MIN', 1)
+DB_POOL_MAX = _env_int('DB_POOL_MAX', 8)
+
+# Post-fork worker warm-up (see utils/warmup.py). Provider warm-up makes one
+# tiny embed call and lists models to open keep-alive connections.
+WARMUP_PROVIDERS = _env_int('WARMUP_PROVIDERS', 1)
+# pg_prewarm the searched hand_embeddings partition's vector index (needs the pg_prewarm extension)
+WARMUP_PG_PREWARM = _env_int('WARMUP_PG_PREWARM', 0)
+
+# Per-worker LISTEN/NOTIFY feed of corpus changes (see utils/corpus_feed.py)
+CORPUS_FEED_ENABLED = _env_int('CORPUS_FEED_ENABLED', 1)
+# Notifications arriving within this window are applied as one batch
+CORPUS_FEED_DEBOUNCE_SECONDS = _env_float('CORPUS_FEED_DEBOUNCE_SECONDS', 0.5)
+CORPUS_FEED_RECONNECT_SECONDS = _env_float('CORPUS_FEED_RECONNECT_SECONDS', 5.0)
+
+# Stored embedding type (strategy_chunk) the query path searches with the
+# query's situation chunk
+SEARCH_EMBEDDING_TYPE = os.environ.get('SEARCH_EMBEDDING_TYPE', 'hybrid_situation')
+# Embedding types ingestion computes and stores, comma-separated. Pick them with
+# benchmarks/retrieval_eval.py; processing_scripts/prune_embeddings.py removes the rest.
+EMBEDDING_PLAN = _env_list('EMBEDDING_PLAN', [SEARCH_EMBEDDING_TYPE])
+
+# Model behind embedding version 1, i.e. everything embedded before versions
+# existed. The model queries use is the active row in embedding_versions
+# (see utils/embedding_versions.py); this is only the default for callers
+# that don't pass one.
+DEFAULT_EMBEDDING_MODEL = 'voyage-3-large'
+# How often a worker re-reads the active embedding version (the corpus feed
+# also announces switches straight away)
+EMBEDDING_VERSION_CHECK_SECONDS = _env_float('EMBEDDING_VERSION_CHECK_SECONDS', 5.0)
+
+# Near-duplicate hands (see utils/near_duplicates.py): estimated Jaccard
+# similarity at which a transcript or extracted hand counts as a copy
+NEAR_DUPLICATE_THRESHOLD = _env_float('NEAR_DUPLICATE_THRESHOLD', 0.8)
+# Check new transcripts against the corpus before Claude extraction
+NEAR_DUPLICATE_INGEST = _env_int('NEAR_DUPLICATE_INGEST', 1)
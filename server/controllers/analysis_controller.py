@@ -1,219 +1,486 @@
 from flask import jsonify
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 import logging
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from config import settings
 from config.db import get_db_connection
-from utils.query_embedding_processor import QueryEmbeddingProcessor
-from utils.claude_service import ClaudeService
+from utils.card_features import shorthand_hand, structural_rerank
+from utils.context_packer import ContextPacker
+from utils.corpus_feed import corpus_version
+from utils.embedding_versions import active_version
+from utils.hand_query_parser import HandQueryParser
+from utils.hand_document import DISPLAY_FIELDS, HAND_DOCUMENT_VERSION, refresh_hand_documents
+from utils.near_duplicates import collapse_duplicates
+from utils.preflop_grid import grid_cell, load_grid_analysis
+from utils.resilience import CircuitOpenError, Deadline, DeadlineExceeded, ProviderUnavailable
+from utils.semantic_cache import SemanticCache, query_signature
+from utils.single_flight import SingleFlight, flight_key, normalize_query
 from data.pwds import Pwds
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Initialize services
-claude_service = ClaudeService()
-query_processor = QueryEmbeddingProcessor(api_key=Pwds.VOYAGE_AI_API_KEY)
+# Provider clients are built on first use, not at import, so worker boot and
+# code paths that never call a provider don't pay for the SDK imports
+@lru_cache(maxsize=None)
+def get_claude_service():
+    from utils.claude_service import ClaudeService
+    return ClaudeService()
 
-def get_similar_hands(query_embedding: List[float], embedding_type: str = 'situation', num_results: int = 5) -> List[Dict[str, Any]]:
+@lru_cache(maxsize=None)
+def get_query_processor():
+    from utils.query_embedding_processor import QueryEmbeddingProcessor
+    return QueryEmbeddingProcessor(api_key=Pwds.VOYAGE_AI_API_KEY)
+
+query_parser = HandQueryParser()
+context_packer = ContextPacker()
+single_flight = SingleFlight()
+semantic_cache = SemanticCache()
+
+# Fixed instructions for every analysis call. Sent as a cached prefix ahead of
+# the per-request query and retrieved hands.
+ANALYSIS_INSTRUCTIONS = """
+The query that we're sending you will have all or a portion of a poker hand.
+The hands will mostly be Texas Hold Em Poker, however there may be a few other variations such as Omaha.
+
+You will be given a query and a set of similar poker hands retrieved from a database.
+Analyze the similar poker hands in relation to the query.
+
+Assume that the query containts the portion of the hand played so far.  
+The preflop, flop, turn and river action are referred to as different streets of play.
+
+Use the retrieved similar hands as context for your analysis.  
+
+As an example, if the query was simply "I'm in the big blind with Ace of Spades and Ace of Clubs", 
+the similar hands could be expected to be played in early position with a premium starting hand.  In this case, assume that this commentary is only about the preflop.  If no betting action was provided, then provide guidance on  
+
+Provide guidance on how to play the next street of the hand.  
+Give some discussion as to how it has been played so far.
+
+Use the guidance from the similar hands to state how you would play the next street of the hand.  
+If the query includes other players action, how would you react to their action?  
+The similar hands include commentary about the recommended actions that should have been taken in similar situations.  
+Use these as reference here when providing guidance in your respone.
+
+If the query contains the full hand, provide your full commentary on each street as it was played.  
+
+Focus on:
+1. The most relevant aspects of each hand to the query situation
+2. Key patterns in how similar situations were played
+3. Important strategic considerations
+4. Specific actionable recommendations
+5. Common mistakes to avoid
+
+Format your response with clear sections for:
+1. Overall Analysis - How these hands relate to the query
+2. Key Strategic Patterns
+3. Specific Recommendations
+4. Important Considerations & Risks"""
+
+DEGRADED_ANALYSIS_MESSAGE = (
+    "Detailed analysis is temporarily unavailable. "
+    "The most similar hands from the database are listed below."
+)
+
+def ensure_hand_documents(conn, hands: List[Dict[str, Any]]):
+    """
+    Rows ingested before hand documents existed (or edited since) are
+    rendered once here and written back
+    """
+    stale_ids = list({
+        hand['id'] for hand in hands
+        if not hand['hand_document']
+        or hand['hand_document'].get('version') != HAND_DOCUMENT_VERSION
+    })
+    if stale_ids:
+        documents = refresh_hand_documents(conn, stale_ids)
+        for hand in hands:
+            if hand['id'] in documents:
+                hand['hand_document'] = documents[hand['id']]
+
+def query_hand(parsed_query: Dict[str, Any], query: str) -> Dict[str, Any]:
+    """
+    Parsed query fields under transcript field names, for structural
+    reranking. Hero cards the parser doesn't read ("AhKh") come from shorthand.
+    """
+    return {'caller_cards': parsed_query.get('hero_cards') or shorthand_hand(query)}
+
+def rank_similar_hands(hands: List[Dict[str, Any]], num_results: int, query_hand: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """
+    Final ranking of one query's search results (closest first, each with its
+    hand_document and canonical_id): near-duplicates are collapsed, then
+    with a query_hand the remaining candidates are reranked by card structure.
+    Every search path ranks through here so a query gets the same hands from each.
+    """
+    rerank = query_hand is not None and settings.STRUCTURAL_RERANK_WEIGHT > 0
+    candidates = collapse_duplicates(hands, num_results * 2 if rerank else num_results)
+    if rerank:
+        return structural_rerank(candidates, query_hand, settings.STRUCTURAL_RERANK_WEIGHT)[:num_results]
+    return candidates
+
+def get_similar_hands(query_embedding: List[float], embedding_version: int, embedding_type: str = settings.SEARCH_EMBEDDING_TYPE, num_results: int = 5, query_hand: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
     """
-    Find similar hands using vector similarity search in PostgreSQL
+    Find similar hands using vector similarity search in PostgreSQL.
+    Only rows of embedding_version are searched; query_embedding must come
+    from that version's model.
+    With a query_hand (transcript field names, e.g. caller_cards), extra
+    candidates are fetched and reranked by card structure.
+    Near-duplicates of one hand are collapsed to the closest of them.
     """
+    conn = None
     try:
         conn = get_db_connection()
         cur = conn.cursor()
         
-        # Query using vector similarity search with added considerations for position matches
+        # Query using vector similarity search. Only the precomputed hand
+        # document is fetched; it carries everything the response and prompt need.
         query = """
         WITH similar_embeddings AS (
             SELECT 
                 hand_analysis_id,
-                embedding <-> %s::vector as similarity_distance,
-                ta.caller_cards,
-                ta.preflop_action
+                embedding <-> %s::vector as similarity_distance
             FROM hand_embeddings he
-            JOIN transcript_analysis ta ON ta.id = he.hand_analysis_id
-            WHERE embedding_type = %s
+            WHERE embedding_type = %s AND embedding_version = %s
             ORDER BY similarity_distance ASC
             LIMIT %s * 2  -- Fetch extra results for filtering
         )
         SELECT 
-            ta.*,
-            se.similarity_distance
+            ta.id,
+            ta.hand_document,
+            se.similarity_distance,
+            COALESCE(ta.duplicate_of, ta.id) AS canonical_id
         FROM similar_embeddings se
         JOIN transcript_analysis ta ON ta.id = se.hand_analysis_id
-        ORDER BY se.similarity_distance ASC
-        LIMIT %s;
+        ORDER BY se.similarity_distance ASC;
         """
         
-        cur.execute(query, (query_embedding, embedding_type, num_results * 2, num_results))
+        cur.execute(query, (query_embedding, embedding_type, embedding_version, num_results * 2))
         columns = [desc[0] for desc in cur.description]
-        results = [dict(zip(columns, row)) for row in cur.fetchall()]
+        hands = [dict(zip(columns, row)) for row in cur.fetchall()]
+        ensure_hand_documents(conn, hands)
+        results = rank_similar_hands(hands, num_results, query_hand)
         
         cur.close()
-        conn.close()
         return results
     except Exception as e:
         logger.error(f"Error finding similar hands: {e}")
         return []
+    finally:
+        if conn is not None:
+            conn.close()
 
-def analyze_hands(query: str, hands: List[Dict[str, Any]]) -> str:
+def format_vector(vector: List[float]) -> str:
+    """pgvector text literal, used where psycopg2 can't adapt a list of vectors"""
+    return '[' + ','.join(str(float(x)) for x in vector) + ']'
+
+def get_similar_hands_batch(query_embeddings: List[List[float]], embedding_version: int, embedding_type: str = settings.SEARCH_EMBEDDING_TYPE, num_results: int = 5, query_hands: Optional[List[Optional[Dict[str, Any]]]] = None) -> List[List[Dict[str, Any]]]:
     """
-    Use Claude to analyze the hands and provide insights using RAG pattern.
+    Run one vector similarity search per query embedding in a single SQL
+    statement, over embedding_version's rows only. Returns the similar hands
+    for each query, in input order, ranked as get_similar_hands ranks them;
+    query_hands holds each query's query_hand, if any.
     """
+    results: List[List[Dict[str, Any]]] = [[] for _ in query_embeddings]
+    if not query_embeddings:
+        return results
+    conn = None
     try:
-        hands_context = []
-        for hand in hands:
-            hand_text = ''
-            for k, v in hand.items():
-                hand_text += f"{k}: {v}\n" 
-            hand_text = (
-                f"Game: {hand['game_location']}, Stakes: {hand['stakes']}\n"
-                f"Hero Cards: {hand['caller_cards']}\n"
-                f"PREFLOP: {hand['preflop_action']}\n"
-                f"Commentary: {hand['preflop_commentary']}\n"
-            )
-            
-            if hand['flop_cards']:
-                hand_text += (
-                    f"FLOP: {hand['flop_cards']}\n"
-                    f"Action: {hand['flop_action']}\n"
-                    f"Commentary: {hand['flop_commentary']}\n"
-                )
-            
-            if hand['turn_card']:
-                hand_text += (
-                    f"TURN: {hand['turn_card']}\n"
-                    f"Action: {hand['turn_action']}\n"
-                    f"Commentary: {hand['turn_commentary']}\n"
-                )
-            
-            if hand['river_card']:
-                hand_text += (
-                    f"RIVER: {hand['river_card']}\n"
-                    f"Action: {hand['river_action']}\n"
-                    f"Commentary: {hand['river_commentary']}"
-                )
-            
-            similarity_score = 1 - hand.get('similarity_distance', 0)
-            hands_context.append(f"Hand (Similarity: {similarity_score:.2f}):\n{hand_text}\n")
+        conn = get_db_connection()
+        cur = conn.cursor()
         
-        formatted_hands = "\n".join(hands_context)
+        query = """
+        WITH queries AS (
+            SELECT q.query_embedding::vector AS query_embedding, q.query_index
+            FROM unnest(%s::text[]) WITH ORDINALITY AS q(query_embedding, query_index)
+        )
+        SELECT 
+            queries.query_index,
+            ta.id,
+            ta.hand_document,
+            se.similarity_distance,
+            COALESCE(ta.duplicate_of, ta.id) AS canonical_id
+        FROM queries
+        CROSS JOIN LATERAL (
+            SELECT 
+                hand_analysis_id,
+                embedding <-> queries.query_embedding as similarity_distance
+            FROM hand_embeddings he
+            WHERE embedding_type = %s AND embedding_version = %s
+            ORDER BY similarity_distance ASC
+            LIMIT %s
+        ) se
+        JOIN transcript_analysis ta ON ta.id = se.hand_analysis_id
+        ORDER BY queries.query_index, se.similarity_distance ASC;
+        """
         
-        analysis_prompt = f"""
+        cur.execute(query, (
+            [format_vector(vector) for vector in query_embeddings],
+            embedding_type,
+            embedding_version,
+            num_results * 2  # Extra results so collapsed duplicates don't leave gaps
+        ))
+        columns = [desc[0] for desc in cur.description]
+        hands = [dict(zip(columns, row)) for row in cur.fetchall()]
+        ensure_hand_documents(conn, hands)
+        for hand in hands:
+            # WITH ORDINALITY is 1-based
+            results[hand.pop('query_index') - 1].append(hand)
+        results = [
+            rank_similar_hands(similar, num_results, query_hands[i] if query_hands else None)
+            for i, similar in enumerate(results)
+        ]
         
-        The query that we're sending you will have all or a portion of a poker hand.
-        The hands will mostly be Texas Hold Em Poker, however there may be a few other variations such as Omaha.
+        cur.close()
+        return results
+    except Exception as e:
+        logger.error(f"Error finding similar hands for batch: {e}")
+        return results
+    finally:
+        if conn is not None:
+            conn.close()
 
+def analyze_hands(query: str, hands: List[Dict[str, Any]], deadline: Deadline = None) -> str:
+    """
+    Use Claude to analyze the hands and provide insights using RAG pattern.
+    Raises CircuitOpenError/DeadlineExceeded/ProviderUnavailable so the caller
+    can degrade gracefully.
+    """
+    try:
+        # Bounded, relevance-ranked context instead of every field of every hand
+        formatted_hands, pack_stats = context_packer.pack(query, hands)
+        logger.debug(f"Context packing stats: {pack_stats}")
         
+        analysis_prompt = f"""
         Analyze these similar poker hands in relation to the query: '{query}'
 
         Retrieved similar hands:
-        {formatted_hands}
-
-        Assume that the query containts the portion of the hand played so far.  
-        The preflop, flop, turn and river action are referred to as different streets of play.
-
-        Use the retrieved similar hands as context for your analysis.  
-
-        As an example, if the query was simply "I'm in the big blind with Ace of Spades and Ace of Clubs", 
-        the similar hands could be expected to be played in early position with a premium starting hand.  In this case, assume that this commentary is only about the preflop.  If no betting action was provided, then provide guidance on  
-
-        Provide guidance on how to play the next street of the hand.  
-        Give some discussion as to how it has been played so far.
-
-        Use the guidance from the similar hands to state how you would play the next street of the hand.  
-        If the query includes other players action, how would you react to their action?  
-        The similar hands include commentary about the recommended actions that should have been taken in similar situations.  
-        Use these as reference here when providing guidance in your respone.
-
-        If the query contains the full hand, provide your full commentary on each street as it was played.  
+        {formatted_hands}"""
 
-        Focus on:
-        1. The most relevant aspects of each hand to the query situation
-        2. Key patterns in how similar situations were played
-        3. Important strategic considerations
-        4. Specific actionable recommendations
-        5. Common mistakes to avoid
-
-        Format your response with clear sections for:
-        1. Overall Analysis - How these hands relate to the query
-        2. Key Strategic Patterns
-        3. Specific Recommendations
-        4. Important Considerations & Risks"""
-
-        return claude_service.complete(analysis_prompt)
+        return get_claude_service().complete(
+            analysis_prompt,
+            deadline=deadline,
+            static_prompt=ANALYSIS_INSTRUCTIONS
+        )
         
+    except (CircuitOpenError, DeadlineExceeded, ProviderUnavailable):
+        raise
     except Exception as e:
         logger.error(f"Error analyzing hands with Claude: {e}")
         return "Unable to analyze hands at this time."
 
+def analyze_hands_or_degrade(query: str, hands: List[Dict[str, Any]], deadline: Deadline = None):
+    """
+    Run analyze_hands, falling back to the degraded message when Claude is
+    unavailable or out of time
+    Returns: (analysis, degraded)
+    """
+    try:
+        return analyze_hands(query, hands, deadline=deadline), False
+    except (CircuitOpenError, DeadlineExceeded, ProviderUnavailable) as e:
+        logger.warning(f"Serving degraded analysis for query '{query}': {e}")
+        return DEGRADED_ANALYSIS_MESSAGE, True
+
+def analysis_payload(analysis: str, degraded: bool, similar_hands: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Response body for a successful analysis"""
+    return {
+        "status": "success",
+        "result": analysis,
+        "degraded": degraded,
+        "similar_hands": [
+            {
+                "hand_id": hand["id"],
+                **{
+                    field: hand["hand_document"]["fields"].get(field)
+                    for field in DISPLAY_FIELDS
+                },
+                "similarity_score": 1 - hand.get("similarity_distance", 0)
+            }
+            for hand in similar_hands
+        ]
+    }
+
+def get_grid_analysis(cell, num_results: int) -> Dict[str, Any]:
+    """Precomputed payload for a preflop grid cell, or None"""
+    try:
+        conn = get_db_connection()
+        try:
+            return load_grid_analysis(conn, cell, num_results)
+        finally:
+            conn.close()
+    except Exception as e:
+        logger.error(f"Error loading preflop grid analysis: {e}")
+        return None
+
 def hand_analysis(query: str, num_results: int = 5):
     """
-    Main function to analyze poker hands based on user query
+    Main function to analyze poker hands based on user query.
+    Identical concurrent queries share one computation (see SingleFlight).
     """
+    key = flight_key(normalize_query(query), num_results)
+    return jsonify(single_flight.do(key, lambda: compute_hand_analysis(query, num_results)))
+
+def compute_hand_analysis(query: str, num_results: int = 5) -> Dict[str, Any]:
+    """Embed, search and analyze one query; returns the response payload"""
     try:
+        # Common preflop spots are answered ahead of time
+        parsed_query = query_parser.parse_query(query)
+        cell = grid_cell(query, parsed_query)
+        if cell is not None:
+            precomputed = get_grid_analysis(cell, num_results)
+            if precomputed is not None:
+                return precomputed
+
+        # Each stage gets a slice of the overall request budget
+        budget = Deadline(settings.REQUEST_BUDGET_SECONDS)
+
+        # Pinned for the whole request, so the query is embedded with the
+        # same model as the rows it's compared against, even across a switch
+        version = active_version()
+
         # Get query embeddings
-        query_embeddings = query_processor.embed_query(query)
+        query_embeddings = get_query_processor().embed_query(
+            query,
+            deadline=budget.stage(settings.EMBED_STAGE_SECONDS),
+            chunk_types=['situation'],
+            model=version['model']
+        )
         logger.debug(f"Generated embeddings for query: {query}")
         if not query_embeddings:
-            return jsonify({
+            return {
                 "status": "error",
                 "result": "Unable to process query. Please try rephrasing."
-            })
+            }
         
         # Get situation embedding for similarity search
         query_vector = query_embeddings.get('situation', [])
         if not query_vector:
-            return jsonify({
+            return {
                 "status": "error",
                 "result": "Unable to generate query embeddings."
-            })
+            }
         
+        # A near-identical earlier query already has an answer
+        signature = query_signature(parsed_query, num_results, version['id'])
+        hit = semantic_cache.lookup(query, query_vector, signature)
+        if hit is not None and not semantic_cache.should_audit():
+            return hit['payload']
+
         # Find similar hands
+        retrieved_version = corpus_version()
         similar_hands = get_similar_hands(
             query_vector,
-            embedding_type='situation',
-            num_results=num_results
+            version['id'],
+            embedding_type=settings.SEARCH_EMBEDDING_TYPE,
+            num_results=num_results,
+            query_hand=query_hand(parsed_query, query)
         )
+
+        if hit is not None:
+            # Shadow check: a good hit retrieves the same hands as a fresh search
+            cached_ids = [hand['hand_id'] for hand in hit['payload']['similar_hands']]
+            matched = cached_ids == [hand['id'] for hand in similar_hands]
+            semantic_cache.record_audit(hit, query, matched)
+            if matched:
+                return hit['payload']
         
         if not similar_hands:
-            return jsonify({
+            return {
                 "status": "success",
                 "result": "No similar hands found. Please try a different query."
-            })
+            }
         
         # Analyze hands and generate insights
-        analysis = analyze_hands(query, similar_hands)
+        analysis, degraded = analyze_hands_or_degrade(
+            query,
+            similar_hands,
+            deadline=budget.stage(settings.CLAUDE_STAGE_SECONDS)
+        )
         
         # Log successful analysis
         logger.debug(f"Successfully analyzed hand query: {query}")
         
-        return jsonify({
-            "status": "success",
-            "result": analysis,
-            "similar_hands": [
-                {
-                    "hand_id": hand["id"],
-                    "game_location": hand["game_location"],
-                    "stakes": hand["stakes"],
-                    "caller_cards": hand["caller_cards"],
-                    "preflop_action": hand["preflop_action"],
-                    "flop_cards": hand["flop_cards"],
-                    "flop_action": hand["flop_action"],
-                    "turn_card": hand["turn_card"],
-                    "turn_action": hand["turn_action"],
-                    "river_card": hand["river_card"],
-                    "river_action": hand["river_action"],
-                    "similarity_score": 1 - hand.get("similarity_distance", 0)
-                }
-                for hand in similar_hands
-            ]
-        })
+        payload = analysis_payload(analysis, degraded, similar_hands)
+        if not degraded:
+            semantic_cache.put(query, query_vector, signature, payload, version=retrieved_version)
+        return payload
         
     except Exception as e:
         logger.error(f"Error in hand analysis: {e}", exc_info=True)
-        return jsonify({
+        return {
             "status": "error",
             "result": "An error occurred during analysis. Please try again later."
-        })
\ No newline at end of file
+        }
+
+def _analyze_batch_query(query: str, hands: List[Dict[str, Any]]):
+    # The stage deadline starts when a worker picks the query up, not when
+    # it's queued behind BATCH_ANALYSIS_CONCURRENCY others
+    return analyze_hands_or_degrade(query, hands, Deadline(settings.CLAUDE_STAGE_SECONDS))
+
+def hand_analysis_batch(queries: List[str], num_results: int = 5):
+    """
+    Analyze many queries at once: one Voyage request for all query embeddings,
+    one SQL statement for all similarity searches, and Claude analyses fanned
+    out with bounded concurrency.
+    Yields one result dict per query (tagged with its index) as each completes.
+    """
+    version = active_version()
+    embeddings = get_query_processor().embed_queries(
+        queries,
+        chunk_types=['situation'],
+        model=version['model'],
+        deadline=Deadline(settings.EMBED_STAGE_SECONDS)
+    )
+
+    # Queries we couldn't embed are answered straight away
+    searchable = []
+    for index, (query, query_embeddings) in enumerate(zip(queries, embeddings)):
+        if query_embeddings and query_embeddings.get('situation'):
+            searchable.append(index)
+        else:
+            yield {
+                "index": index,
+                "query": query,
+                "status": "error",
+                "result": "Unable to process query. Please try rephrasing."
+            }
+
+    parsed_queries = query_parser.parse_many([queries[index] for index in searchable])
+    similar_hands = get_similar_hands_batch(
+        [embeddings[index]['situation'] for index in searchable],
+        version['id'],
+        embedding_type=settings.SEARCH_EMBEDDING_TYPE,
+        num_results=num_results,
+        query_hands=[
+            query_hand(parsed, queries[index]) for index, parsed in zip(searchable, parsed_queries)
+        ]
+    )
+
+    with ThreadPoolExecutor(max_workers=settings.BATCH_ANALYSIS_CONCURRENCY) as executor:
+        futures = {}
+        for index, hands in zip(searchable, similar_hands):
+            if not hands:
+                yield {
+                    "index": index,
+                    "query": queries[index],
+                    "status": "success",
+                    "result": "No similar hands found. Please try a different query."
+                }
+                continue
+            future = executor.submit(_analyze_batch_query, queries[index], hands)
+            futures[future] = (index, hands)
+
+        for future in as_completed(futures):
+            index, hands = futures[future]
+            try:
+                analysis, degraded = future.result()
+                payload = analysis_payload(analysis, degraded, hands)
+            except Exception as e:
+                logger.error(f"Error in batch hand analysis for query {index}: {e}", exc_info=True)
+                payload = {
+                    "status": "error",
+                    "result": "An error occurred during analysis. Please try again later."
+                }
+            yield {"index": index, "query": queries[index], **payload}
@@ -1,103 +1,217 @@
 # app/controllers/transcript_controller.py
 from config.db import get_db_connection
 from utils.claude_service import ClaudeService 
-from utils.read_transcript_from_yt import get_transcript
+from utils.transcript_cache import get_cached_transcript
+from utils.hand_document import build_hand_document
+from utils.job_ledger import JobLedger
+from utils.extraction_cache import extraction_cache_key, load_extraction, store_extraction, store_parsed
+from utils.near_duplicates import find_duplicate, fingerprint_row, hand_fingerprint, store_fingerprints, transcript_fingerprint
+from utils.transcript_segmenter import segment_hands, text_segments, trimmed_fraction
+from config import settings
+from psycopg2.extras import Json
+from concurrent.futures import ThreadPoolExecutor
+import time
 import logging
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Bump when EXTRACTION_INSTRUCTIONS change in a way that should re-extract
+# every transcript; bump PARSER_VERSION when parse_xml_response changes so
+# cached raw responses are re-parsed without calling Claude again.
+EXTRACTION_PROMPT_VERSION = 1
+PARSER_VERSION = 1
+
+# transcript_analysis columns filled from the parsed analysis, in insert order
+ANALYSIS_FIELDS = [
+    'game_location', 'stakes', 'caller_cards',
+    'preflop_action', 'preflop_commentary',
+    'flop_cards', 'flop_action', 'flop_commentary',
+    'turn_card', 'turn_action', 'turn_commentary',
+    'river_card', 'river_action', 'river_commentary',
+]
+
+# Fixed extraction instructions. Sent as a cached prefix ahead of the transcript.
+EXTRACTION_INSTRUCTIONS = """
+Analyze this poker hand transcript and extract the following information.
+Some portions may be missing.  If so, include the element and provide a placeholder value stating "not included".
+Some transcripts will only be hand setups and no commentary.  These are detailing the action at the table and are going to be used to query a database for matching hands.
+Again, include all element tags and use the placeholder stating "not included" if they are missing.
+For each commentary section if commentary is incuded in the transcript, provide detailed analysis of at least 500 characters, capturing Bart's full analysis, 
+strategic insights, and explanations of the action. Include any relevant player tendencies, pot odds discussions,
+or strategic concepts Bart mentions.
+Do not use any non-unicode characters.  For example, when describing the suit of a card spell out the suit such as Hearts.  Do not use an icon to represent the suit.
+Return ONLY the information in this XML structure:
+
+<analysis>
+    <game_location>location string</game_location>
+    <stakes>stakes string</stakes>
+    <caller_cards>cards string.  lower rank card first, with explicit suits for both cards.  For example "Jack of Hearts and Queen of Hearts".</caller_cards>
+    
+    <preflop>
+        <action>detailed action string</action>
+        <commentary>Bart's commentary string</commentary>
+    </preflop>
+    
+    <flop>
+        <cards>flop cards string</cards>
+        <action>detailed action string</action>
+        <commentary>Bart's commentary string</commentary>
+    </flop>
+    
+    <turn>
+        <card>turn card string</card>
+        <action>detailed action string</action>
+        <commentary>Bart's commentary string</commentary>
+    </turn>
+    
+    <river>
+        <card>river card string</card>
+        <action>detailed action string</action>
+        <commentary>Bart's commentary string</commentary>
+    </river>
+</analysis>"""
+
 class TranscriptController:
     def __init__(self):
         self.claude = ClaudeService()
         self.analysis = None
         self.transcript = None
+        self.segments = None
 
     def get_transcript(self, youtube_url):
         """
-        Stores YouTube transcript in database
-        Returns: (response_dict, status_code)
+        Fetches the YouTube transcript, served from the local transcript
+        cache when it has been fetched before
+        Returns: bool success
         """
         try:
-            transcript_result = get_transcript(url=youtube_url)
+            transcript_result = get_cached_transcript(url=youtube_url)
             
             if not transcript_result['success']:
                 logger.error(f"Failed to get transcript: {transcript_result['error']}")
                 return False
-                
-            # conn = get_db_connection()
-            # try:
-            #     with conn.cursor() as cur:
-            #         cur.execute("""
-            #             SELECT id 
-            #             FROM transcript 
-            #             WHERE video_id = %s
-            #         """, (transcript_result['video_id'],))
-            #         existing = cur.fetchone()
-                    
-            #         if existing:
-            #             return {
-            #                 'transcript_id': existing[0],
-            #                 'message': 'Transcript already exists'
-            #             }, 200
-                
-
-            #     with conn.cursor() as cur:
-            #         cur.execute("""
-            #             INSERT INTO transcript (video_id, youtube_url, formatted_transcript)
-            #             VALUES (%s, %s, %s)
-            #             RETURNING id
-            #         """, (transcript_result['video_id'], 
-            #               youtube_url, 
-            #               transcript_result['formatted_transcript']))
-            #         transcript_id = cur.fetchone()[0]
-            #     conn.commit()
             
             if not 'formatted_transcript' in transcript_result:
                 return False
             
             self.transcript = transcript_result['formatted_transcript']
+            # Timestamped caption segments, used to split the video into hands
+            self.segments = transcript_result.get('transcript')
             return True
             
-        # finally:
-        #     conn.close()
-            
         except Exception as e:
-            logger.error(f"Error storing transcript: {str(e)}")
-            return {'message': str(e)}
+            logger.error(f"Error getting transcript: {str(e)}")
+            return False
 
-    def analyze_transcript(self, transcript_text, url):
+    def analyze_transcript(self, transcript_text, url, timings=None, segments=None):
         """
-        Analyzes poker transcript using Claude
+        Splits the transcript into hands (see utils/transcript_segmenter.py),
+        extracts each with Claude in parallel and stores one row per hand.
+        The inserts and the ingest ledger update commit together, and a url
+        the ledger already has analyses for is returned as-is, so re-running
+        is idempotent. A hand whose transcript near-duplicates one already in
+        the corpus isn't extracted; the url is recorded against the original
+        hand. An extracted hand that near-duplicates a stored one is inserted
+        with duplicate_of set.
+        segments are get_transcript's timestamped caption segments; without
+        them the text is split by line.
         Returns: (response_dict, status_code)
         """
         try:
             conn = get_db_connection()
             try:
+                timings = dict(timings or {})
+                
+                segments = segments or text_segments(transcript_text)
+                hands = segment_hands(segments)
+                if not hands:
+                    raise ValueError("Transcript has no text")
+                logger.info(f"Found {len(hands)} hand(s), trimmed {trimmed_fraction(segments, hands):.0%} of the transcript")
                 
-                # Get analysis from Claude
-                analysis = self.analyze_with_claude(transcript_text)
-                self.analysis = analysis
-                # Store analysis
+                # Skip re-uploads and clips before paying for Claude
+                for hand in hands:
+                    hand['fingerprint'] = transcript_fingerprint(hand['text'])
+                    hand['original_id'] = None
+                if settings.NEAR_DUPLICATE_INGEST:
+                    with conn.cursor() as cur:
+                        for hand in hands:
+                            hand['original_id'] = find_duplicate(cur, 'transcript', hand['fingerprint'])
+                    conn.commit()
+                to_extract = [hand for hand in hands if hand['original_id'] is None]
+                
+                # Get analyses from Claude
+                extract_start = time.monotonic()
+                analyses = self.extract_hands([hand['text'] for hand in to_extract])
+                timings['extract_seconds'] = round(time.monotonic() - extract_start, 3)
+                for hand, analysis in zip(to_extract, analyses):
+                    hand['analysis'] = analysis
+                
+                # Store analyses
                 with conn.cursor() as cur:
-                    cur.execute("""
-                        INSERT INTO transcript_analysis 
-                        (url, game_location, stakes, caller_cards,
-                         preflop_action, preflop_commentary,
-                         flop_cards, flop_action, flop_commentary,
-                         turn_card, turn_action, turn_commentary,
-                         river_card, river_action, river_commentary)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                        RETURNING id
-                    """, (url, *analysis.values()))
-                    analysis_id = cur.fetchone()[0]
+                    existing_ids = JobLedger.existing_analysis(cur, url)
+                    if existing_ids is not None:
+                        conn.commit()
+                        return {
+                            'analysis_id': existing_ids[0],
+                            'analysis_ids': existing_ids
+                        }, 200
+                    
+                    stored = []
+                    for hand in hands:
+                        if hand['original_id'] is not None:
+                            logger.info(f"Skipped hand at {hand['start']}s: near-duplicate of hand {hand['original_id']}")
+                            stored.append({'analysis_id': hand['original_id'], 'duplicate_of': hand['original_id']})
+                            continue
+                        analysis = hand['analysis']
+                        if not any(analysis.get(field) for field in ANALYSIS_FIELDS):
+                            # Chatter the segmenter took for a hand
+                            continue
+                        hand_fp = hand_fingerprint(analysis)
+                        duplicate_of = find_duplicate(cur, 'hand', hand_fp) if settings.NEAR_DUPLICATE_INGEST else None
+                        cur.execute("""
+                            INSERT INTO transcript_analysis 
+                            (url, game_location, stakes, caller_cards,
+                             preflop_action, preflop_commentary,
+                             flop_cards, flop_action, flop_commentary,
+                             turn_card, turn_action, turn_commentary,
+                             river_card, river_action, river_commentary,
+                             hand_document, duplicate_of, segment_start, segment_end)
+                            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                            RETURNING id
+                        """, (
+                            url,
+                            *[analysis.get(field) for field in ANALYSIS_FIELDS],
+                            Json(build_hand_document(analysis)),
+                            duplicate_of,
+                            hand['start'],
+                            hand['end']
+                        ))
+                        analysis_id = cur.fetchone()[0]
+                        store_fingerprints(cur, [fingerprint_row(analysis_id, hand['fingerprint'], hand_fp)])
+                        stored.append({
+                            'analysis_id': analysis_id,
+                            'duplicate_of': duplicate_of,
+                            'segment_start': hand['start'],
+                            'segment_end': hand['end'],
+                            'analysis': analysis
+                        })
+                    if not stored:
+                        raise ValueError("No hands found in transcript")
+                    
+                    analysis_ids = list(dict.fromkeys(hand['analysis_id'] for hand in stored))
+                    JobLedger.mark_done(cur, url, analysis_ids, timings)
                 conn.commit()
                 
+                created = [hand for hand in stored if 'analysis' in hand]
+                self.analysis = created[0]['analysis'] if created else None
                 return {
-                    'analysis_id': analysis_id,
-                    'analysis': analysis
-                }, 201
+                    'analysis_id': analysis_ids[0],
+                    'analysis_ids': analysis_ids,
+                    'hands': stored,
+                    'analysis': self.analysis
+                }, 201 if created else 200
             
             finally:
                 conn.close()
@@ -106,63 +220,82 @@ class TranscriptController:
             logger.error(f"Error analyzing transcript: {str(e)}")
             return {'error': str(e)}, 500
 
+    def extract_hands(self, hand_texts):
+        """
+        Claude extractions for the hands of one video, run in parallel.
+        Returns analyses in input order. Any failure fails the whole video so
+        it's retried; hands that did succeed come from the extraction cache then.
+        """
+        if len(hand_texts) <= 1:
+            return [self.analyze_with_claude(text) for text in hand_texts]
+        with ThreadPoolExecutor(max_workers=settings.EXTRACTION_CONCURRENCY) as executor:
+            return list(executor.map(self.analyze_with_claude, hand_texts))
+
+    def _cached_extraction(self, cache_key):
+        """
+        Parsed analysis from the extraction cache, re-parsing the stored raw
+        response if it was parsed by an older parser. None on a cache miss,
+        or if the stored response no longer parses; the fresh response then
+        replaces it.
+        """
+        try:
+            cached = load_extraction(cache_key)
+        except Exception as e:
+            logger.warning(f"Extraction cache read failed: {str(e)}")
+            return None
+        if cached is None:
+            return None
+        
+        if cached['parsed'] is not None and cached['parser_version'] == PARSER_VERSION:
+            return cached['parsed']
+        
+        try:
+            analysis = self.parse_xml_response(cached['raw_response'])
+        except Exception as e:
+            logger.warning(f"Ignoring cached Claude extraction that failed to parse: {str(e)}")
+            return None
+        try:
+            store_parsed(cache_key, analysis, PARSER_VERSION)
+        except Exception as e:
+            logger.warning(f"Extraction cache update failed: {str(e)}")
+        return analysis
+
     def analyze_with_claude(self, transcript_text):
         """
-        Private method to handle Claude API interaction
+        Private method to handle Claude API interaction, for one hand's text
+        Extractions are cached by hash(transcript, prompt version, model), so
+        Claude is only called again when one of those changes.
         Returns structured analysis dict
         """
+        cache_key = extraction_cache_key(transcript_text, EXTRACTION_PROMPT_VERSION, self.claude.model)
+        analysis = self._cached_extraction(cache_key)
+        if analysis is not None:
+            logger.info("Using cached Claude extraction")
+            return analysis
+        
         prompt = f"""
-        Analyze this poker hand transcript and extract the following information.
-        Some portions may be missing.  If so, include the element and provide a placeholder value stating "not included".
-        Some transcripts will only be hand setups and no commentary.  These are detailing the action at the table and are going to be used to query a database for matching hands.
-        Again, include all element tags and use the placeholder stating "not included" if they are missing.
-        For each commentary section if commentary is incuded in the transcript, provide detailed analysis of at least 500 characters, capturing Bart's full analysis, 
-        strategic insights, and explanations of the action. Include any relevant player tendencies, pot odds discussions,
-        or strategic concepts Bart mentions.
-        Do not use any non-unicode characters.  For example, when describing the suit of a card spell out the suit such as Hearts.  Do not use an icon to represent the suit.
-        Return ONLY the information in this XML structure:
-
-        <analysis>
-            <game_location>location string</game_location>
-            <stakes>stakes string</stakes>
-            <caller_cards>cards string.  lower rank card first, with explicit suits for both cards.  For example "Jack of Hearts and Queen of Hearts".</caller_cards>
-            
-            <preflop>
-                <action>detailed action string</action>
-                <commentary>Bart's commentary string</commentary>
-            </preflop>
-            
-            <flop>
-                <cards>flop cards string</cards>
-                <action>detailed action string</action>
-                <commentary>Bart's commentary string</commentary>
-            </flop>
-            
-            <turn>
-                <card>turn card string</card>
-                <action>detailed action string</action>
-                <commentary>Bart's commentary string</commentary>
-            </turn>
-            
-            <river>
-                <card>river card string</card>
-                <action>detailed action string</action>
-                <commentary>Bart's commentary string</commentary>
-            </river>
-        </analysis>
-
         Analyze this poker hand transcript:
         {transcript_text}
         """
         
         try:
-            response = self.claude.complete(prompt)
-            # Would need to parse XML response here before returning
-            # Could use xml.etree.ElementTree or similar
-            return self.parse_xml_response(response)
+            response = self.claude.complete(prompt, static_prompt=EXTRACTION_INSTRUCTIONS)
         except Exception as e:
             logger.error(f"Error from Claude API: {str(e)}")
             raise
+        
+        # Keep the paid-for response even if parsing fails below
+        try:
+            store_extraction(cache_key, EXTRACTION_PROMPT_VERSION, self.claude.model, response)
+        except Exception as e:
+            logger.warning(f"Extraction cache write failed: {str(e)}")
+        
+        analysis = self.parse_xml_response(response)
+        try:
+            store_parsed(cache_key, analysis, PARSER_VERSION)
+        except Exception as e:
+            logger.warning(f"Extraction cache update failed: {str(e)}")
+        return analysis
 
     def parse_xml_response(self, response):
         """
@@ -0,0 +1,12 @@
+# server\gunicorn.conf.py
+# Picked up automatically by `gunicorn app:app` when run from server/.
+from config import settings
+
+# The default 30s would kill a worker mid-way through a batch NDJSON stream
+timeout = settings.WORKER_TIMEOUT_SECONDS
+
+
+def post_worker_init(worker):
+    """Warm each worker after fork: pool, provider connections, vector index"""
+    from utils.warmup import start_warm_up
+    start_warm_up()
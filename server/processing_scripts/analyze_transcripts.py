@@ -1,55 +1,84 @@
 import os
 import sys
-import csv 
-import pandas as pd
+import time
+import argparse
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from controllers.transcript_controller import TranscriptController
+from utils.job_ledger import DEFAULT_LEASE_SECONDS, JobLedger, default_worker_id, in_shard, parse_shard
+from utils.progress_meter import ProgressMeter
 
-vids_df = pd.read_csv('data/clp_vids.csv')
+ledger = JobLedger()
 
-fieldnames = ['analysis_id', 'yt_url']
-completed_analyses = pd.DataFrame(columns=fieldnames)
-latest_analyses = []
-header_written = False
-
-try:
-  completed_analyses = pd.read_csv('data/completed_analyses.csv')
-  header_written = True
-except Exception as e:
-  print(e)
-
-def get_and_process_transcript(yt_url):
-  global latest_analyses
-  global header_written
+def get_and_process_transcript(yt_url, claimed=False):
+  """
+  Fetch, extract and store one video. claimed jobs already count their attempt.
+  Returns the analysis ids of the video's hands, or None on failure.
+  """
   tc = TranscriptController()
+  timings = {}
+  if not claimed:
+    ledger.set_state(yt_url, 'fetching')
+  fetch_start = time.monotonic()
   res = tc.get_transcript(yt_url)
+  timings['fetch_seconds'] = round(time.monotonic() - fetch_start, 3)
   if not res:
-    return
+    ledger.fail(yt_url, 'transcript unavailable', timings)
+    return None
   transcript = tc.transcript
-  analysis_res = tc.analyze_transcript(transcript, yt_url)
-  if analysis_res[1] != 201:
-    return
-  analysis_res = analysis_res[0]
-  latest_analyses.append({'analysis_id': analysis_res['analysis_id'], 'yt_url': yt_url})
-  try:
-    with open('data/completed_analyses.csv', 'a', newline='') as csvfile:
-      writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-      if not header_written:
-        writer.writeheader()
-        header_written = True
-      writer.writerows(latest_analyses)
-    latest_analyses = []
-  except Exception as e:
-    print(e)
-
-for i in range(len(vids_df)):
-  vid = vids_df.iloc[i]
-  yt_url = vid['url']
-  if yt_url in completed_analyses['yt_url'].values:
-    continue
-  get_and_process_transcript(yt_url)
-  if (i + 1) % 5 == 0:
-    print(f'Processed {i + 1} videos')
+  ledger.set_state(yt_url, 'extracting')
+  analysis_res = tc.analyze_transcript(transcript, yt_url, timings, segments=tc.segments)
+  if analysis_res[1] not in (200, 201):
+    ledger.fail(yt_url, analysis_res[0].get('error', 'analysis failed'), timings)
+    return None
+  return analysis_res[0]['analysis_ids']
+
+def run_shard(pending_urls, shard):
+  """Static split: this process handles the urls that hash into its shard"""
+  urls = [url for url in pending_urls if in_shard(url, shard)]
+  print(f'Shard {shard[0]}/{shard[1]}: {len(urls)} videos' if shard else f'{len(urls)} videos to analyze')
+  meter = ProgressMeter('Transcript analysis', total=len(urls))
+  for yt_url in urls:
+    meter.record(get_and_process_transcript(yt_url) is not None)
+  meter.summary()
+
+def run_leased(worker_id, lease_seconds):
+  """Dynamic split: claim one job at a time until nothing is claimable"""
+  meter = ProgressMeter(f'Transcript analysis [{worker_id}]')
+  while True:
+    claimed = ledger.claim(worker_id, limit=1, lease_seconds=lease_seconds)
+    if not claimed:
+      break
+    meter.record(get_and_process_transcript(claimed[0], claimed=True) is not None)
+  meter.summary()
+
+def main():
+  parser = argparse.ArgumentParser(description="Extract hands from CLP videos with Claude")
+  parser.add_argument('--csv', default='data/clp_vids.csv', help="csv with a 'url' column")
+  parser.add_argument('--shard', type=parse_shard, help="process only shard i of N, e.g. 0/4")
+  parser.add_argument('--lease', action='store_true',
+                      help="claim jobs from ingest_jobs with leases instead of a static shard")
+  parser.add_argument('--worker-id', default=default_worker_id())
+  parser.add_argument('--lease-seconds', type=int, default=DEFAULT_LEASE_SECONDS)
+  args = parser.parse_args()
+
+  # pandas is only needed here; importing it lazily keeps --help and workers fast
+  import pandas as pd
+  vids_df = pd.read_csv(args.csv)
+
+  # Carry over progress recorded by the old csv bookkeeping (no-op once imported)
+  ledger.import_completed_csv('data/completed_analyses.csv')
+
+  done = ledger.done_keys()
+  pending_urls = [url for url in vids_df['url'] if not JobLedger.is_done(url, done)]
+  ledger.enqueue(pending_urls)
+  print(f'{len(vids_df) - len(pending_urls)} videos already analyzed, {len(pending_urls)} pending')
+
+  if args.lease:
+    run_leased(args.worker_id, args.lease_seconds)
+  else:
+    run_shard(pending_urls, args.shard)
 
+if __name__ == '__main__':
+  main()
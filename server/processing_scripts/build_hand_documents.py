@@ -0,0 +1,47 @@
+import os
+import sys
+import logging
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.db import get_db_connection
+from utils.hand_document import HAND_DOCUMENT_VERSION, refresh_hand_documents
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+
+def main():
+    """Build hand documents for rows that are missing one or have an outdated version"""
+    conn = get_db_connection()
+    
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT id
+                FROM transcript_analysis
+                WHERE hand_document IS NULL
+                   OR (hand_document->>'version')::int IS DISTINCT FROM %s
+                ORDER BY id
+            """, (HAND_DOCUMENT_VERSION,))
+            hand_ids = [row[0] for row in cur.fetchall()]
+        logger.info(f"{len(hand_ids)} hand documents to build")
+        
+        for i in range(0, len(hand_ids), BATCH_SIZE):
+            refresh_hand_documents(conn, hand_ids[i:i + BATCH_SIZE])
+            logger.info(f"Built {min(i + BATCH_SIZE, len(hand_ids))}/{len(hand_ids)} hand documents")
+            
+    except Exception as e:
+        logger.error(f"Fatal error: {str(e)}")
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
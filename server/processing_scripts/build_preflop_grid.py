@@ -0,0 +1,125 @@
+import os
+import sys
+import argparse
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import settings
+from config.db import get_db_connection
+from controllers.analysis_controller import (
+    analysis_payload, analyze_hands_or_degrade, get_query_processor, get_similar_hands_batch, query_hand,
+    query_parser
+)
+from utils.embedding_versions import active_version
+from utils.preflop_grid import (
+    GRID_NUM_RESULTS, GRID_POSITIONS, GRID_STAKES, corpus_version, grid_cells, grid_query,
+    mark_current, store_grid_analysis, stored_hand_ids
+)
+from utils.progress_meter import ProgressMeter
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Cells embedded and searched per round trip
+CHUNK_SIZE = 500
+
+def build_chunk(conn, cells, stored, version, embedding_version, force, meter):
+    """Embed and search a chunk of cells, then analyze the ones whose hands changed"""
+    queries = [grid_query(cell) for cell in cells]
+    embeddings = get_query_processor().embed_queries(
+        queries, chunk_types=['situation'], model=embedding_version['model']
+    )
+    searchable = [i for i, embedding in enumerate(embeddings) if embedding and embedding.get('situation')]
+    for _ in range(len(cells) - len(searchable)):
+        meter.record(False)
+
+    # Ranked exactly as /api/analyze would rank the same query
+    similar_hands = get_similar_hands_batch(
+        [embeddings[i]['situation'] for i in searchable],
+        embedding_version['id'],
+        embedding_type=settings.SEARCH_EMBEDDING_TYPE,
+        num_results=GRID_NUM_RESULTS,
+        query_hands=[
+            query_hand(parsed, queries[i])
+            for i, parsed in zip(searchable, query_parser.parse_many([queries[i] for i in searchable]))
+        ]
+    )
+
+    changed = []
+    unchanged = []
+    for i, hands in zip(searchable, similar_hands):
+        hand_ids = [hand['id'] for hand in hands]
+        if not hands:
+            meter.record(False)
+        elif not force and stored.get(cells[i]) == hand_ids:
+            unchanged.append(cells[i])
+        else:
+            changed.append((i, hands))
+    mark_current(conn, unchanged, version)
+    for _ in unchanged:
+        meter.record(True)
+
+    with ThreadPoolExecutor(max_workers=settings.BATCH_ANALYSIS_CONCURRENCY) as executor:
+        futures = {
+            executor.submit(analyze_hands_or_degrade, queries[i], hands): (i, hands)
+            for i, hands in changed
+        }
+        for future in as_completed(futures):
+            i, hands = futures[future]
+            try:
+                analysis, degraded = future.result()
+            except Exception as e:
+                logger.error(f"Error analyzing cell {cells[i]}: {str(e)}")
+                meter.record(False)
+                continue
+            if degraded:
+                # Leave the previous answer (if any) in place; the next run retries
+                meter.record(False)
+                continue
+            store_grid_analysis(
+                conn, cells[i], queries[i], [hand['id'] for hand in hands],
+                analysis_payload(analysis, False, hands), version
+            )
+            meter.record(True)
+    return len(changed)
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute analyses for the preflop hand class x position x stakes grid")
+    parser.add_argument('--positions', nargs='+', choices=list(GRID_POSITIONS), help="default: every grid position")
+    parser.add_argument('--stakes', nargs='+', choices=GRID_STAKES, help="default: every grid stakes level")
+    parser.add_argument('--force', action='store_true', help="re-analyze cells even if their retrieved hands are unchanged")
+    args = parser.parse_args()
+
+    conn = get_db_connection()
+    try:
+        # One embedding version for the whole run; a switch changes the corpus version
+        embedding_version = active_version()
+        with conn.cursor() as cur:
+            version = corpus_version(cur)
+        stored = stored_hand_ids(conn)
+        cells = grid_cells(args.positions, args.stakes)
+        logger.info(f"{len(cells)} grid cells, {len(stored)} stored, corpus version {version}")
+
+        meter = ProgressMeter('Preflop grid', total=len(cells), log_every=100)
+        analyzed = 0
+        for start in range(0, len(cells), CHUNK_SIZE):
+            analyzed += build_chunk(
+                conn, cells[start:start + CHUNK_SIZE], stored, version, embedding_version, args.force, meter
+            )
+        meter.summary()
+        logger.info(f"Re-analyzed {analyzed} cells whose retrieved hands changed")
+    except Exception as e:
+        logger.error(f"Fatal error: {str(e)}")
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+import os
+import sys
+import json
+import argparse
+import logging
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.corpus_snapshot import export_snapshot, import_snapshot, load_snapshot_embeddings, read_manifest
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+def main():
+    parser = argparse.ArgumentParser(description="Export or import a Parquet/Arrow snapshot of the analyzed-hand corpus")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = commands.add_parser('export', help="write transcript_analysis and hand_embeddings to a snapshot directory")
+    export_parser.add_argument('path')
+    export_parser.add_argument('--types', nargs='+', help="embedding types to include (default: all)")
+
+    import_parser = commands.add_parser('import', help="COPY a snapshot into Postgres")
+    import_parser.add_argument('path')
+    import_parser.add_argument('--truncate', action='store_true',
+                               help="replace existing hands and embeddings (TRUNCATE ... CASCADE)")
+
+    inspect_parser = commands.add_parser('inspect', help="print the manifest and memory-map the embeddings")
+    inspect_parser.add_argument('path')
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        manifest = export_snapshot(args.path, embedding_types=args.types)
+        print(json.dumps(manifest, indent=2))
+    elif args.command == 'import':
+        counts = import_snapshot(args.path, truncate=args.truncate)
+        logger.info(f"Imported {counts['transcript_analysis']} hands and {counts['hand_embeddings']} embeddings")
+    else:
+        print(json.dumps(read_manifest(args.path), indent=2))
+        embeddings = load_snapshot_embeddings(args.path)
+        logger.info(f"{len(embeddings)} embeddings x {embeddings.dimensions} dimensions mapped")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+import os
+import sys
+import json
+import argparse
+import logging
+from collections import defaultdict
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import settings
+from config.db import get_db_connection
+from utils.hand_document import SOURCE_FIELDS
+from utils.near_duplicates import (
+    KINDS, fields_conflict, fingerprint_row, hand_fingerprint, similarity, store_fingerprints, transcript_fingerprint
+)
+from utils.read_transcript_from_yt import extract_video_id
+from utils.transcript_cache import load_cached_transcript
+from utils.transcript_segmenter import find_hand
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Fingerprints upserted per statement
+STORE_BATCH = 500
+
+def load_rows(cur):
+    cur.execute(f"""
+        SELECT id, url, duplicate_of, segment_start, {', '.join(SOURCE_FIELDS)}
+        FROM transcript_analysis
+        ORDER BY id
+    """)
+    columns = [desc[0] for desc in cur.description]
+    return [dict(zip(columns, row)) for row in cur.fetchall()]
+
+def cached_hand_text(url, segment_start):
+    """
+    The hand's span of its cached transcript, as ingest segments it. None if
+    the transcript isn't cached, or if it's a hand stored before segmentation
+    from a video that now splits into several hands.
+    """
+    video_id = extract_video_id(url) if url else None
+    cached = load_cached_transcript(video_id) if video_id else None
+    if cached is None:
+        return None
+    hand = find_hand(cached['transcript'], segment_start)
+    return hand['text'] if hand else None
+
+def fingerprint_hands(rows, with_transcripts: bool):
+    """{hand id: {'transcript': fingerprint or None, 'hand': fingerprint or None}}"""
+    fingerprints = {}
+    for row in rows:
+        transcript = None
+        if with_transcripts:
+            try:
+                transcript = transcript_fingerprint(cached_hand_text(row['url'], row['segment_start']))
+            except Exception as e:
+                logger.warning(f"No transcript for hand {row['id']}: {str(e)}")
+        fingerprints[row['id']] = {'transcript': transcript, 'hand': hand_fingerprint(row)}
+    return fingerprints
+
+def find_clusters(fingerprints, threshold: float):
+    """
+    {duplicate id: original id}. Hands sharing an LSH band of either
+    signature are compared; a pair matches when one signature reaches
+    threshold and their cards, board and stakes don't conflict. Matches are
+    grouped transitively and the earliest hand of each group is the original.
+    """
+    parent = {hand_id: hand_id for hand_id in fingerprints}
+
+    def root(hand_id):
+        while parent[hand_id] != hand_id:
+            parent[hand_id] = parent[parent[hand_id]]
+            hand_id = parent[hand_id]
+        return hand_id
+
+    compared = set()
+    for kind in KINDS:
+        buckets = defaultdict(list)
+        for hand_id, prints in fingerprints.items():
+            if prints[kind] is not None:
+                for band in prints[kind]['bands']:
+                    buckets[band].append(hand_id)
+        for bucket in buckets.values():
+            for i, a in enumerate(bucket):
+                for b in bucket[i + 1:]:
+                    if (kind, a, b) in compared:
+                        continue
+                    compared.add((kind, a, b))
+                    fields_a = fingerprints[a]['hand'] and fingerprints[a]['hand']['fields']
+                    fields_b = fingerprints[b]['hand'] and fingerprints[b]['hand']['fields']
+                    if fields_conflict(fields_a, fields_b):
+                        continue
+                    if similarity(fingerprints[a][kind]['signature'], fingerprints[b][kind]['signature']) >= threshold:
+                        ra, rb = root(a), root(b)
+                        if ra != rb:
+                            parent[max(ra, rb)] = min(ra, rb)
+
+    return {hand_id: root(hand_id) for hand_id in fingerprints if root(hand_id) != hand_id}
+
+def apply_duplicates(conn, duplicates):
+    """Point every duplicate at its original and clear flags that no longer hold"""
+    with conn.cursor() as cur:
+        cur.execute("""
+            UPDATE transcript_analysis
+            SET duplicate_of = NULL
+            WHERE duplicate_of IS NOT NULL AND id <> ALL(%s)
+        """, (list(duplicates),))
+        cleared = cur.rowcount
+        cur.execute("""
+            UPDATE transcript_analysis ta
+            SET duplicate_of = d.original_id
+            FROM unnest(%s::int[], %s::int[]) AS d(hand_id, original_id)
+            WHERE ta.id = d.hand_id AND ta.duplicate_of IS DISTINCT FROM d.original_id
+        """, (list(duplicates), list(duplicates.values())))
+        updated = cur.rowcount
+    conn.commit()
+    logger.info(f"Flagged {updated} hands as duplicates, cleared {cleared} stale flags")
+
+def main():
+    parser = argparse.ArgumentParser(description="Find near-duplicate hands in transcript_analysis and flag them with duplicate_of")
+    parser.add_argument('--threshold', type=float, default=settings.NEAR_DUPLICATE_THRESHOLD,
+                        help="estimated Jaccard similarity that counts as a duplicate")
+    parser.add_argument('--no-transcripts', action='store_true',
+                        help="compare extracted hands only, without reading the transcript cache")
+    parser.add_argument('--apply', action='store_true',
+                        help="store fingerprints and write duplicate_of (default: report only)")
+    args = parser.parse_args()
+
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            rows = load_rows(cur)
+        conn.commit()
+        logger.info(f"Fingerprinting {len(rows)} hands")
+        fingerprints = fingerprint_hands(rows, with_transcripts=not args.no_transcripts)
+        duplicates = find_clusters(fingerprints, args.threshold)
+
+        groups = defaultdict(list)
+        for hand_id, original_id in duplicates.items():
+            groups[original_id].append(hand_id)
+        current = {row['id']: row['duplicate_of'] for row in rows if row['duplicate_of'] is not None}
+        print(json.dumps({
+            'hands': len(rows),
+            'groups': len(groups),
+            'duplicates': len(duplicates),
+            'changed': sum(1 for hand_id in set(current) | set(duplicates)
+                           if current.get(hand_id) != duplicates.get(hand_id)),
+            'largest_groups': {
+                original_id: sorted(hand_ids)
+                for original_id, hand_ids in sorted(groups.items(), key=lambda item: -len(item[1]))[:10]
+            },
+        }, indent=2))
+        if not args.apply:
+            logger.info("Rerun with --apply to store fingerprints and flag duplicates")
+            return
+
+        fingerprint_rows = [
+            fingerprint_row(hand_id, prints['transcript'], prints['hand'])
+            for hand_id, prints in fingerprints.items()
+        ]
+        for start in range(0, len(fingerprint_rows), STORE_BATCH):
+            with conn.cursor() as cur:
+                store_fingerprints(cur, fingerprint_rows[start:start + STORE_BATCH])
+            conn.commit()
+        # Duplicates keep any embeddings they already have; search collapses them
+        apply_duplicates(conn, duplicates)
+    except Exception as e:
+        logger.error(f"Fatal error: {str(e)}")
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
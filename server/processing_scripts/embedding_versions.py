@@ -0,0 +1,160 @@
+import os
+import sys
+import json
+import argparse
+import logging
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.db import get_db_connection
+from utils.embedding_partitions import (
+    PARENT_TABLE, build_index, drop_version_indexes, index_lists, is_partitioned, needs_reindex, partitions
+)
+from utils.embedding_plan import embedding_plan
+from utils.embedding_versions import (
+    activate_version, create_version, get_version, list_versions, missing_embeddings, retire_version
+)
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Rows deleted per transaction when purging a version
+DELETE_BATCH = 10000
+
+# Migrating to a new embedding model without downtime:
+#   1. embedding_versions.py create --model voyage-3.5 --dimensions 1024
+#   2. generate_embeddings.py --version N  (the re-embed job; resumable, and
+#      --lease/--shard spread it over several processes). New hands are
+#      embedded into every live version meanwhile.
+#   3. retrieval_eval.py --version N  to compare it with the active version
+#   4. embedding_versions.py activate N  (builds N's indexes, then switches
+#      queries over in one transaction; refuses while N is missing hands)
+#   5. embedding_versions.py purge <old>  once nothing can still be using it
+# Activating the old version again rolls back, until it's purged.
+
+def version_tables(cur):
+    """Tables holding vector indexes: each partition, or the plain table"""
+    if is_partitioned(cur):
+        return list(partitions(cur))
+    return [PARENT_TABLE]
+
+def build_version_indexes(conn, version_id: int, force: bool = False):
+    """Per-partition indexes for one version, each in its own transaction"""
+    with conn.cursor() as cur:
+        tables = version_tables(cur)
+    conn.commit()
+    for table in tables:
+        with conn.cursor() as cur:
+            cur.execute(f"SELECT count(*) FROM {table} WHERE embedding_version = %s", (version_id,))
+            rows = cur.fetchone()[0]
+            if rows and (force or needs_reindex(index_lists(cur, table, version_id), rows)):
+                build_index(cur, table, version_id, rows)
+        conn.commit()
+
+def purge(conn, version_id: int, min_retired_minutes: float):
+    """Delete a retired version's rows in batches, then drop its indexes"""
+    with conn.cursor() as cur:
+        version = get_version(cur, version_id)
+        if version is None or version['state'] != 'retired':
+            raise ValueError(f"Only retired versions can be purged (version {version_id} is "
+                             f"{version['state'] if version else 'missing'})")
+        cur.execute("""
+            SELECT retired_at < CURRENT_TIMESTAMP - make_interval(mins => %s)
+            FROM embedding_versions WHERE id = %s
+        """, (min_retired_minutes, version_id))
+        if not cur.fetchone()[0]:
+            # Requests pin the version they started with; let them finish
+            raise ValueError(f"Version {version_id} was retired less than {min_retired_minutes} minutes ago")
+    conn.commit()
+
+    deleted = 0
+    while True:
+        with conn.cursor() as cur:
+            cur.execute("""
+                DELETE FROM hand_embeddings
+                WHERE id IN (
+                    SELECT id FROM hand_embeddings
+                    WHERE embedding_version = %s
+                    LIMIT %s
+                )
+            """, (version_id, DELETE_BATCH))
+            batch = cur.rowcount
+        conn.commit()
+        deleted += batch
+        if batch < DELETE_BATCH:
+            break
+        logger.info(f"Deleted {deleted} rows so far")
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM embedding_skips WHERE embedding_version = %s", (version_id,))
+        drop_version_indexes(cur, version_id)
+        cur.execute(f"DROP INDEX IF EXISTS {PARENT_TABLE}_v{int(version_id)}_idx")
+    conn.commit()
+    logger.info(f"Purged embedding version {version_id}: {deleted} rows")
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage embedding model versions and switch queries between them")
+    commands = parser.add_subparsers(dest='command')
+
+    create_parser = commands.add_parser('create', help="register a new version to build alongside the active one")
+    create_parser.add_argument('--model', required=True)
+    create_parser.add_argument('--dimensions', type=int, required=True)
+
+    index_parser = commands.add_parser('index', help="build a version's vector indexes")
+    index_parser.add_argument('version', type=int)
+    index_parser.add_argument('--all', action='store_true', help="rebuild indexes that are already sized right")
+
+    activate_parser = commands.add_parser('activate', help="build a version's indexes and switch queries to it")
+    activate_parser.add_argument('version', type=int)
+
+    retire_parser = commands.add_parser('retire', help="abandon a version that's building")
+    retire_parser.add_argument('version', type=int)
+
+    purge_parser = commands.add_parser('purge', help="delete a retired version's embeddings")
+    purge_parser.add_argument('version', type=int)
+    purge_parser.add_argument('--min-retired-minutes', type=float, default=10.0)
+
+    commands.add_parser('status', help="versions, row counts and backfill progress (default)")
+    args = parser.parse_args()
+
+    conn = get_db_connection()
+    try:
+        if args.command == 'create':
+            with conn.cursor() as cur:
+                version = create_version(cur, args.model, args.dimensions)
+            conn.commit()
+            logger.info(f"Fill it with: python processing_scripts/generate_embeddings.py --version {version['id']}")
+        elif args.command == 'index':
+            build_version_indexes(conn, args.version, force=args.all)
+        elif args.command == 'activate':
+            build_version_indexes(conn, args.version)
+            with conn.cursor() as cur:
+                activate_version(cur, args.version, embedding_plan())
+            conn.commit()
+        elif args.command == 'retire':
+            with conn.cursor() as cur:
+                retire_version(cur, args.version)
+            conn.commit()
+        elif args.command == 'purge':
+            purge(conn, args.version, args.min_retired_minutes)
+
+        with conn.cursor() as cur:
+            versions = list_versions(cur)
+            plan = embedding_plan()
+            for version in versions:
+                if version['state'] == 'building':
+                    version['missing'] = missing_embeddings(cur, version['id'], plan)
+        conn.commit()
+        print(json.dumps(versions, indent=2, default=str))
+    except Exception as e:
+        logger.error(f"Fatal error: {str(e)}")
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,22 @@
-
 import os
 import sys
+import argparse
 from datetime import datetime
 import pandas as pd
 import numpy as np
-from sqlalchemy import create_engine
 import logging
 from typing import Dict, List
-import psycopg2.extras
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from config.db import get_db_connection
 from utils.poker_embedding_processor import PokerEmbeddingProcessor
+from utils.embedding_plan import embedding_plan, planned_chunks
+from utils.embedding_versions import get_version, live_versions
+from utils.job_ledger import (
+    DEFAULT_LEASE_SECONDS, MISSING_PLANNED_EMBEDDINGS, EmbeddingJobLedger, default_worker_id, in_shard, parse_shard
+)
+from utils.progress_meter import ProgressMeter
 from data.pwds import Pwds
 
 # Configure logging
@@ -43,7 +47,8 @@ def store_embeddings(
     hand_id: int,
     chunk_type: str,
     embedding: List[float],
-    created_at: datetime
+    created_at: datetime,
+    version_id: int
 ):
     """Store embeddings in the database"""
     cursor = conn.cursor()
@@ -56,9 +61,9 @@ def store_embeddings(
         # Insert the embedding
         cursor.execute("""
             INSERT INTO hand_embeddings 
-            (hand_analysis_id, embedding_type, embedding, created_at)
-            VALUES (%s, %s, %s, %s)
-        """, (hand_id, chunk_type, embedding, created_at))
+            (hand_analysis_id, embedding_type, embedding_version, embedding, created_at)
+            VALUES (%s, %s, %s, %s, %s)
+        """, (hand_id, chunk_type, version_id, embedding, created_at))
         
     except Exception as e:
         logger.error(f"Error storing embedding for hand {hand_id}: {str(e)}")
@@ -67,62 +72,137 @@ def store_embeddings(
     finally:
         cursor.close()
 
+def load_hands(conn, versions: List[Dict], hand_ids: List[int] = None) -> pd.DataFrame:
+    """
+    Hands to embed: the given ids, or every hand missing a planned embedding
+    type in one of versions. Near-duplicates are left out either way.
+    """
+    if hand_ids is not None:
+        return pd.read_sql(
+            'SELECT * FROM transcript_analysis WHERE id = ANY(%(ids)s) AND duplicate_of IS NULL ORDER BY id',
+            conn,
+            params={'ids': list(hand_ids)}
+        )
+    return pd.read_sql(f"""
+        SELECT ta.*
+        FROM transcript_analysis ta
+        WHERE {MISSING_PLANNED_EMBEDDINGS}
+        ORDER BY ta.id
+    """, conn, params={'plan': embedding_plan(), 'versions': [version['id'] for version in versions]})
+
+def stored_types(conn, hand_id: int, version_id: int) -> List[str]:
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT embedding_type FROM hand_embeddings WHERE hand_analysis_id = %s AND embedding_version = %s",
+            (hand_id, version_id)
+        )
+        return [row[0] for row in cur.fetchall()]
+
+def embed_hand(conn, processor: PokerEmbeddingProcessor, row: pd.Series, versions: List[Dict]):
+    """
+    Compute and store the hand's planned embedding types that it doesn't
+    have yet, with each version's model, in one transaction
+    """
+    logger.info(f"Processing hand {row['id']}")
+    
+    # Prepare hand data
+    hand_data = prepare_hand_data(row)
+    
+    for version in versions:
+        # Only the chunks the embedding plan asks for are embedded
+        stored = stored_types(conn, int(row['id']), version['id'])
+        chunks_by_strategy = planned_chunks(processor, hand_data, skip=stored)
+        missing = set(embedding_plan()) - set(stored)
+        
+        for strategy_name, chunks in chunks_by_strategy.items():
+            embeddings = processor.get_embeddings(chunks, model=version['model'])
+            
+            # Store each embedding
+            for chunk_type, embedding in embeddings.items():
+                store_embeddings(
+                    conn,
+                    row['id'],
+                    f"{strategy_name}_{chunk_type}",
+                    embedding,
+                    row['created_at'],
+                    version['id']
+                )
+                missing.discard(f"{strategy_name}_{chunk_type}")
+        
+        # Whatever is still missing has no chunk for this hand; don't queue it again
+        with conn.cursor() as cur:
+            EmbeddingJobLedger.mark_not_applicable(cur, int(row['id']), version['id'], sorted(missing))
+    
+    # Commit after each hand is processed, together with its job record
+    with conn.cursor() as cur:
+        EmbeddingJobLedger.mark_done(cur, int(row['id']))
+    conn.commit()
+    logger.info(f"Successfully processed and stored embeddings for hand {row['id']}")
+
+def process_hands(conn, processor: PokerEmbeddingProcessor, df: pd.DataFrame, versions: List[Dict], meter: ProgressMeter, jobs: EmbeddingJobLedger = None):
+    for idx, row in df.iterrows():
+        try:
+            embed_hand(conn, processor, row, versions)
+            meter.record(True)
+        except Exception as e:
+            logger.error(f"Error processing hand {row['id']}: {str(e)}")
+            conn.rollback()
+            if jobs is not None:
+                jobs.fail(int(row['id']), str(e))
+            meter.record(False)
+
 def main():
+    parser = argparse.ArgumentParser(description="Generate Voyage embeddings for analyzed hands")
+    parser.add_argument('--shard', type=parse_shard, help="process only shard i of N, e.g. 0/4")
+    parser.add_argument('--lease', action='store_true',
+                        help="claim hands from embedding_jobs with leases instead of a static shard")
+    parser.add_argument('--worker-id', default=default_worker_id())
+    parser.add_argument('--lease-seconds', type=int, default=DEFAULT_LEASE_SECONDS)
+    parser.add_argument('--batch', type=int, default=10, help="hands claimed per lease")
+    parser.add_argument('--version', type=int,
+                        help="fill only this embedding version, e.g. one being built (default: every live version)")
+    args = parser.parse_args()
+    
     # Get database connection
     conn = get_db_connection()
     
     try:
-        # Read the transcript analysis data
-        df = pd.read_sql('SELECT * FROM transcript_analysis', conn)
-        logger.info(f"Read {len(df)} rows from transcript_analysis")
-        
         # Initialize the embedding processor with your API key
         api_key = Pwds.VOYAGE_AI_API_KEY
         if not api_key:
-            raise ValueError("ANTHROPIC_API_KEY environment variable not set")
+            raise ValueError("VOYAGE_AI_API_KEY is not set")
             
         processor = PokerEmbeddingProcessor(api_key)
         
-        # Process each hand
-        for idx, row in df.iterrows():
-            try:
-                if row['id'] < 347:
-                    continue
-                logger.info(f"Processing hand {row['id']}")
-                
-                # Prepare hand data
-                hand_data = prepare_hand_data(row)
-                
-                # Get embeddings using all three strategies
-                strategies = {
-                    'street_based': processor.create_street_based_chunks,
-                    'component_based': processor.create_component_based_chunks,
-                    'hybrid': processor.create_hybrid_chunks
-                }
-                
-                for strategy_name, chunk_func in strategies.items():
-                    # Get chunks and embeddings
-                    chunks = chunk_func(hand_data)
-                    embeddings = processor.get_embeddings(chunks)
-                    
-                    # Store each embedding
-                    for chunk_type, embedding in embeddings.items():
-                        store_embeddings(
-                            conn,
-                            row['id'],
-                            f"{strategy_name}_{chunk_type}",
-                            embedding,
-                            row['created_at']
-                        )
-                
-                # Commit after each hand is processed
-                conn.commit()
-                logger.info(f"Successfully processed and stored embeddings for hand {row['id']}")
-                
-            except Exception as e:
-                logger.error(f"Error processing hand {row['id']}: {str(e)}")
-                conn.rollback()
-                continue
+        with conn.cursor() as cur:
+            if args.version is None:
+                versions = live_versions(cur)
+            else:
+                version = get_version(cur, args.version)
+                if version is None or version['state'] == 'retired':
+                    raise ValueError(f"Embedding version {args.version} doesn't exist or is retired")
+                versions = [version]
+        conn.commit()
+        logger.info("Embedding with " + ", ".join(f"version {v['id']} ({v['model']})" for v in versions))
+        
+        if args.lease:
+            jobs = EmbeddingJobLedger()
+            logger.info(f"Queued {jobs.enqueue_backlog()} hands for embedding")
+            meter = ProgressMeter(f"Embeddings [{args.worker_id}]")
+            while True:
+                hand_ids = jobs.claim(args.worker_id, limit=args.batch, lease_seconds=args.lease_seconds)
+                if not hand_ids:
+                    break
+                process_hands(conn, processor, load_hands(conn, versions, hand_ids), versions, meter, jobs)
+        else:
+            # Read the transcript analysis backlog
+            df = load_hands(conn, versions)
+            df = df[[in_shard(int(hand_id), args.shard) for hand_id in df['id']]]
+            logger.info(f"Read {len(df)} hands missing planned embeddings ({', '.join(embedding_plan())}) from transcript_analysis")
+            meter = ProgressMeter("Embeddings", total=len(df))
+            process_hands(conn, processor, df, versions, meter)
+        
+        meter.summary()
                 
     except Exception as e:
         logger.error(f"Fatal error: {str(e)}")
@@ -131,4 +211,4 @@ def main():
         conn.close()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,103 @@
+import os
+import sys
+import time
+import signal
+import argparse
+import logging
+from typing import List
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.db import get_db_connection
+from utils.embedding_versions import live_versions
+from utils.job_ledger import DEFAULT_LEASE_SECONDS, EmbeddingJobLedger, JobLedger, default_worker_id
+from utils.poker_embedding_processor import PokerEmbeddingProcessor
+from utils.progress_meter import ProgressMeter
+from processing_scripts.analyze_transcripts import get_and_process_transcript
+from processing_scripts.generate_embeddings import embed_hand, load_hands
+from data.pwds import Pwds
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+running = True
+
+def stop(signum, frame):
+    """Finish the current job, then exit"""
+    global running
+    logger.info(f"Received signal {signum}, stopping after the current job")
+    running = False
+
+def embed_new_hands(processor: PokerEmbeddingProcessor, analysis_ids: List[int], embedding_jobs: EmbeddingJobLedger):
+    """
+    Embed a video's freshly inserted hands so they become searchable right
+    away, in every live embedding version (re-read per video, so a version
+    being built gets new hands too)
+    """
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            versions = live_versions(cur)
+        df = load_hands(conn, versions, analysis_ids)
+        for idx, row in df.iterrows():
+            try:
+                embed_hand(conn, processor, row, versions)
+            except Exception as e:
+                logger.error(f"Error embedding hand {row['id']}: {str(e)}")
+                conn.rollback()
+                # Leave it in the backlog for generate_embeddings.py to retry
+                embedding_jobs.fail(int(row['id']), str(e))
+    except Exception as e:
+        logger.error(f"Error loading hands {analysis_ids} to embed: {str(e)}")
+        conn.rollback()
+        embedding_jobs.enqueue(analysis_ids)
+    finally:
+        conn.close()
+
+def run(worker_id: str, poll_seconds: float, lease_seconds: int):
+    """
+    Consume ingest_jobs until stopped: fetch -> Claude extraction ->
+    transcript_analysis insert -> embeddings, one job at a time
+    """
+    ledger = JobLedger()
+    embedding_jobs = EmbeddingJobLedger()
+    processor = PokerEmbeddingProcessor(Pwds.VOYAGE_AI_API_KEY)
+    meter = ProgressMeter(f"Ingest worker [{worker_id}]", log_every=1)
+    
+    logger.info(f"Ingest worker {worker_id} started")
+    while running:
+        try:
+            claimed = ledger.claim(worker_id, limit=1, lease_seconds=lease_seconds)
+        except Exception as e:
+            logger.error(f"Error claiming ingest job: {str(e)}")
+            claimed = []
+        if not claimed:
+            time.sleep(poll_seconds)
+            continue
+        
+        url = claimed[0]
+        logger.info(f"Ingesting {url}")
+        analysis_ids = get_and_process_transcript(url, claimed=True)
+        if analysis_ids is not None:
+            embed_new_hands(processor, analysis_ids, embedding_jobs)
+        meter.record(analysis_ids is not None)
+    
+    meter.summary()
+
+def main():
+    parser = argparse.ArgumentParser(description="Background worker for videos submitted via /api/ingest")
+    parser.add_argument('--worker-id', default=default_worker_id())
+    parser.add_argument('--poll-seconds', type=float, default=5.0, help="idle wait between queue checks")
+    parser.add_argument('--lease-seconds', type=int, default=DEFAULT_LEASE_SECONDS)
+    args = parser.parse_args()
+    
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    run(args.worker_id, args.poll_seconds, args.lease_seconds)
+
+if __name__ == "__main__":
+    main()
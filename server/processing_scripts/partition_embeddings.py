@@ -0,0 +1,148 @@
+import os
+import sys
+import json
+import argparse
+import logging
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.db import get_db_connection
+from utils.embedding_partitions import (
+    DEFAULT_PARTITION, EMBEDDING_DIMENSIONS, PARENT_TABLE, build_index, create_corpus_trigger,
+    create_parent, detach_partition, drop_legacy_indexes, ensure_partition, is_partitioned,
+    needs_reindex, partition_status
+)
+from utils.embedding_versions import create_versions_table, live_versions
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+OLD_TABLE = f"{PARENT_TABLE}_unpartitioned"
+
+def convert_table(cur, keep_old: bool):
+    """Rebuild a plain hand_embeddings table as a partitioned one, keeping ids"""
+    logger.info(f"Converting {PARENT_TABLE} to a partitioned table")
+    cur.execute(f"LOCK TABLE {PARENT_TABLE} IN ACCESS EXCLUSIVE MODE")
+    cur.execute("""
+        SELECT atttypmod FROM pg_attribute
+        WHERE attrelid = %s::regclass AND attname = 'embedding'
+    """, (PARENT_TABLE,))
+    dimensions = cur.fetchone()[0]
+    cur.execute("SELECT pg_get_serial_sequence(%s, 'id')", (PARENT_TABLE,))
+    sequence = cur.fetchone()[0]
+
+    # Move the old table and its index names out of the way
+    cur.execute(f"ALTER TABLE {PARENT_TABLE} RENAME TO {OLD_TABLE}")
+    cur.execute(f"DROP TRIGGER IF EXISTS {PARENT_TABLE}_corpus_change ON {OLD_TABLE}")
+    cur.execute(f"DROP TRIGGER IF EXISTS {PARENT_TABLE}_corpus_generation ON {OLD_TABLE}")
+    cur.execute("SELECT indexname FROM pg_indexes WHERE tablename = %s", (OLD_TABLE,))
+    for (index,) in cur.fetchall():
+        if index.startswith(PARENT_TABLE):
+            cur.execute(f"ALTER INDEX {index} RENAME TO {OLD_TABLE}{index[len(PARENT_TABLE):]}")
+
+    # Tables from before embedding versions hold version 1 (voyage-3-large) rows only
+    create_versions_table(cur)
+    cur.execute("""
+        SELECT EXISTS (
+            SELECT 1 FROM pg_attribute
+            WHERE attrelid = %s::regclass AND attname = 'embedding_version' AND NOT attisdropped
+        )
+    """, (OLD_TABLE,))
+    version_column = 'embedding_version' if cur.fetchone()[0] else '1'
+
+    create_parent(cur, dimensions if dimensions > 0 else EMBEDDING_DIMENSIONS, sequence)
+    cur.execute(f"SELECT DISTINCT coalesce(embedding_type, 'unknown') FROM {OLD_TABLE}")
+    for (embedding_type,) in cur.fetchall():
+        ensure_partition(cur, embedding_type)
+
+    # One pass over the old table; Postgres routes each row to its partition
+    cur.execute(f"""
+        INSERT INTO {PARENT_TABLE} (id, hand_analysis_id, embedding_type, embedding_version, embedding, created_at)
+        SELECT id, hand_analysis_id, coalesce(embedding_type, 'unknown'), {version_column}, embedding, created_at
+        FROM {OLD_TABLE}
+    """)
+    logger.info(f"Copied {cur.rowcount} embeddings into partitions")
+    if not keep_old:
+        cur.execute(f"DROP TABLE {OLD_TABLE}")
+    # Created after the copy so existing rows aren't announced as new
+    create_corpus_trigger(cur)
+
+def migrate(conn, types, keep_old: bool):
+    """
+    Partition hand_embeddings if needed, give every type in the default
+    partition (and any --types) its own partition, and (re)build indexes
+    whose size no longer fits their partition
+    """
+    with conn.cursor() as cur:
+        if not is_partitioned(cur):
+            convert_table(cur, keep_old)
+        cur.execute(f"SELECT DISTINCT embedding_type FROM {DEFAULT_PARTITION}")
+        for embedding_type in sorted({row[0] for row in cur.fetchall()} | set(types or [])):
+            ensure_partition(cur, embedding_type)
+        reindex(cur, force=False)
+        cur.execute(f"ANALYZE {PARENT_TABLE}")
+    conn.commit()
+
+def reindex(cur, force: bool):
+    """
+    Build or resize the index of every live embedding version (active or
+    building) in every partition, then drop the old unversioned indexes.
+    Retired versions keep whatever index they have.
+    """
+    live = [version['id'] for version in live_versions(cur)]
+    for partition in partition_status(cur, live):
+        if partition['embedding_version'] not in live:
+            continue
+        if force or needs_reindex(partition['lists'], partition['rows']):
+            build_index(cur, partition['partition'], partition['embedding_version'], partition['rows'])
+    drop_legacy_indexes(cur)
+
+def main():
+    parser = argparse.ArgumentParser(description="Partition hand_embeddings by embedding type and size each partition's ANN index")
+    commands = parser.add_subparsers(dest='command')
+
+    migrate_parser = commands.add_parser('migrate', help="partition the table / split new types out of the default partition (default)")
+    migrate_parser.add_argument('--types', nargs='+', help="also create (empty) partitions for these embedding types")
+    migrate_parser.add_argument('--keep-old', action='store_true', help=f"keep the original table as {OLD_TABLE}")
+
+    reindex_parser = commands.add_parser('reindex', help="rebuild per-version partition indexes sized to current row counts")
+    reindex_parser.add_argument('--all', action='store_true', help="rebuild every index, not just ones that drifted")
+
+    detach_parser = commands.add_parser('detach', help="remove an embedding type from searches")
+    detach_parser.add_argument('embedding_type')
+    detach_parser.add_argument('--drop', action='store_true', help="drop the detached table too")
+
+    commands.add_parser('status', help="rows and index lists per partition and embedding version")
+    args = parser.parse_args()
+
+    conn = get_db_connection()
+    try:
+        if args.command in (None, 'migrate'):
+            migrate(conn, getattr(args, 'types', None), getattr(args, 'keep_old', False))
+        elif args.command == 'reindex':
+            with conn.cursor() as cur:
+                reindex(cur, force=args.all)
+            conn.commit()
+        elif args.command == 'detach':
+            with conn.cursor() as cur:
+                detach_partition(cur, args.embedding_type, drop=args.drop)
+            conn.commit()
+        with conn.cursor() as cur:
+            if is_partitioned(cur):
+                print(json.dumps(partition_status(cur), indent=2))
+            else:
+                print(f"{PARENT_TABLE} is not partitioned yet; run the migrate command")
+        conn.commit()
+    except Exception as e:
+        logger.error(f"Fatal error: {str(e)}")
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
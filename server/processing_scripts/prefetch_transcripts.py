@@ -0,0 +1,67 @@
+import os
+import sys
+import csv
+import time
+import argparse
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.read_transcript_from_yt import extract_video_id
+from utils.transcript_cache import cached_video_ids, get_cached_transcript
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+def read_video_urls(csv_path):
+    """Video urls from the 'url' column of the videos csv"""
+    with open(csv_path, newline='') as csvfile:
+        return [row['url'] for row in csv.DictReader(csvfile) if row.get('url')]
+
+def prefetch(urls, workers=4, refresh=False):
+    """Fetch and cache transcripts for every url not already cached"""
+    videos = {extract_video_id(url): url for url in urls}
+    videos.pop(None, None)
+    
+    if not refresh:
+        already_cached = cached_video_ids(videos.keys())
+        logger.info(f"{len(already_cached)} of {len(videos)} transcripts already cached")
+        videos = {vid: url for vid, url in videos.items() if vid not in already_cached}
+    
+    fetched, failed = 0, 0
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(get_cached_transcript, url=url, refresh=refresh): url
+            for url in videos.values()
+        }
+        for future in as_completed(futures):
+            result = future.result()
+            if result['success']:
+                fetched += 1
+            else:
+                failed += 1
+                logger.warning(f"Could not fetch {futures[future]}: {result['error']}")
+            if (fetched + failed) % 25 == 0:
+                logger.info(f"Prefetched {fetched + failed}/{len(videos)} transcripts")
+    
+    logger.info(
+        f"Prefetch done: {fetched} fetched, {failed} failed in {time.monotonic() - start:.1f}s"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk prefetch YouTube transcripts into the local cache")
+    parser.add_argument('--csv', default='data/clp_vids.csv', help="csv with a 'url' column")
+    parser.add_argument('--workers', type=int, default=4, help="concurrent YouTube fetches")
+    parser.add_argument('--refresh', action='store_true', help="refetch transcripts that are already cached")
+    args = parser.parse_args()
+    
+    prefetch(read_video_urls(args.csv), workers=args.workers, refresh=args.refresh)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import os
+import sys
+import argparse
+import logging
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.db import get_db_connection
+from utils.embedding_partitions import DEFAULT_PARTITION, detach_partition, is_partitioned, partitions
+from utils.embedding_plan import embedding_plan
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Rows deleted per transaction from an unpartitioned table
+DELETE_BATCH = 10000
+
+def stored_type_counts(cur):
+    cur.execute("SELECT embedding_type, count(*) FROM hand_embeddings GROUP BY 1 ORDER BY 1")
+    return dict(cur.fetchall())
+
+def prune_partitioned(conn, keep, detach_only: bool):
+    """Unplanned types with their own partition are detached/dropped; the rest deleted from the default partition"""
+    with conn.cursor() as cur:
+        for name, embedding_type in partitions(cur).items():
+            if embedding_type is not None and embedding_type not in keep:
+                detach_partition(cur, embedding_type, drop=not detach_only)
+        cur.execute(
+            f"DELETE FROM {DEFAULT_PARTITION} WHERE embedding_type <> ALL(%s)",
+            (list(keep),)
+        )
+        logger.info(f"Deleted {cur.rowcount} unplanned rows from {DEFAULT_PARTITION}")
+    conn.commit()
+
+def prune_table(conn, keep):
+    """Delete unplanned rows in batches so no single transaction gets huge"""
+    deleted = 0
+    while True:
+        with conn.cursor() as cur:
+            cur.execute("""
+                DELETE FROM hand_embeddings
+                WHERE id IN (
+                    SELECT id FROM hand_embeddings
+                    WHERE embedding_type <> ALL(%s)
+                    LIMIT %s
+                )
+            """, (list(keep), DELETE_BATCH))
+            batch = cur.rowcount
+        conn.commit()
+        deleted += batch
+        if batch < DELETE_BATCH:
+            break
+        logger.info(f"Deleted {deleted} rows so far")
+    logger.info(f"Deleted {deleted} unplanned rows")
+
+def main():
+    parser = argparse.ArgumentParser(description="Remove stored embedding types that aren't in the embedding plan")
+    parser.add_argument('--keep', nargs='+', default=[], help="types to keep in addition to settings.EMBEDDING_PLAN")
+    parser.add_argument('--apply', action='store_true', help="actually remove them (default: report only)")
+    parser.add_argument('--detach-only', action='store_true',
+                        help="detach unplanned partitions but keep their tables")
+    args = parser.parse_args()
+
+    keep = set(embedding_plan()) | set(args.keep)
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            counts = stored_type_counts(cur)
+            partitioned = is_partitioned(cur)
+        conn.commit()
+
+        unplanned = {t: n for t, n in counts.items() if t not in keep}
+        logger.info(f"Keeping {sorted(keep)}")
+        for embedding_type, rows in unplanned.items():
+            logger.info(f"Unplanned: {embedding_type} ({rows} rows)")
+        missing = sorted(keep - set(counts))
+        if missing:
+            logger.warning(f"Planned types with no stored rows yet: {missing}")
+        if not unplanned:
+            logger.info("Nothing to prune")
+            return
+        if not args.apply:
+            logger.info(f"Would remove {sum(unplanned.values())} rows; rerun with --apply")
+            return
+
+        if partitioned:
+            prune_partitioned(conn, keep, args.detach_only)
+        else:
+            prune_table(conn, keep)
+    except Exception as e:
+        logger.error(f"Fatal error: {str(e)}")
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+# server\utils\card_features.py
+import re
+import logging
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Card index = rank * 4 + suit, rank 0 = Two ... 12 = Ace
+RANK_WORDS = {
+    'two': 0, 'three': 1, 'four': 2, 'five': 3, 'six': 4, 'seven': 5, 'eight': 6,
+    'nine': 7, 'ten': 8, 'jack': 9, 'queen': 10, 'king': 11, 'ace': 12,
+    '2': 0, '3': 1, '4': 2, '5': 3, '6': 4, '7': 5, '8': 6, '9': 7,
+    '10': 8, 't': 8, 'j': 9, 'q': 10, 'k': 11, 'a': 12,
+}
+SUIT_WORDS = {
+    'club': 0, 'clubs': 0, 'c': 0,
+    'diamond': 1, 'diamonds': 1, 'd': 1,
+    'heart': 2, 'hearts': 2, 'h': 2,
+    'spade': 3, 'spades': 3, 's': 3,
+}
+
+# A card mention: "Jack of Hearts" / "jack hearts", or a run of shorthand
+# cards: "Jh", "10d", "AhKh", "Th9h". Shorthand is case-sensitive so words
+# like "as" or "ks" aren't read as cards.
+CARD_PATTERN = re.compile(
+    r'(?i:\b(two|three|four|five|six|seven|eight|nine|ten|jack|queen|king|ace)\s+(?:of\s+)?'
+    r'(clubs?|diamonds?|hearts?|spades?)\b)'
+    r'|\b((?:(?:10|[2-9TJQKA])[cdhs])+)\b'
+)
+SHORT_CARD_PATTERN = re.compile(r'(10|[2-9TJQKA])([cdhs])')
+# A lone "As", "Ah" or "Ad" is also a word ("As I said", "Ad break"). It's a
+# card next to another card ("As Kd", "Kd and As", "As, Kd") or when no word
+# follows it ("shoved with As").
+AMBIGUOUS_SHORTHAND = frozenset(['As', 'Ah', 'Ad'])
+CARD_SEPARATORS = frozenset(['', 'and', 'or', ',', '/', '&', '-'])
+FOLLOWING_WORD_PATTERN = re.compile(r'\s+[A-Za-z]')
+
+# Compact per-hand feature vector; every entry is scaled to [0, 1]
+FEATURE_NAMES = [
+    'has_hero',
+    'hero_high_rank',
+    'hero_low_rank',
+    'hero_pair',
+    'hero_suited',
+    'hero_gap',
+    'hero_broadway',
+    'has_board',
+    'board_size',
+    'board_high_rank',
+    'board_paired',
+    'board_flush_possible',
+    'board_flush_draw',
+    'board_straight_possible',
+    'hero_made_pair',
+    'hero_overpair',
+    'hero_flush_draw',
+    'hero_flush',
+]
+FEATURE_INDEX = {name: index for index, name in enumerate(FEATURE_NAMES)}
+HERO_FEATURES = FEATURE_NAMES[1:7]
+BOARD_FEATURES = FEATURE_NAMES[8:]
+
+# Relative importance of each feature in the structural distance
+FEATURE_WEIGHTS = np.array([
+    {
+        'hero_pair': 3.0, 'hero_suited': 2.0, 'hero_high_rank': 2.0, 'hero_low_rank': 1.5,
+        'hero_gap': 1.0, 'hero_broadway': 1.0,
+        'board_paired': 1.5, 'board_flush_possible': 1.5, 'board_flush_draw': 1.0,
+        'board_straight_possible': 1.0, 'board_high_rank': 1.0, 'board_size': 1.0,
+        'hero_made_pair': 2.0, 'hero_overpair': 1.5, 'hero_flush_draw': 1.5, 'hero_flush': 1.5,
+    }.get(name, 0.0)
+    for name in FEATURE_NAMES
+], dtype=np.float32)
+
+# Share of the structural score given to the exact hand class matching
+CLASS_MATCH_WEIGHT = 0.3
+
+
+def _card_matches(text: str) -> List[re.Match]:
+    """CARD_PATTERN matches in text, without ambiguous shorthand that reads as a word"""
+    matches = list(CARD_PATTERN.finditer(text))
+    kept = []
+    for i, match in enumerate(matches):
+        if match.group(3) in AMBIGUOUS_SHORTHAND:
+            before = matches[i - 1] if i > 0 else None
+            after = matches[i + 1] if i + 1 < len(matches) else None
+            next_to_card = (
+                (before is not None and text[before.end():match.start()].strip().lower() in CARD_SEPARATORS)
+                or (after is not None and text[match.end():after.start()].strip().lower() in CARD_SEPARATORS)
+            )
+            if not next_to_card and FOLLOWING_WORD_PATTERN.match(text, match.end()):
+                continue
+        kept.append(match)
+    return kept
+
+
+def parse_cards(text: Optional[str]) -> List[int]:
+    """Card indices mentioned in text, in order, without duplicates"""
+    if not text:
+        return []
+    cards = []
+    for match in _card_matches(text):
+        rank_word, suit_word, shorthand = match.groups()
+        if shorthand:
+            pairs = SHORT_CARD_PATTERN.findall(shorthand)
+        else:
+            pairs = [(rank_word, suit_word)]
+        for rank_name, suit_name in pairs:
+            card = RANK_WORDS[rank_name.lower()] * 4 + SUIT_WORDS[suit_name.lower()]
+            if card not in cards:
+                cards.append(card)
+    return cards
+
+
+def shorthand_hand(text: Optional[str]) -> Optional[str]:
+    """First two-card shorthand run in text ("AhKh", "Th9h"), taken as hero cards; None if there isn't one"""
+    for match in _card_matches(text or ''):
+        if match.group(3) and len(SHORT_CARD_PATTERN.findall(match.group(3))) == 2:
+            return match.group(3)
+    return None
+
+
+def mentions_cards(text: Optional[str]) -> bool:
+    """True when text names at least one card"""
+    return bool(text) and bool(_card_matches(text))
+
+
+def cards_mask(cards: Sequence[int]) -> int:
+    """52-bit mask with one bit per card"""
+    mask = 0
+    for card in cards:
+        mask |= 1 << card
+    return mask
+
+
+def hand_class_index(hero: Sequence[int]) -> int:
+    """0..168 for the starting hand class (pair/suited/offsuit ranks), -1 if unknown"""
+    if len(hero) != 2:
+        return -1
+    high, low = sorted((card // 4 for card in hero), reverse=True)
+    if high == low:
+        return high
+    suited = hero[0] % 4 == hero[1] % 4
+    # 13 pairs, then suited and offsuit combinations of distinct ranks
+    combo = high * (high - 1) // 2 + low
+    return 13 + combo * 2 + (0 if suited else 1)
+
+
+def _straight_possible(ranks: Sequence[int]) -> bool:
+    """Three distinct board ranks inside one five-rank window (ace plays low too)"""
+    distinct = set(ranks)
+    if 12 in distinct:
+        distinct.add(-1)
+    return any(
+        len({rank for rank in distinct if low <= rank <= low + 4}) >= 3
+        for low in range(-1, 9)
+    )
+
+
+def card_features(hero: Sequence[int], board: Sequence[int]) -> List[float]:
+    """Feature vector (see FEATURE_NAMES) for hero cards and board cards"""
+    features = [0.0] * len(FEATURE_NAMES)
+
+    def put(name, value):
+        features[FEATURE_INDEX[name]] = float(value)
+
+    hero = list(hero)[:2]
+    board = list(board)[:5]
+    hero_ranks = sorted((card // 4 for card in hero), reverse=True)
+    board_ranks = [card // 4 for card in board]
+    board_suits = [card % 4 for card in board]
+    suit_counts = [board_suits.count(suit) for suit in range(4)]
+
+    if len(hero) == 2:
+        high, low = hero_ranks
+        suited = hero[0] % 4 == hero[1] % 4
+        put('has_hero', 1)
+        put('hero_high_rank', high / 12)
+        put('hero_low_rank', low / 12)
+        put('hero_pair', high == low)
+        put('hero_suited', suited)
+        put('hero_gap', (high - low) / 12)
+        put('hero_broadway', low >= 8)
+
+    if board:
+        put('has_board', 1)
+        put('board_size', len(board) / 5)
+        put('board_high_rank', max(board_ranks) / 12)
+        put('board_paired', len(set(board_ranks)) < len(board_ranks))
+        put('board_flush_possible', max(suit_counts) >= 3)
+        put('board_flush_draw', max(suit_counts) == 2 and len(board) < 5)
+        put('board_straight_possible', _straight_possible(board_ranks))
+
+    if len(hero) == 2 and board:
+        high, low = hero_ranks
+        hero_suit_counts = [
+            suit_counts[suit] + sum(1 for card in hero if card % 4 == suit)
+            for suit in range(4)
+        ]
+        put('hero_made_pair', high == low or high in board_ranks or low in board_ranks)
+        put('hero_overpair', high == low and high > max(board_ranks))
+        put('hero_flush_draw', max(hero_suit_counts) == 4 and len(board) < 5)
+        put('hero_flush', max(hero_suit_counts) >= 5)
+
+    return features
+
+
+def hand_card_profile(hand: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Masks, hand class and features for a transcript_analysis row (or a query
+    hand with the same field names). Stored in the hand document.
+    """
+    hero = parse_cards(hand.get('caller_cards'))[:2]
+    board = []
+    for field in ('flop_cards', 'turn_card', 'river_card'):
+        board += [card for card in parse_cards(hand.get(field)) if card not in board and card not in hero]
+    board = board[:5]
+    return {
+        # Masks are below 2**52, so they fit JSON numbers and BIGINT exactly
+        'hero_mask': cards_mask(hero),
+        'board_mask': cards_mask(board),
+        'hand_class': hand_class_index(hero),
+        'features': card_features(hero, board),
+    }
+
+
+class StructuralScorer:
+    """
+    Vectorized structural similarity between a query hand and many hands.
+    Scores are in [0, 1]; scoring the whole corpus costs well under a
+    microsecond per hand.
+    """
+
+    def __init__(self, profiles: List[Dict[str, Any]]):
+        self.size = len(profiles)
+        self.features = np.array(
+            [profile['features'] for profile in profiles], dtype=np.float32
+        ).reshape(self.size, len(FEATURE_NAMES))
+        self.hand_classes = np.array([profile['hand_class'] for profile in profiles], dtype=np.int16)
+        self.hero_masks = np.array([profile['hero_mask'] for profile in profiles], dtype=np.uint64)
+        self.board_masks = np.array([profile['board_mask'] for profile in profiles], dtype=np.uint64)
+
+    def score(self, query_profile: Dict[str, Any]) -> np.ndarray:
+        query = np.asarray(query_profile['features'], dtype=np.float32)
+        weights = FEATURE_WEIGHTS.copy()
+        # Only compare what the query actually describes
+        if not query[FEATURE_INDEX['has_hero']]:
+            weights[[FEATURE_INDEX[name] for name in HERO_FEATURES]] = 0
+        if not query[FEATURE_INDEX['has_board']]:
+            weights[[FEATURE_INDEX[name] for name in BOARD_FEATURES]] = 0
+        if self.size == 0 or not weights.any():
+            return np.zeros(self.size, dtype=np.float32)
+
+        distance = np.abs(self.features - query) @ weights / weights.sum()
+        scores = 1.0 - distance
+
+        if query_profile['hand_class'] >= 0:
+            class_match = (self.hand_classes == query_profile['hand_class']).astype(np.float32)
+            scores = (1 - CLASS_MATCH_WEIGHT) * scores + CLASS_MATCH_WEIGHT * class_match
+        return scores.astype(np.float32)
+
+    def shared_cards(self, query_profile: Dict[str, Any]) -> np.ndarray:
+        """Number of exact hero cards and board cards each hand shares with the query"""
+        hero = np.bitwise_count(self.hero_masks & np.uint64(query_profile['hero_mask']))
+        board = np.bitwise_count(self.board_masks & np.uint64(query_profile['board_mask']))
+        return hero.astype(np.int16) + board.astype(np.int16)
+
+
+def structural_rerank(
+        hands: List[Dict[str, Any]],
+        query_hand: Dict[str, Any],
+        weight: float,
+        distance_key: str = 'similarity_distance'
+    ) -> List[Dict[str, Any]]:
+    """
+    Reorder retrieved hands by a blend of embedding similarity and structural
+    similarity to the query. Hands keep their embedding distance; each gets a
+    'structural_score'. Returns the hands unchanged when the query has no cards.
+    """
+    query_profile = hand_card_profile(query_hand)
+    if not hands or weight <= 0 or not (query_profile['hero_mask'] or query_profile['board_mask']):
+        return hands
+
+    profiles = [
+        (hand.get('hand_document') or {}).get('cards') or hand_card_profile(
+            (hand.get('hand_document') or {}).get('fields') or hand
+        )
+        for hand in hands
+    ]
+    structural = StructuralScorer(profiles).score(query_profile)
+    embedding = np.array([1 - hand.get(distance_key, 0) for hand in hands], dtype=np.float32)
+    blended = (1 - weight) * embedding + weight * structural
+
+    for hand, score in zip(hands, structural):
+        hand['structural_score'] = float(score)
+    order = np.argsort(-blended, kind='stable')
+    return [hands[index] for index in order]
@@ -1,20 +1,33 @@
 # app/services/claude_service.py
 import os
 import json
+import hashlib
 import logging
-from anthropic import Anthropic
+import threading
+from anthropic import Anthropic, APIConnectionError, RateLimitError, InternalServerError
 
 from data.pwds import Pwds
+from utils.resilience import (
+    CircuitOpenError, DeadlineExceeded, ProviderUnavailable, ResponseCache, get_breaker, retry_call
+)
 
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Errors worth retrying; anything else (bad request, auth) fails immediately
+RETRYABLE_ERRORS = (APIConnectionError, RateLimitError, InternalServerError)
+
+# Last good completion per prompt, served while the breaker is open
+_response_cache = ResponseCache()
+
 class ClaudeService:
     def __init__(self):
         self.api_key = Pwds.ANTRHOPIC_API_KEY
         if not self.api_key:
             raise ValueError("ANTHROPIC_API_KEY environment variable is required")
-        self.client = Anthropic(api_key=self.api_key)
+        # Retries are handled by the resilience layer, not the SDK
+        self.client = Anthropic(api_key=self.api_key, max_retries=0)
+        self.breaker = get_breaker('anthropic')
         self.model = "claude-3-5-sonnet-20241022"
         self.system_prompt = """You are a poker hand analyzer. Your task is to extract structured information from poker hand transcripts.
         Focus on identifying:
@@ -23,29 +36,111 @@ class ClaudeService:
         3. Street by street action including positions and betting
         4. Commentary from Bart
         Keep your analysis precise and poker-specific."""
+        # One service is shared by request threads and extraction workers
+        self._local = threading.local()
+
+    @property
+    def last_usage(self):
+        """Token usage of the calling thread's most recent completion, or None"""
+        return getattr(self._local, 'usage', None)
+
+    def warm_up(self):
+        """
+        Open the client's keep-alive connection (DNS, TLS) with a free request
+        so the first analysis doesn't pay for the handshake. Any HTTP response
+        leaves the connection pooled, so only connection errors are raised.
+        """
+        try:
+            self.client.models.list(limit=1)
+        except APIConnectionError:
+            raise
+        except Exception as e:
+            logger.debug(f"Claude warm-up request returned an error: {str(e)}")
 
-    def complete(self, user_prompt):
+    def _build_system_blocks(self, static_prompt=None):
+        """
+        Static prefix of every request: the system prompt followed by the
+        caller's fixed instructions. The last block carries the cache
+        breakpoint so the whole prefix is cached provider-side.
+        """
+        blocks = [{"type": "text", "text": self.system_prompt}]
+        if static_prompt:
+            blocks.append({"type": "text", "text": static_prompt})
+        blocks[-1]["cache_control"] = {"type": "ephemeral"}
+        return blocks
+
+    def _record_usage(self, message):
+        """Log token usage, including prompt cache reads/writes, for each call"""
+        usage = message.usage
+        self._local.usage = {
+            'input_tokens': usage.input_tokens,
+            'output_tokens': usage.output_tokens,
+            'cache_creation_input_tokens': getattr(usage, 'cache_creation_input_tokens', None) or 0,
+            'cache_read_input_tokens': getattr(usage, 'cache_read_input_tokens', None) or 0,
+        }
+        logger.info(
+            "Claude usage: input=%(input_tokens)s output=%(output_tokens)s "
+            "cache_write=%(cache_creation_input_tokens)s cache_read=%(cache_read_input_tokens)s",
+            self._local.usage
+        )
+
+    def _create_message(self, user_prompt, static_prompt=None, deadline=None):
+        request_options = {}
+        if deadline is not None and deadline.remaining() is not None:
+            request_options['timeout'] = deadline.remaining()
+        return self.client.messages.create(
+            model=self.model,
+            max_tokens=4096,
+            temperature=0,  # Using 0 for consistent, structured output
+            system=self._build_system_blocks(static_prompt),
+            messages=[{
+                "role": "user",
+                "content": user_prompt
+            }],
+            **request_options
+        )
+
+    def complete(self, user_prompt, deadline=None, static_prompt=None):
         """
         Send prompt to Claude and return structured analysis
+        static_prompt holds instructions that are identical across calls; it is
+        sent ahead of user_prompt and marked for prompt caching.
+        Retries transient failures within the deadline; while the circuit is open
+        the last good response for the same prompt is served if we have one.
+        Transient failures left after the last retry raise ProviderUnavailable.
         Returns: dict with analyzed poker hand data
         """
+        cache_key = hashlib.sha256(
+            f"{self.model}:{static_prompt or ''}:{user_prompt}".encode('utf-8')
+        ).hexdigest()
         try:
-            message = self.client.messages.create(
-                model=self.model,
-                max_tokens=4096,
-                temperature=0,  # Using 0 for consistent, structured output
-                system=self.system_prompt,
-                messages=[{
-                    "role": "user",
-                    "content": user_prompt
-                }]
-            )
+            try:
+                message = retry_call(
+                    self._create_message,
+                    user_prompt,
+                    static_prompt,
+                    deadline,
+                    deadline=deadline,
+                    breaker=self.breaker,
+                    retry_on=RETRYABLE_ERRORS
+                )
+            except (CircuitOpenError, DeadlineExceeded) + RETRYABLE_ERRORS as e:
+                cached = _response_cache.get(cache_key)
+                if cached is not None:
+                    logger.warning("Claude unavailable, serving cached response")
+                    return cached
+                if isinstance(e, RETRYABLE_ERRORS):
+                    raise ProviderUnavailable(f"Claude unavailable after retries: {str(e)}") from e
+                raise
+
+            self._record_usage(message)
             
             # Extract JSON from response
             try:
                 # Claude should return a JSON string, but let's be defensive
                 response_text = message.content[0].text
                 logger.debug(f"Received Claude response: {response_text}")
+                _response_cache.put(cache_key, response_text)
                 return response_text
                 
             except json.JSONDecodeError as e:
@@ -0,0 +1,161 @@
+# server\utils\context_packer.py
+import re
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import settings
+from utils.hand_document import STREETS, estimate_tokens, get_hand_document
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Relevance of a street's commentary given the street the query has reached.
+# The current and next street matter most, history less, far-off streets least.
+STREET_DISTANCE_WEIGHTS = {0: 1.0, 1: 0.9, 2: 0.45, 3: 0.3}
+PAST_STREET_WEIGHT = 0.6
+
+_SENTENCE_SPLIT = re.compile(r'(?<=[.!?])\s+')
+_NON_WORD = re.compile(r'[^a-z0-9 ]+')
+_STREET_MENTIONS = [
+    ('river', re.compile(r'\briver(?:s|ed)?\b')),
+    ('turn', re.compile(r'\bturn(?:s|ed)?\b')),
+    ('flop', re.compile(r'\bflop(?:s|ped)?\b')),
+]
+
+
+def detect_query_street(query: str) -> str:
+    """Latest street the query mentions; queries without a board are preflop"""
+    query_lower = query.lower()
+    for street, pattern in _STREET_MENTIONS:
+        if pattern.search(query_lower):
+            return street
+    return 'preflop'
+
+
+def _normalize_sentence(sentence: str) -> str:
+    return ' '.join(_NON_WORD.sub(' ', sentence.lower()).split())
+
+
+class ContextPacker:
+    """
+    Packs retrieved hands into a prompt context under a token budget.
+
+    Every hand keeps its header and per-street action lines. Commentary is
+    the bulk of the text, so it is ranked by hand similarity and by how
+    relevant its street is to the query's street, de-duplicated across
+    hands, and trimmed (least relevant first) until the budget is met.
+    """
+
+    def __init__(self, token_budget: int = None, min_segment_tokens: int = 40):
+        self.token_budget = token_budget or settings.CONTEXT_TOKEN_BUDGET
+        self.min_segment_tokens = min_segment_tokens
+
+    @staticmethod
+    def street_weight(street: str, query_street: str) -> float:
+        distance = STREETS.index(street) - STREETS.index(query_street)
+        if distance < 0:
+            return PAST_STREET_WEIGHT
+        return STREET_DISTANCE_WEIGHTS[distance]
+
+    def _dedupe(self, text: str, seen: set) -> str:
+        """Drop sentences already included from another hand"""
+        kept = []
+        for sentence in _SENTENCE_SPLIT.split(text.strip()):
+            key = _normalize_sentence(sentence)
+            if not key or key in seen:
+                continue
+            seen.add(key)
+            kept.append(sentence)
+        return ' '.join(kept)
+
+    def _trim(self, text: str, max_tokens: int) -> Optional[str]:
+        """Keep the leading sentences that fit; None if too little would remain"""
+        if max_tokens < self.min_segment_tokens:
+            return None
+        kept, used = [], 0
+        for sentence in _SENTENCE_SPLIT.split(text):
+            cost = estimate_tokens(sentence) + 1
+            if used + cost > max_tokens:
+                break
+            kept.append(sentence)
+            used += cost
+        if not kept:
+            return None
+        return ' '.join(kept) + ' [...]'
+
+    def pack(self, query: str, hands: List[Dict[str, Any]]) -> Tuple[str, Dict[str, int]]:
+        """
+        Build the retrieved-hands context for the analysis prompt from each
+        hand's precomputed document.
+        Returns: (context_text, stats)
+        """
+        query_street = detect_query_street(query)
+        documents = [get_hand_document(hand) for hand in hands]
+        ranked = sorted(
+            range(len(hands)),
+            key=lambda position: hands[position].get('similarity_distance', 0)
+        )
+
+        # Skeleton (headers + action lines) for as many hands as fit, best first
+        budget = self.token_budget
+        included_hands = []
+        for position in ranked:
+            document = documents[position]
+            cost = document['token_counts']['header'] + 10
+            cost += sum(street['action_tokens'] for street in document['streets'])
+            if cost > budget and included_hands:
+                break
+            included_hands.append(position)
+            budget -= cost
+
+        # Candidate commentary segments ordered by relevance
+        candidates = []
+        for position in included_hands:
+            similarity = 1 - hands[position].get('similarity_distance', 0)
+            for street in documents[position]['streets']:
+                if street['commentary']:
+                    score = similarity * self.street_weight(street['street'], query_street)
+                    candidates.append((score, position, street))
+        candidates.sort(key=lambda c: c[0], reverse=True)
+
+        seen_sentences = set()
+        included = {}
+        stats = {'segments': len(candidates), 'trimmed': 0, 'dropped': 0, 'deduped': 0}
+        for score, position, street in candidates:
+            commentary = street['commentary']
+            text = self._dedupe(commentary, seen_sentences)
+            if len(text) < len(commentary.strip()):
+                stats['deduped'] += 1
+            if not text:
+                stats['dropped'] += 1
+                continue
+            cost = (street['commentary_tokens'] if text == commentary else estimate_tokens(text)) + 3
+            if cost > budget:
+                text = self._trim(text, budget - 3)
+                if text is None:
+                    stats['dropped'] += 1
+                    continue
+                stats['trimmed'] += 1
+                cost = estimate_tokens(text) + 3
+            included[(position, street['street'])] = text
+            budget -= cost
+
+        # Render in retrieval order with streets in play order
+        hands_context = []
+        for position in included_hands:
+            document = documents[position]
+            hand_text = document['header']
+            for street in document['streets']:
+                hand_text += street['action_text']
+                if (position, street['street']) in included:
+                    hand_text += f"Commentary: {included[(position, street['street'])]}\n"
+            similarity_score = 1 - hands[position].get('similarity_distance', 0)
+            hands_context.append(f"Hand (Similarity: {similarity_score:.2f}):\n{hand_text}\n")
+
+        context = "\n".join(hands_context)
+        stats['hands'] = len(included_hands)
+        stats['hands_dropped'] = len(hands) - len(included_hands)
+        stats['tokens'] = estimate_tokens(context)
+        logger.debug(f"Packed context for query street '{query_street}': {stats}")
+        return context, stats
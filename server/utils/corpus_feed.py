@@ -0,0 +1,243 @@
+# server\utils\corpus_feed.py
+import os
+import json
+import time
+import select
+import logging
+import threading
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+from config import settings
+from config.db import get_db_connection
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Channel the notify_corpus_change() triggers publish on (database_schema_psql.txt)
+CORPUS_CHANNEL = 'corpus_changes'
+
+_version_lock = threading.Lock()
+_version = 0
+
+_subscribers: List[Callable[[Dict[str, Any]], None]] = []
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def corpus_version() -> int:
+    """
+    In-process corpus generation, bumped whenever the feed sees a change.
+    Anything cached from the corpus should be discarded once it's older.
+    """
+    return _version
+
+
+def bump_corpus_version() -> int:
+    global _version
+    with _version_lock:
+        _version += 1
+        return _version
+
+
+def subscribe(callback: Callable[[Dict[str, Any]], None]):
+    """
+    Call callback(change) for every batch of corpus changes this worker sees.
+    change = {
+        'version': new corpus version,
+        'embeddings': [{'id', 'hand_id', 'type', 'embedding_version', 'vector'}] inserted or updated,
+        'deleted_embeddings': [{'id', 'hand_id', 'type'}],
+        'hands': [ids of new or edited hands],
+        'deleted_hands': [ids],
+        'resync': True if notifications may have been missed,
+        'version_switched': True if another embedding version became active,
+    }
+    Only rows of the active embedding version are reported.
+    """
+    _subscribers.append(callback)
+
+
+def parse_vector(text: str) -> np.ndarray:
+    """pgvector text literal '[0.1,0.2,...]' to a float32 array"""
+    return np.array(json.loads(text), dtype=np.float32)
+
+
+def fetch_embeddings(cur, ids: List[int]) -> List[Dict[str, Any]]:
+    """
+    Current rows for the given hand_embeddings ids that belong to the active
+    embedding version (deleted ids are skipped)
+    """
+    if not ids:
+        return []
+    cur.execute("""
+        SELECT he.id, he.hand_analysis_id, he.embedding_type, he.embedding_version, he.embedding::text
+        FROM hand_embeddings he
+        JOIN embedding_versions v ON v.id = he.embedding_version AND v.state = 'active'
+        WHERE he.id = ANY(%s)
+        ORDER BY he.id
+    """, (list(ids),))
+    return [
+        {'id': row[0], 'hand_id': row[1], 'type': row[2], 'embedding_version': row[3], 'vector': parse_vector(row[4])}
+        for row in cur.fetchall()
+    ]
+
+
+def fetch_active_version_id(cur) -> int:
+    cur.execute("SELECT id FROM embedding_versions WHERE state = 'active'")
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+class CorpusListener:
+    """
+    Per-worker LISTEN loop on a dedicated (unpooled) connection. Notifications
+    arriving close together are applied as one batch: only the changed vectors
+    are fetched, then the corpus version is bumped and subscribers are called.
+    After a reconnect, rows added while disconnected are caught up by id.
+    """
+
+    def __init__(
+            self,
+            debounce_seconds: float = settings.CORPUS_FEED_DEBOUNCE_SECONDS,
+            reconnect_seconds: float = settings.CORPUS_FEED_RECONNECT_SECONDS
+        ):
+        self.debounce_seconds = debounce_seconds
+        self.reconnect_seconds = reconnect_seconds
+        self.pid = os.getpid()
+        # Highest hand_embeddings id applied so far
+        self.high_water = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='corpus-feed', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = get_db_connection(pooled=False)
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {CORPUS_CHANNEL}")
+                    self._catch_up(cur)
+                logger.info(f"Corpus feed listening on {CORPUS_CHANNEL} (pid {self.pid})")
+                self._listen(conn)
+            except Exception as e:
+                logger.error(f"Corpus feed connection lost: {str(e)}")
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+            self._stop.wait(self.reconnect_seconds)
+
+    def _listen(self, conn):
+        while not self._stop.is_set():
+            if select.select([conn], [], [], self.reconnect_seconds) == ([], [], []):
+                continue
+            conn.poll()
+            # Let the rest of a burst (e.g. one hand's embeddings) arrive
+            time.sleep(self.debounce_seconds)
+            conn.poll()
+            events = []
+            while conn.notifies:
+                notify = conn.notifies.pop(0)
+                try:
+                    events.append(json.loads(notify.payload))
+                except ValueError:
+                    logger.warning(f"Ignoring malformed corpus notification: {notify.payload!r}")
+            if events:
+                with conn.cursor() as cur:
+                    self._apply(cur, events)
+
+    def _catch_up(self, cur):
+        """Set the high-water mark on first connect; afterwards pick up what was missed"""
+        cur.execute("SELECT coalesce(max(id), 0) FROM hand_embeddings")
+        max_id = cur.fetchone()[0]
+        if self.high_water is None:
+            self.high_water = max_id
+            return
+        cur.execute("SELECT id FROM hand_embeddings WHERE id > %s", (self.high_water,))
+        missed = [row[0] for row in cur.fetchall()]
+        # Edits and deletes while disconnected can't be recovered incrementally
+        self._publish({
+            'embeddings': fetch_embeddings(cur, missed),
+            'deleted_embeddings': [],
+            'hands': [],
+            'deleted_hands': [],
+            'resync': True,
+            'version_switched': False,
+        })
+
+    def _apply(self, cur, events: List[Dict[str, Any]]):
+        upserted = {}
+        deleted = {}
+        hands = set()
+        deleted_hands = set()
+        version_switched = False
+        active = fetch_active_version_id(cur)
+        for event in events:
+            if event.get('table') == 'embedding_versions':
+                version_switched = True
+            elif event.get('table') == 'hand_embeddings':
+                # Backfilling or purging another version doesn't change what's searched
+                if event.get('version', active) != active:
+                    continue
+                if event['op'] == 'DELETE':
+                    upserted.pop(event['id'], None)
+                    deleted[event['id']] = {'id': event['id'], 'hand_id': event['hand_id'], 'type': event['type']}
+                else:
+                    deleted.pop(event['id'], None)
+                    upserted[event['id']] = event
+            elif event.get('table') == 'transcript_analysis':
+                if event['op'] == 'DELETE':
+                    hands.discard(event['id'])
+                    deleted_hands.add(event['id'])
+                else:
+                    hands.add(event['id'])
+
+        self._publish({
+            'embeddings': fetch_embeddings(cur, sorted(upserted)),
+            'deleted_embeddings': list(deleted.values()),
+            'hands': sorted(hands),
+            'deleted_hands': sorted(deleted_hands),
+            'resync': False,
+            'version_switched': version_switched,
+        })
+
+    def _publish(self, change: Dict[str, Any]):
+        if not (change['embeddings'] or change['deleted_embeddings'] or change['hands']
+                or change['deleted_hands'] or change['resync'] or change['version_switched']):
+            return
+        if change['embeddings']:
+            self.high_water = max(self.high_water, max(row['id'] for row in change['embeddings']))
+        change['version'] = bump_corpus_version()
+        logger.info(
+            f"Corpus version {change['version']}: {len(change['embeddings'])} embeddings, "
+            f"{len(change['deleted_embeddings'])} deleted, {len(change['hands'])} hands changed, "
+            f"{len(change['deleted_hands'])} deleted"
+            + (", embedding version switched" if change['version_switched'] else "")
+        )
+        for callback in list(_subscribers):
+            try:
+                callback(change)
+            except Exception as e:
+                logger.error(f"Corpus change subscriber {callback!r} failed: {str(e)}", exc_info=True)
+
+
+def start_corpus_feed() -> bool:
+    """Start this process's listener once (call after fork). Returns True if started."""
+    global _listener
+    with _listener_lock:
+        if _listener is not None and _listener.pid == os.getpid():
+            return False
+        _listener = CorpusListener()
+        _listener.start()
+        return True
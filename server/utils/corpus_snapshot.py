@@ -0,0 +1,342 @@
+# server\utils\corpus_snapshot.py
+import io
+import os
+import json
+import struct
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+
+from config.db import get_db_connection
+from utils.embedding_loader import COPY_SIGNATURE, EmbeddingMatrix, load_embeddings
+from utils.embedding_versions import adopt_version, fetch_active_version
+from utils.preflop_grid import corpus_version
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT_VERSION = 1
+
+MANIFEST_FILE = 'manifest.json'
+HANDS_FILE = 'transcript_analysis.parquet'
+EMBEDDINGS_FILE = 'hand_embeddings.parquet'
+# Uncompressed Arrow IPC copy of the embeddings, for memory-mapping
+EMBEDDINGS_ARROW_FILE = 'hand_embeddings.arrow'
+
+# Rows per Parquet row group / COPY batch
+BATCH_SIZE = 5000
+
+# Microseconds between the Unix and PostgreSQL (2000-01-01) epochs
+PG_EPOCH_OFFSET_US = 946684800 * 1000000
+
+
+def _pa():
+    # pyarrow is only needed by the snapshot tool, not by the API workers
+    import pyarrow
+    return pyarrow
+
+
+def _arrow_type(type_code: int):
+    """Arrow type for a psycopg2 column type code (anything unknown is kept as text)"""
+    pa = _pa()
+    return {
+        16: pa.bool_(),
+        20: pa.int64(),
+        21: pa.int16(),
+        23: pa.int32(),
+        700: pa.float32(),
+        701: pa.float64(),
+        1007: pa.list_(pa.int32()),
+        1114: pa.timestamp('us'),
+        1184: pa.timestamp('us', tz='UTC'),
+    }.get(type_code, pa.string())
+
+
+def _arrow_value(value, arrow_type):
+    if value is None:
+        return None
+    if _pa().types.is_string(arrow_type) and not isinstance(value, str):
+        # JSONB arrives as dicts/lists; everything else unknown as its text form
+        return json.dumps(value) if isinstance(value, (dict, list)) else str(value)
+    return value
+
+
+def read_manifest(path: str) -> Dict[str, Any]:
+    with open(os.path.join(path, MANIFEST_FILE), encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get('format_version') != SNAPSHOT_FORMAT_VERSION:
+        raise ValueError(f"Unsupported snapshot format {manifest.get('format_version')}")
+    return manifest
+
+
+def _export_hands(conn, path: str) -> Dict[str, Any]:
+    pa = _pa()
+    import pyarrow.parquet as pq
+
+    writer = None
+    rows = 0
+    # Named cursor: rows stream from the server in batches instead of all at once
+    with conn.cursor(name='snapshot_hands') as cur:
+        cur.itersize = BATCH_SIZE
+        cur.execute("SELECT * FROM transcript_analysis ORDER BY id")
+        while True:
+            batch = cur.fetchmany(BATCH_SIZE)
+            if writer is None:
+                schema = pa.schema([(column.name, _arrow_type(column.type_code)) for column in cur.description])
+                writer = pq.ParquetWriter(os.path.join(path, HANDS_FILE), schema, compression='zstd')
+            if not batch:
+                break
+            columns = [
+                pa.array([_arrow_value(row[i], field.type) for row in batch], type=field.type)
+                for i, field in enumerate(schema)
+            ]
+            writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+            rows += len(batch)
+    writer.close()
+    return {'file': HANDS_FILE, 'rows': rows, 'columns': schema.names}
+
+
+def _embeddings_table(conn, embedding_types: Optional[Sequence[str]], embedding_version: int):
+    pa = _pa()
+    embeddings = load_embeddings(conn, embedding_types=embedding_types, embedding_version=embedding_version)
+    with conn.cursor() as cur:
+        cur.execute("SELECT id, created_at FROM hand_embeddings WHERE id = ANY(%s)", (embeddings.ids.tolist(),))
+        created = dict(cur.fetchall())
+
+    flat = pa.array(embeddings.matrix.reshape(-1), type=pa.float32())
+    return embeddings, pa.table({
+        'id': pa.array(embeddings.ids, type=pa.int32()),
+        'hand_analysis_id': pa.array(embeddings.hand_ids, type=pa.int32(), mask=embeddings.hand_ids < 0),
+        'embedding_type': pa.array(embeddings.types, type=pa.string()),
+        'created_at': pa.array([created.get(int(i)) for i in embeddings.ids], type=pa.timestamp('us', tz='UTC')),
+        'embedding': pa.FixedSizeListArray.from_arrays(flat, embeddings.dimensions),
+    })
+
+
+def export_snapshot(path: str, embedding_types: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+    """
+    Write transcript_analysis and hand_embeddings to Parquet (plus an Arrow
+    IPC copy of the embeddings) under path, with a manifest. Everything is
+    read in one repeatable-read transaction, so the files agree with each
+    other and with the recorded corpus version. Only the active embedding
+    version is exported; the manifest records its model.
+    """
+    pa = _pa()
+    import pyarrow.parquet as pq
+
+    os.makedirs(path, exist_ok=True)
+    conn = get_db_connection()
+    try:
+        conn.set_session(isolation_level='REPEATABLE READ', readonly=True)
+        with conn.cursor() as cur:
+            version = corpus_version(cur)
+            embedding_version = fetch_active_version(cur)
+        hands = _export_hands(conn, path)
+        embeddings, table = _embeddings_table(conn, embedding_types, embedding_version['id'])
+        conn.commit()
+    finally:
+        conn.set_session(isolation_level='DEFAULT', readonly='DEFAULT')
+        conn.close()
+
+    pq.write_table(table, os.path.join(path, EMBEDDINGS_FILE), compression='zstd', row_group_size=BATCH_SIZE)
+    with pa.OSFile(os.path.join(path, EMBEDDINGS_ARROW_FILE), 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            # One record batch, so readers get the matrix as a single zero-copy buffer
+            writer.write_table(table)
+
+    type_counts = {}
+    for embedding_type in embeddings.types:
+        type_counts[embedding_type] = type_counts.get(embedding_type, 0) + 1
+    manifest = {
+        'format_version': SNAPSHOT_FORMAT_VERSION,
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'model': embedding_version['model'],
+        'dimensions': embeddings.dimensions,
+        'corpus_version': version,
+        'embedding_types': type_counts,
+        'tables': {
+            'transcript_analysis': hands,
+            'hand_embeddings': {
+                'file': EMBEDDINGS_FILE,
+                'arrow_file': EMBEDDINGS_ARROW_FILE,
+                'rows': len(embeddings),
+            },
+        },
+    }
+    with open(os.path.join(path, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    logger.info(f"Exported {hands['rows']} hands and {len(embeddings)} embeddings to {path} (corpus {version})")
+    return manifest
+
+
+def load_snapshot_embeddings(path: str, embedding_types: Optional[Sequence[str]] = None) -> EmbeddingMatrix:
+    """
+    Embeddings from a snapshot's Arrow file, memory-mapped: the matrix is a
+    zero-copy view of the file unless embedding_types selects a subset.
+    """
+    pa = _pa()
+    manifest = read_manifest(path)
+    source = pa.memory_map(os.path.join(path, manifest['tables']['hand_embeddings']['arrow_file']), 'r')
+    table = pa.ipc.open_file(source).read_all()
+
+    dimensions = manifest['dimensions']
+    column = table.column('embedding')
+    if table.num_rows == 0:
+        matrix = np.empty((0, dimensions), dtype=np.float32)
+    else:
+        embedding = column.chunk(0) if column.num_chunks == 1 else column.combine_chunks()
+        matrix = embedding.flatten().to_numpy(zero_copy_only=True).reshape(-1, dimensions)
+    embeddings = EmbeddingMatrix(
+        table.column('id').to_numpy().astype(np.int64),
+        table.column('hand_analysis_id').fill_null(-1).to_numpy().astype(np.int64),
+        table.column('embedding_type').to_pylist(),
+        matrix,
+    )
+    if embedding_types is not None:
+        wanted = set(embedding_types)
+        rows = np.array([t in wanted for t in embeddings.types], dtype=bool)
+        embeddings = EmbeddingMatrix(
+            embeddings.ids[rows], embeddings.hand_ids[rows],
+            [t for t, keep in zip(embeddings.types, rows) if keep],
+            np.ascontiguousarray(matrix[rows]),
+        )
+    logger.info(f"Loaded {len(embeddings)} embeddings from snapshot {path} (corpus {manifest['corpus_version']})")
+    return embeddings
+
+
+def _copy_hands(cur, path: str, manifest: Dict[str, Any]) -> int:
+    pa = _pa()
+    import pyarrow.csv as pcsv
+    import pyarrow.parquet as pq
+
+    cur.execute("""
+        SELECT column_name FROM information_schema.columns
+        WHERE table_name = 'transcript_analysis'
+    """)
+    existing = {row[0] for row in cur.fetchall()}
+    parquet = pq.ParquetFile(os.path.join(path, manifest['tables']['transcript_analysis']['file']))
+    columns = [name for name in parquet.schema_arrow.names if name in existing]
+    skipped = set(parquet.schema_arrow.names) - existing
+    if skipped:
+        logger.warning(f"Snapshot columns not in transcript_analysis, skipped: {sorted(skipped)}")
+
+    rows = 0
+    for batch in parquet.iter_batches(batch_size=BATCH_SIZE, columns=columns):
+        arrays = []
+        for array in batch.columns:
+            if pa.types.is_list(array.type):
+                # CSV can't carry lists; use PostgreSQL array literals
+                array = pa.array(
+                    [None if v is None else '{' + ','.join(str(x) for x in v) + '}' for v in array.to_pylist()],
+                    type=pa.string()
+                )
+            arrays.append(array)
+        buffer = io.BytesIO()
+        pcsv.write_csv(pa.Table.from_arrays(arrays, names=columns), buffer)
+        buffer.seek(0)
+        cur.copy_expert(
+            f"COPY transcript_analysis ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, HEADER true)",
+            buffer
+        )
+        rows += batch.num_rows
+    return rows
+
+
+def _binary_embedding_rows(batch, dimensions: int, embedding_version: int) -> bytes:
+    """Binary COPY tuples for (id, hand_analysis_id, embedding_type, embedding_version, embedding, created_at)"""
+    ids = batch.column('id').to_pylist()
+    hand_ids = batch.column('hand_analysis_id').to_pylist()
+    types = batch.column('embedding_type').to_pylist()
+    created = batch.column('created_at').cast('int64').to_pylist()
+    vectors = batch.column('embedding').values.to_numpy().astype('>f4').reshape(-1, dimensions)
+
+    vector_header = struct.pack('>ihh', 4 + dimensions * 4, dimensions, 0)
+    version_field = struct.pack('>ii', 4, embedding_version)
+    parts = []
+    for i in range(batch.num_rows):
+        parts.append(struct.pack('>hii', 6, 4, ids[i]))
+        parts.append(struct.pack('>i', -1) if hand_ids[i] is None else struct.pack('>ii', 4, hand_ids[i]))
+        if types[i] is None:
+            parts.append(struct.pack('>i', -1))
+        else:
+            name = types[i].encode('utf-8')
+            parts.append(struct.pack('>i', len(name)) + name)
+        parts.append(version_field)
+        parts.append(vector_header)
+        parts.append(vectors[i].tobytes())
+        parts.append(
+            struct.pack('>i', -1) if created[i] is None
+            else struct.pack('>iq', 8, created[i] - PG_EPOCH_OFFSET_US)
+        )
+    return b''.join(parts)
+
+
+def _copy_embeddings(cur, path: str, manifest: Dict[str, Any], embedding_version: int) -> int:
+    import pyarrow.parquet as pq
+
+    parquet = pq.ParquetFile(os.path.join(path, manifest['tables']['hand_embeddings']['file']))
+    rows = 0
+    for batch in parquet.iter_batches(batch_size=BATCH_SIZE):
+        stream = io.BytesIO(
+            COPY_SIGNATURE + struct.pack('>ii', 0, 0)
+            + _binary_embedding_rows(batch, manifest['dimensions'], embedding_version)
+            + struct.pack('>h', -1)
+        )
+        cur.copy_expert(
+            "COPY hand_embeddings (id, hand_analysis_id, embedding_type, embedding_version, embedding, created_at) "
+            "FROM STDIN WITH (FORMAT binary)",
+            stream
+        )
+        rows += batch.num_rows
+    return rows
+
+
+def import_snapshot(path: str, truncate: bool = False) -> Dict[str, int]:
+    """
+    Bulk-load a snapshot into Postgres with COPY, in one transaction. The
+    target tables must be empty unless truncate is set. Serial sequences are
+    moved past the imported ids. The embeddings are stored under an embedding
+    version for the snapshot's model, which becomes the active one.
+    """
+    manifest = read_manifest(path)
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT atttypmod FROM pg_attribute
+                WHERE attrelid = 'hand_embeddings'::regclass AND attname = 'embedding'
+            """)
+            column_dimensions = cur.fetchone()[0]
+            if column_dimensions > 0 and column_dimensions != manifest['dimensions']:
+                raise ValueError(
+                    f"Snapshot has {manifest['dimensions']}-dimensional {manifest['model']} embeddings; "
+                    f"hand_embeddings.embedding is vector({column_dimensions})"
+                )
+            if truncate:
+                cur.execute("TRUNCATE hand_embeddings, transcript_analysis RESTART IDENTITY CASCADE")
+            else:
+                cur.execute("SELECT EXISTS (SELECT 1 FROM transcript_analysis) OR EXISTS (SELECT 1 FROM hand_embeddings)")
+                if cur.fetchone()[0]:
+                    raise ValueError("transcript_analysis/hand_embeddings are not empty; import with truncate to replace them")
+            embedding_version = adopt_version(cur, manifest['model'], manifest['dimensions'])
+
+            counts = {
+                'transcript_analysis': _copy_hands(cur, path, manifest),
+                'hand_embeddings': _copy_embeddings(cur, path, manifest, embedding_version['id']),
+            }
+            for table in counts:
+                cur.execute(f"""
+                    SELECT setval(pg_get_serial_sequence('{table}', 'id'), coalesce(max(id), 0) + 1, false)
+                    FROM {table}
+                """)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    logger.info(f"Imported {counts} from {path} (corpus {manifest['corpus_version']})")
+    return counts
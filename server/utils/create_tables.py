@@ -11,18 +11,157 @@ def init_db():
     conn = get_db_connection()
     cur = conn.cursor()
     
-    # Create transcripts table if it doesn't exist
+    # Create transcripts table if it doesn't exist.
+    # Raw segments and formatted text are stored zlib-compressed JSON.
     cur.execute("""
         CREATE TABLE IF NOT EXISTS youtube_transcripts (
             id SERIAL PRIMARY KEY,
             video_id VARCHAR(20) UNIQUE NOT NULL,
             video_url TEXT NOT NULL,
-            transcript_text TEXT NOT NULL,
+            transcript_text TEXT,
+            language VARCHAR(50),
+            segments_gz BYTEA,
+            formatted_gz BYTEA,
+            etag CHAR(64),
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         );
     """)
     
+    # Bring tables created before the transcript cache up to date
+    cur.execute("""
+        ALTER TABLE youtube_transcripts ALTER COLUMN transcript_text DROP NOT NULL;
+        ALTER TABLE youtube_transcripts ADD COLUMN IF NOT EXISTS language VARCHAR(50);
+        ALTER TABLE youtube_transcripts ADD COLUMN IF NOT EXISTS segments_gz BYTEA;
+        ALTER TABLE youtube_transcripts ADD COLUMN IF NOT EXISTS formatted_gz BYTEA;
+        ALTER TABLE youtube_transcripts ADD COLUMN IF NOT EXISTS etag CHAR(64);
+    """)
+    
+    # Claude transcript extractions, content-addressed by
+    # sha256(transcript text, prompt version, model)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS transcript_extractions (
+            cache_key CHAR(64) PRIMARY KEY,
+            prompt_version INTEGER NOT NULL,
+            model VARCHAR(100) NOT NULL,
+            raw_response TEXT NOT NULL,
+            parsed JSONB,
+            parser_version INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+    
+    # Ingest job ledger: one row per video, written in the same transaction
+    # as its transcript_analysis row so a crash can't create duplicates
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS ingest_jobs (
+            id SERIAL PRIMARY KEY,
+            url TEXT UNIQUE NOT NULL,
+            video_id VARCHAR(20) UNIQUE,
+            state VARCHAR(20) NOT NULL DEFAULT 'queued'
+                CHECK (state IN ('queued', 'fetching', 'extracting', 'done', 'failed')),
+            attempts INTEGER NOT NULL DEFAULT 0,
+            analysis_id INTEGER REFERENCES transcript_analysis(id),
+            last_error TEXT,
+            timings JSONB,
+            queued_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP,
+            finished_at TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE INDEX IF NOT EXISTS ingest_jobs_state_idx ON ingest_jobs(state);
+    """)
+    
+    # Leases let several hosts claim ingest jobs without double work;
+    # an expired lease means the worker died and the job can be reclaimed
+    cur.execute("""
+        ALTER TABLE ingest_jobs ADD COLUMN IF NOT EXISTS lease_owner TEXT;
+        ALTER TABLE ingest_jobs ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMP;
+        CREATE INDEX IF NOT EXISTS ingest_jobs_lease_idx ON ingest_jobs(state, lease_expires_at);
+    """)
+    
+    # A video can yield several hands; analysis_ids lists all of them
+    # (analysis_id stays the first, for older readers)
+    cur.execute("""
+        ALTER TABLE ingest_jobs ADD COLUMN IF NOT EXISTS analysis_ids INTEGER[];
+    """)
+    
+    # Embedding backlog, leased the same way as ingest jobs
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS embedding_jobs (
+            hand_analysis_id INTEGER PRIMARY KEY REFERENCES transcript_analysis(id),
+            state VARCHAR(20) NOT NULL DEFAULT 'queued'
+                CHECK (state IN ('queued', 'embedding', 'done', 'failed')),
+            attempts INTEGER NOT NULL DEFAULT 0,
+            lease_owner TEXT,
+            lease_expires_at TIMESTAMP,
+            last_error TEXT,
+            queued_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP,
+            finished_at TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE INDEX IF NOT EXISTS embedding_jobs_lease_idx ON embedding_jobs(state, lease_expires_at);
+    """)
+
+    # Planned embedding types a hand has no chunk for in a version (e.g.
+    # street_based_river for a hand that ended on the flop), so the backlog
+    # stops re-queueing it
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS embedding_skips (
+            hand_analysis_id INTEGER REFERENCES transcript_analysis(id) ON DELETE CASCADE,
+            embedding_version INTEGER REFERENCES embedding_versions(id) ON DELETE CASCADE,
+            embedding_type VARCHAR(50),
+            PRIMARY KEY (hand_analysis_id, embedding_version, embedding_type)
+        );
+    """)
+
+    # One row per in-flight (or recently finished) /api/analyze computation,
+    # shared by gunicorn workers so identical queries run once
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS analysis_flights (
+            flight_key CHAR(64) PRIMARY KEY,
+            state VARCHAR(10) NOT NULL CHECK (state IN ('running', 'done', 'failed')),
+            leader TEXT NOT NULL,
+            result JSONB,
+            started_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            finished_at TIMESTAMP
+        );
+    """)
+
+    # Precomputed /api/analyze responses for the preflop hand class x position
+    # x stakes grid (processing_scripts/build_preflop_grid.py)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS preflop_grid_analyses (
+            hand_class VARCHAR(3) NOT NULL,
+            position VARCHAR(20) NOT NULL,
+            stakes VARCHAR(20) NOT NULL,
+            query TEXT NOT NULL,
+            hand_ids INTEGER[] NOT NULL,
+            payload JSONB NOT NULL,
+            corpus_version TEXT NOT NULL,
+            computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (hand_class, position, stakes)
+        );
+    """)
+
+    # MinHash signatures and LSH band hashes for near-duplicate detection
+    # (utils/near_duplicates.py); the GIN indexes serve band-overlap lookups
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS hand_fingerprints (
+            hand_analysis_id INTEGER PRIMARY KEY REFERENCES transcript_analysis(id) ON DELETE CASCADE,
+            transcript_signature BYTEA,
+            transcript_bands BIGINT[],
+            hand_signature BYTEA,
+            hand_bands BIGINT[],
+            fields JSONB,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE INDEX IF NOT EXISTS hand_fingerprints_transcript_bands_idx ON hand_fingerprints USING gin (transcript_bands);
+        CREATE INDEX IF NOT EXISTS hand_fingerprints_hand_bands_idx ON hand_fingerprints USING gin (hand_bands);
+    """)
+
     conn.commit()
     cur.close()
     conn.close()
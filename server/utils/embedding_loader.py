@@ -0,0 +1,241 @@
+# server\utils\embedding_loader.py
+import struct
+import logging
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config.db import get_db_connection
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Header of PostgreSQL's binary COPY format
+COPY_SIGNATURE = b'PGCOPY\n\xff\r\n\x00'
+COPY_HEADER = struct.Struct('>11sii')
+INT16 = struct.Struct('>h')
+INT32 = struct.Struct('>i')
+# pgvector's binary form: dimensions, unused, then big-endian float4s
+VECTOR_HEADER = struct.Struct('>hh')
+
+
+class EmbeddingMatrix:
+    """
+    Embeddings held as one contiguous float32 matrix, with the hand_embeddings
+    id, hand id and embedding type of each row.
+    """
+
+    def __init__(self, ids: np.ndarray, hand_ids: np.ndarray, types: List[str], matrix: np.ndarray):
+        self.ids = ids
+        self.hand_ids = hand_ids
+        self.types = types
+        self.matrix = matrix
+        self._unit = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def dimensions(self) -> int:
+        return self.matrix.shape[1]
+
+    def select(self, embedding_type: str) -> 'EmbeddingMatrix':
+        """Rows of one embedding type"""
+        rows = np.array([t == embedding_type for t in self.types], dtype=bool)
+        return EmbeddingMatrix(
+            self.ids[rows], self.hand_ids[rows],
+            [t for t, keep in zip(self.types, rows) if keep],
+            np.ascontiguousarray(self.matrix[rows])
+        )
+
+    def unit(self) -> np.ndarray:
+        """Row-normalized copy of the matrix, computed once"""
+        if self._unit is None:
+            norms = np.linalg.norm(self.matrix, axis=1, keepdims=True)
+            self._unit = self.matrix / np.where(norms == 0, 1, norms)
+        return self._unit
+
+    def top_k(self, query_vector, k: int = 5) -> List[Tuple[int, int, float]]:
+        """(embedding id, hand id, cosine similarity) of the k closest rows"""
+        if len(self) == 0:
+            return []
+        query = np.asarray(query_vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        scores = self.unit() @ (query / norm if norm else query)
+        k = min(k, len(scores))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best], kind='stable')]
+        return [(int(self.ids[i]), int(self.hand_ids[i]), float(scores[i])) for i in best]
+
+
+class BinaryCopyReader:
+    """
+    File-like sink for cursor.copy_expert(). Parses binary COPY rows of
+    (id, hand_analysis_id, embedding_type, embedding) as they stream in, writing
+    each vector straight into a preallocated float32 matrix.
+    """
+
+    def __init__(self, capacity: int = 0, dimensions: Optional[int] = None):
+        self.capacity = max(capacity, 1)
+        self.dimensions = dimensions
+        self.count = 0
+        self.ids = np.empty(self.capacity, dtype=np.int64)
+        self.hand_ids = np.empty(self.capacity, dtype=np.int64)
+        self.types: List[str] = []
+        self.matrix = None
+        self._buffer = bytearray()
+        self._header_read = False
+        self._finished = False
+        self._type_names = {}
+
+    def write(self, data) -> int:
+        self._buffer += data
+        self._parse()
+        return len(data)
+
+    def _read_header(self) -> bool:
+        if len(self._buffer) < COPY_HEADER.size:
+            return False
+        signature, _, extension_length = COPY_HEADER.unpack_from(self._buffer)
+        if signature != COPY_SIGNATURE:
+            raise ValueError('not a binary COPY stream')
+        if len(self._buffer) < COPY_HEADER.size + extension_length:
+            return False
+        del self._buffer[:COPY_HEADER.size + extension_length]
+        self._header_read = True
+        return True
+
+    def _parse(self):
+        if not self._header_read and not self._read_header():
+            return
+        buffer = self._buffer
+        size = len(buffer)
+        position = 0
+        while not self._finished and size - position >= 2:
+            (field_count,) = INT16.unpack_from(buffer, position)
+            if field_count == -1:
+                self._finished = True
+                position += 2
+                break
+
+            # Field (offset, length) pairs; stop if the row isn't complete yet
+            fields = []
+            cursor = position + 2
+            for _ in range(field_count):
+                if size - cursor < 4:
+                    break
+                (length,) = INT32.unpack_from(buffer, cursor)
+                cursor += 4
+                if length < 0:
+                    fields.append(None)
+                    continue
+                if size - cursor < length:
+                    break
+                fields.append((cursor, length))
+                cursor += length
+            if len(fields) < field_count:
+                break
+            self._store_row(buffer, fields)
+            position = cursor
+        del buffer[:position]
+
+    def _store_row(self, buffer: bytearray, fields):
+        id_field, hand_field, type_field, vector_field = fields
+        if vector_field is None:
+            return
+        dimensions, _ = VECTOR_HEADER.unpack_from(buffer, vector_field[0])
+        if self.matrix is None:
+            self.dimensions = self.dimensions or dimensions
+            self.matrix = np.empty((self.capacity, self.dimensions), dtype=np.float32)
+        if dimensions != self.dimensions:
+            raise ValueError(f"embedding {INT32.unpack_from(buffer, id_field[0])[0]} has "
+                             f"{dimensions} dimensions, expected {self.dimensions}")
+        if self.count == self.capacity:
+            self._grow()
+
+        row = self.count
+        self.ids[row] = INT32.unpack_from(buffer, id_field[0])[0]
+        self.hand_ids[row] = INT32.unpack_from(buffer, hand_field[0])[0] if hand_field else -1
+        if type_field is None:
+            self.types.append(None)
+        else:
+            raw = bytes(buffer[type_field[0]:type_field[0] + type_field[1]])
+            name = self._type_names.get(raw)
+            if name is None:
+                name = self._type_names[raw] = raw.decode('utf-8')
+            self.types.append(name)
+        # Big-endian float4s converted into the row in place; no Python floats
+        self.matrix[row] = np.frombuffer(
+            buffer, dtype='>f4', count=dimensions, offset=vector_field[0] + VECTOR_HEADER.size
+        )
+        self.count += 1
+
+    def _grow(self):
+        """Rows inserted after the count query; double the arrays"""
+        self.capacity *= 2
+        self.ids = np.resize(self.ids, self.capacity)
+        self.hand_ids = np.resize(self.hand_ids, self.capacity)
+        matrix = np.empty((self.capacity, self.dimensions), dtype=np.float32)
+        matrix[:self.count] = self.matrix[:self.count]
+        self.matrix = matrix
+
+    def result(self) -> EmbeddingMatrix:
+        if self._buffer:
+            raise ValueError(f"binary COPY stream ended mid-row ({len(self._buffer)} bytes left)")
+        count = self.count
+        matrix = self.matrix[:count] if self.matrix is not None else np.empty((0, self.dimensions or 0), dtype=np.float32)
+        return EmbeddingMatrix(
+            self.ids[:count].copy(), self.hand_ids[:count].copy(), self.types,
+            np.ascontiguousarray(matrix)
+        )
+
+
+def load_embeddings(
+        conn=None,
+        embedding_types: Optional[Sequence[str]] = None,
+        hand_ids: Optional[Sequence[int]] = None,
+        embedding_version: Optional[int] = None
+    ) -> EmbeddingMatrix:
+    """
+    Bulk-load hand_embeddings into an EmbeddingMatrix with one binary COPY,
+    optionally filtered by embedding type and hand id. Rows are in id order.
+    Only one embedding version is ever loaded: embedding_version, or the
+    active one by default.
+    """
+    own_connection = conn is None
+    if own_connection:
+        conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            if embedding_version is None:
+                conditions = ["embedding_version = (SELECT id FROM embedding_versions WHERE state = 'active')"]
+                params = []
+            else:
+                conditions = ["embedding_version = %s"]
+                params = [embedding_version]
+            if embedding_types is not None:
+                conditions.append("embedding_type = ANY(%s)")
+                params.append(list(embedding_types))
+            if hand_ids is not None:
+                conditions.append("hand_analysis_id = ANY(%s)")
+                params.append(list(hand_ids))
+            where = f"WHERE {' AND '.join(conditions)}"
+
+            cur.execute(f"SELECT count(*) FROM hand_embeddings {where}", params)
+            reader = BinaryCopyReader(capacity=cur.fetchone()[0])
+            select = cur.mogrify(f"""
+                SELECT id, hand_analysis_id, embedding_type, embedding
+                FROM hand_embeddings
+                {where}
+                ORDER BY id
+            """, params).decode('utf-8')
+            cur.copy_expert(f"COPY ({select}) TO STDOUT WITH (FORMAT binary)", reader)
+        if own_connection:
+            conn.commit()
+        embeddings = reader.result()
+        logger.info(f"Loaded {len(embeddings)} embeddings ({embeddings.dimensions} dimensions)")
+        return embeddings
+    finally:
+        if own_connection:
+            conn.close()
@@ -0,0 +1,275 @@
+# server\utils\embedding_partitions.py
+import re
+import math
+import hashlib
+import logging
+from typing import Dict, List, Optional
+
+from utils.corpus_feed import CORPUS_CHANNEL
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# hand_embeddings is list-partitioned on embedding_type: one partition per
+# type, each with an ivfflat index per embedding version (partial, WHERE
+# embedding_version = N), plus a default partition for types that don't have
+# one yet.
+PARENT_TABLE = 'hand_embeddings'
+DEFAULT_PARTITION = 'hand_embeddings_default'
+# Unversioned per-partition index from before embedding versions; also the
+# longest index suffix partition names leave room for
+INDEX_SUFFIX = '_embedding_idx'
+# Searches order by `embedding <-> query` (L2), so the index must use L2 ops
+INDEX_OPCLASS = 'vector_l2_ops'
+EMBEDDING_DIMENSIONS = 1024
+
+# Postgres identifiers are at most 63 bytes, and the index name adds a suffix
+MAX_PARTITION_NAME = 63 - len(INDEX_SUFFIX)
+
+# Rebuild an index once its partition has grown/shrunk this far from its size at build time
+REINDEX_DRIFT = 2.0
+
+
+def partition_name(embedding_type: str) -> str:
+    """Table name of the partition for an embedding type"""
+    name = f"{PARENT_TABLE}_{re.sub(r'[^a-z0-9_]', '_', embedding_type.lower())}"
+    if len(name) > MAX_PARTITION_NAME:
+        digest = hashlib.sha1(embedding_type.encode('utf-8')).hexdigest()[:8]
+        name = f"{name[:MAX_PARTITION_NAME - 9]}_{digest}"
+    return name
+
+
+def index_name(partition: str, version: int) -> str:
+    """Index of one embedding version's rows in a partition"""
+    return f"{partition}_v{int(version)}_idx"
+
+
+def legacy_index_name(partition: str) -> str:
+    return f"{partition}{INDEX_SUFFIX}"
+
+
+def ivfflat_lists(rows: int) -> int:
+    """pgvector's guidance: rows / 1000 up to 1M rows, sqrt(rows) beyond"""
+    if rows <= 1000000:
+        return max(1, rows // 1000)
+    return int(math.sqrt(rows))
+
+
+def is_partitioned(cur) -> bool:
+    cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (PARENT_TABLE,))
+    row = cur.fetchone()
+    return row is not None and row[0] == 'p'
+
+
+def partitions(cur) -> Dict[str, Optional[str]]:
+    """{partition table: its embedding_type (None for the default partition)}"""
+    cur.execute("""
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(%s)
+        ORDER BY c.relname
+    """, (PARENT_TABLE,))
+    result = {}
+    for name, bound in cur.fetchall():
+        # e.g. FOR VALUES IN ('hybrid_situation')
+        match = re.search(r"IN \('((?:[^']|'')*)'\)", bound or '')
+        result[name] = match.group(1).replace("''", "'") if match else None
+    return result
+
+
+def search_partition(cur, embedding_type: str) -> str:
+    """Partition a search for embedding_type reads from"""
+    cur.execute("SELECT to_regclass(%s) IS NOT NULL", (partition_name(embedding_type),))
+    return partition_name(embedding_type) if cur.fetchone()[0] else DEFAULT_PARTITION
+
+
+def search_index(cur, embedding_type: str, version: int) -> Optional[str]:
+    """Vector index a search for embedding_type at version uses, None if there isn't one"""
+    partition = search_partition(cur, embedding_type)
+    for name in (index_name(partition, version), legacy_index_name(partition)):
+        cur.execute("SELECT to_regclass(%s) IS NOT NULL", (name,))
+        if cur.fetchone()[0]:
+            return name
+    return None
+
+
+def create_parent(cur, dimensions: int = EMBEDDING_DIMENSIONS, sequence: Optional[str] = None):
+    """
+    The partitioned hand_embeddings table and its default partition. The
+    primary key has to include the partition key.
+    """
+    id_column = f"id INTEGER NOT NULL DEFAULT nextval('{sequence}')" if sequence else "id SERIAL"
+    cur.execute(f"""
+        CREATE TABLE {PARENT_TABLE} (
+            {id_column},
+            hand_analysis_id INTEGER REFERENCES transcript_analysis(id),
+            embedding_type VARCHAR(50) NOT NULL,
+            embedding_version INTEGER NOT NULL REFERENCES embedding_versions(id),
+            embedding vector({int(dimensions)}),
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (id, embedding_type)
+        ) PARTITION BY LIST (embedding_type)
+    """)
+    if sequence:
+        cur.execute(f"ALTER SEQUENCE {sequence} OWNED BY {PARENT_TABLE}.id")
+    cur.execute(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {PARENT_TABLE} DEFAULT")
+    # Partitioned index; cascades to every partition
+    cur.execute(f"CREATE INDEX {PARENT_TABLE}_hand_id_idx ON {PARENT_TABLE}(hand_analysis_id)")
+
+
+def ensure_partition(cur, embedding_type: str) -> str:
+    """
+    Give embedding_type its own partition, moving any of its rows out of the
+    default partition. Returns the partition name.
+    """
+    name = partition_name(embedding_type)
+    cur.execute("SELECT to_regclass(%s) IS NOT NULL", (name,))
+    if cur.fetchone()[0]:
+        return name
+    # Attaching a partition while the default holds matching rows fails, so
+    # build the table standalone, move the rows, then attach it
+    cur.execute(f"CREATE TABLE {name} (LIKE {PARENT_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+    cur.execute(f"ALTER TABLE {name} ADD CONSTRAINT {name}_type_check CHECK (embedding_type = %s)", (embedding_type,))
+    cur.execute(f"""
+        WITH moved AS (
+            DELETE FROM {DEFAULT_PARTITION} WHERE embedding_type = %s RETURNING *
+        )
+        INSERT INTO {name} SELECT * FROM moved
+    """, (embedding_type,))
+    moved = cur.rowcount
+    # The CHECK constraint lets ATTACH skip its validation scan
+    cur.execute(f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {name} FOR VALUES IN (%s)", (embedding_type,))
+    cur.execute(f"ALTER TABLE {name} DROP CONSTRAINT {name}_type_check")
+    if moved:
+        # The move was announced as deletes on the change feed; re-announce the rows
+        cur.execute(f"""
+            SELECT count(pg_notify(%s, json_build_object(
+                'table', %s, 'op', 'INSERT', 'id', id,
+                'hand_id', hand_analysis_id, 'type', embedding_type,
+                'version', embedding_version
+            )::text))
+            FROM {name}
+        """, (CORPUS_CHANNEL, PARENT_TABLE))
+    logger.info(f"Created partition {name} for {embedding_type!r} ({moved} rows moved from the default partition)")
+    return name
+
+
+def index_lists(cur, partition: str, version: int) -> Optional[int]:
+    """lists of the version's ivfflat index in the partition, None if it has none"""
+    cur.execute("""
+        SELECT c.reloptions
+        FROM pg_class c
+        WHERE c.oid = to_regclass(%s)
+    """, (index_name(partition, version),))
+    row = cur.fetchone()
+    if row is None:
+        return None
+    for option in row[0] or []:
+        key, _, value = option.partition('=')
+        if key == 'lists':
+            return int(value)
+    return 100
+
+
+def build_index(cur, partition: str, version: int, rows: Optional[int] = None) -> int:
+    """
+    (Re)build the partial ivfflat index over one embedding version's rows in
+    the partition, sized to their count; returns lists
+    """
+    version = int(version)
+    if rows is None:
+        cur.execute(f"SELECT count(*) FROM {partition} WHERE embedding_version = %s", (version,))
+        rows = cur.fetchone()[0]
+    lists = ivfflat_lists(rows)
+    name = index_name(partition, version)
+    cur.execute(f"DROP INDEX IF EXISTS {name}")
+    cur.execute(f"""
+        CREATE INDEX {name} ON {partition}
+        USING ivfflat (embedding {INDEX_OPCLASS}) WITH (lists = {lists})
+        WHERE embedding_version = {version}
+    """)
+    logger.info(f"Built {name} with lists = {lists} for {rows} rows")
+    return lists
+
+
+def drop_version_indexes(cur, version: int):
+    """Drop a version's index in every partition"""
+    for name in partitions(cur):
+        cur.execute(f"DROP INDEX IF EXISTS {index_name(name, version)}")
+
+
+def drop_legacy_indexes(cur):
+    """Drop the unversioned per-partition indexes once every version has its own"""
+    for name in partitions(cur):
+        cur.execute(f"DROP INDEX IF EXISTS {legacy_index_name(name)}")
+
+
+def needs_reindex(current_lists: Optional[int], rows: int) -> bool:
+    if current_lists is None:
+        return True
+    wanted = ivfflat_lists(rows)
+    return max(wanted, current_lists) / min(wanted, current_lists) >= REINDEX_DRIFT
+
+
+def detach_partition(cur, embedding_type: str, drop: bool = False) -> str:
+    """
+    Take an embedding type out of hand_embeddings. The rows stay in the
+    detached table unless drop is set.
+    """
+    name = partition_name(embedding_type)
+    cur.execute(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}")
+    if drop:
+        cur.execute(f"DROP TABLE {name}")
+    logger.info(f"{'Dropped' if drop else 'Detached'} partition {name} ({embedding_type!r})")
+    return name
+
+
+def partition_status(cur, versions: Optional[List[int]] = None) -> List[Dict]:
+    """
+    Row count and index size of every partition, per embedding version
+    (every version with rows, plus any listed in versions)
+    """
+    status = []
+    for name, embedding_type in partitions(cur).items():
+        cur.execute(f"SELECT embedding_version, count(*) FROM {name} GROUP BY 1")
+        counts = dict(cur.fetchall())
+        for version in sorted(set(counts) | set(versions or [])):
+            rows = counts.get(version, 0)
+            status.append({
+                'partition': name,
+                'embedding_type': embedding_type,
+                'embedding_version': version,
+                'rows': rows,
+                'lists': index_lists(cur, name, version),
+                'wanted_lists': ivfflat_lists(rows),
+            })
+    return status
+
+
+def create_corpus_trigger(cur):
+    """
+    Change-feed and corpus generation triggers (database_schema_psql.txt) on
+    the partitioned table; they cascade to partitions
+    """
+    cur.execute("SELECT to_regprocedure('notify_corpus_change()') IS NOT NULL")
+    if not cur.fetchone()[0]:
+        logger.warning("notify_corpus_change() not installed; skipping the corpus change trigger")
+    else:
+        cur.execute(f"DROP TRIGGER IF EXISTS {PARENT_TABLE}_corpus_change ON {PARENT_TABLE}")
+        cur.execute(f"""
+            CREATE TRIGGER {PARENT_TABLE}_corpus_change
+            AFTER INSERT OR UPDATE OR DELETE ON {PARENT_TABLE}
+            FOR EACH ROW EXECUTE FUNCTION notify_corpus_change('{PARENT_TABLE}')
+        """)
+    cur.execute("SELECT to_regprocedure('bump_corpus_generation()') IS NOT NULL")
+    if not cur.fetchone()[0]:
+        logger.warning("bump_corpus_generation() not installed; skipping the corpus generation trigger")
+        return
+    cur.execute(f"DROP TRIGGER IF EXISTS {PARENT_TABLE}_corpus_generation ON {PARENT_TABLE}")
+    cur.execute(f"""
+        CREATE TRIGGER {PARENT_TABLE}_corpus_generation
+        AFTER INSERT OR UPDATE OR DELETE ON {PARENT_TABLE}
+        FOR EACH ROW EXECUTE FUNCTION bump_corpus_generation()
+    """)
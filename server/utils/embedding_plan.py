@@ -0,0 +1,57 @@
+# server\utils\embedding_plan.py
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from config import settings
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Chunking strategies of PokerEmbeddingProcessor; stored types are '<strategy>_<chunk_type>'
+STRATEGY_CHUNKERS = {
+    'street_based': 'create_street_based_chunks',
+    'component_based': 'create_component_based_chunks',
+    'hybrid': 'create_hybrid_chunks',
+}
+
+
+def embedding_plan() -> List[str]:
+    """Embedding types to compute and store; the searched type is always included"""
+    plan = list(settings.EMBEDDING_PLAN)
+    if settings.SEARCH_EMBEDDING_TYPE not in plan:
+        plan.append(settings.SEARCH_EMBEDDING_TYPE)
+    return plan
+
+
+def split_type(embedding_type: str) -> Optional[Tuple[str, str]]:
+    """'hybrid_situation' -> ('hybrid', 'situation'); None for unknown strategies"""
+    for strategy in STRATEGY_CHUNKERS:
+        if embedding_type.startswith(strategy + '_'):
+            return strategy, embedding_type[len(strategy) + 1:]
+    return None
+
+
+def planned_chunks(
+        processor,
+        hand_data: Dict,
+        plan: Optional[Sequence[str]] = None,
+        skip: Sequence[str] = ()
+    ) -> Dict[str, List[Tuple[str, str]]]:
+    """
+    {strategy: [(chunk_type, text)]} for the planned types not in skip.
+    Strategies without a planned type aren't chunked at all.
+    """
+    wanted = set(embedding_plan() if plan is None else plan) - set(skip)
+    chunks = {}
+    for strategy, chunker in STRATEGY_CHUNKERS.items():
+        if not any(split_type(t) and split_type(t)[0] == strategy for t in wanted):
+            continue
+        selected = [
+            (chunk_type, text)
+            for chunk_type, text in getattr(processor, chunker)(hand_data)
+            if f"{strategy}_{chunk_type}" in wanted
+        ]
+        if selected:
+            chunks[strategy] = selected
+    return chunks
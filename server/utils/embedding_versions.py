@@ -0,0 +1,261 @@
+# server\utils\embedding_versions.py
+import time
+import json
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+
+from config import settings
+from config.db import get_db_connection
+from utils.corpus_feed import CORPUS_CHANNEL, subscribe
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Every hand_embeddings row belongs to one embedding_versions row (model and
+# dimensions). Exactly one version is active: queries are embedded with its
+# model and search only its rows. A new version is filled in the background
+# while it's 'building', then activated in one transaction; the old version
+# is retired and can be purged once no request can still be using it.
+DEFAULT_DIMENSIONS = 1024
+VERSION_STATES = ('building', 'active', 'retired')
+
+_active_lock = threading.Lock()
+_active: Optional[Dict[str, Any]] = None
+_active_checked_at = 0.0
+
+
+def create_versions_table(cur):
+    """embedding_versions as in database_schema_psql.txt, with the original model as version 1"""
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS embedding_versions (
+            id SERIAL PRIMARY KEY,
+            model VARCHAR(100) NOT NULL,
+            dimensions INTEGER NOT NULL,
+            state VARCHAR(20) NOT NULL DEFAULT 'building'
+                CHECK (state IN ('building', 'active', 'retired')),
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+            activated_at TIMESTAMP WITH TIME ZONE,
+            retired_at TIMESTAMP WITH TIME ZONE
+        );
+        CREATE UNIQUE INDEX IF NOT EXISTS embedding_versions_one_active
+            ON embedding_versions ((state)) WHERE state = 'active';
+    """)
+    cur.execute("""
+        INSERT INTO embedding_versions (id, model, dimensions, state, activated_at)
+        VALUES (1, %s, %s, 'active', CURRENT_TIMESTAMP)
+        ON CONFLICT DO NOTHING
+    """, (settings.DEFAULT_EMBEDDING_MODEL, DEFAULT_DIMENSIONS))
+    cur.execute("SELECT setval(pg_get_serial_sequence('embedding_versions', 'id'), max(id)) FROM embedding_versions")
+
+
+def _row_to_version(row) -> Dict[str, Any]:
+    return {'id': row[0], 'model': row[1], 'dimensions': row[2], 'state': row[3]}
+
+
+def list_versions(cur) -> List[Dict[str, Any]]:
+    cur.execute("""
+        SELECT v.id, v.model, v.dimensions, v.state, v.created_at, v.activated_at, v.retired_at,
+               (SELECT count(*) FROM hand_embeddings he WHERE he.embedding_version = v.id) AS rows
+        FROM embedding_versions v
+        ORDER BY v.id
+    """)
+    versions = []
+    for row in cur.fetchall():
+        version = _row_to_version(row)
+        version.update({'created_at': row[4], 'activated_at': row[5], 'retired_at': row[6], 'rows': row[7]})
+        versions.append(version)
+    return versions
+
+
+def get_version(cur, version_id: int, lock: bool = False) -> Optional[Dict[str, Any]]:
+    cur.execute(f"""
+        SELECT id, model, dimensions, state FROM embedding_versions
+        WHERE id = %s {'FOR UPDATE' if lock else ''}
+    """, (version_id,))
+    row = cur.fetchone()
+    return _row_to_version(row) if row else None
+
+
+def fetch_active_version(cur) -> Dict[str, Any]:
+    cur.execute("SELECT id, model, dimensions, state FROM embedding_versions WHERE state = 'active'")
+    row = cur.fetchone()
+    if row is None:
+        raise RuntimeError("No active embedding version; see processing_scripts/embedding_versions.py")
+    return _row_to_version(row)
+
+
+def live_versions(cur) -> List[Dict[str, Any]]:
+    """Versions ingestion writes to: the active one and any being built"""
+    cur.execute("""
+        SELECT id, model, dimensions, state FROM embedding_versions
+        WHERE state IN ('active', 'building')
+        ORDER BY id
+    """)
+    return [_row_to_version(row) for row in cur.fetchall()]
+
+
+def active_version() -> Dict[str, Any]:
+    """
+    The active version, re-read at most every EMBEDDING_VERSION_CHECK_SECONDS
+    (and straight away when the corpus feed reports a switch). Callers pin
+    the returned version for a whole request: its model embeds the query and
+    its id filters the search.
+    """
+    global _active, _active_checked_at
+    with _active_lock:
+        if _active is not None and time.monotonic() - _active_checked_at < settings.EMBEDDING_VERSION_CHECK_SECONDS:
+            return _active
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                version = fetch_active_version(cur)
+            conn.commit()
+        finally:
+            conn.close()
+        if _active is not None and _active['id'] != version['id']:
+            logger.info(f"Embedding version {version['id']} ({version['model']}) is now active")
+        _active = version
+        _active_checked_at = time.monotonic()
+        return _active
+
+
+def forget_active_version(change: Optional[Dict[str, Any]] = None):
+    """Corpus feed subscriber: re-read the active version on the next request after a switch"""
+    global _active
+    if change is None or change.get('version_switched') or change.get('resync'):
+        with _active_lock:
+            _active = None
+
+
+subscribe(forget_active_version)
+
+
+def column_dimensions(cur) -> int:
+    cur.execute("""
+        SELECT atttypmod FROM pg_attribute
+        WHERE attrelid = 'hand_embeddings'::regclass AND attname = 'embedding'
+    """)
+    return cur.fetchone()[0]
+
+
+def create_version(cur, model: str, dimensions: int) -> Dict[str, Any]:
+    """Register a version to build. Only one version can be building at a time."""
+    cur.execute("LOCK TABLE embedding_versions IN EXCLUSIVE MODE")
+    cur.execute("SELECT id FROM embedding_versions WHERE state = 'building'")
+    row = cur.fetchone()
+    if row is not None:
+        raise ValueError(f"Embedding version {row[0]} is already building; activate or retire it first")
+    stored = column_dimensions(cur)
+    if stored > 0 and stored != dimensions:
+        # Mixing dimensions would need an untyped vector column with per-version expression indexes
+        raise ValueError(f"hand_embeddings.embedding is vector({stored}); {model} produces {dimensions} dimensions")
+    cur.execute("""
+        INSERT INTO embedding_versions (model, dimensions)
+        VALUES (%s, %s)
+        RETURNING id, model, dimensions, state
+    """, (model, dimensions))
+    version = _row_to_version(cur.fetchone())
+    logger.info(f"Created embedding version {version['id']} ({model}, {dimensions} dimensions)")
+    return version
+
+
+def missing_embeddings(cur, version_id: int, plan: Sequence[str]) -> int:
+    """
+    Planned (hand, type) pairs the active version has and version_id doesn't;
+    activation requires none
+    """
+    active = fetch_active_version(cur)
+    if active['id'] == version_id:
+        return 0
+    cur.execute("""
+        SELECT count(*)
+        FROM hand_embeddings he
+        WHERE he.embedding_version = %(active)s
+          AND he.embedding_type = ANY(%(plan)s)
+          AND NOT EXISTS (
+              SELECT 1 FROM hand_embeddings target
+              WHERE target.hand_analysis_id = he.hand_analysis_id
+                AND target.embedding_type = he.embedding_type
+                AND target.embedding_version = %(target)s
+          )
+    """, {'active': active['id'], 'plan': list(plan), 'target': version_id})
+    return cur.fetchone()[0]
+
+
+def activate_version(cur, version_id: int, plan: Sequence[str]) -> Dict[str, Any]:
+    """
+    Switch query traffic to version_id in the caller's transaction: the old
+    active version is retired and the new one activated together, so no
+    reader ever sees zero or two active versions. Refuses while the new
+    version is missing embeddings the active one has. A retired version can
+    be reactivated (rollback) as long as its rows haven't been purged.
+    """
+    cur.execute("LOCK TABLE embedding_versions IN EXCLUSIVE MODE")
+    version = get_version(cur, version_id, lock=True)
+    if version is None:
+        raise ValueError(f"No embedding version {version_id}")
+    if version['state'] == 'active':
+        return version
+    missing = missing_embeddings(cur, version_id, plan)
+    if missing:
+        raise ValueError(f"Embedding version {version_id} is missing {missing} planned embeddings; backfill it first")
+
+    cur.execute("""
+        UPDATE embedding_versions
+        SET state = 'retired', retired_at = CURRENT_TIMESTAMP
+        WHERE state = 'active'
+    """)
+    cur.execute("""
+        UPDATE embedding_versions
+        SET state = 'active', activated_at = CURRENT_TIMESTAMP, retired_at = NULL
+        WHERE id = %s
+        RETURNING id, model, dimensions, state
+    """, (version_id,))
+    version = _row_to_version(cur.fetchone())
+    # Delivered at commit, together with the switch itself
+    cur.execute("SELECT pg_notify(%s, %s)", (CORPUS_CHANNEL, json.dumps({
+        'table': 'embedding_versions', 'op': 'UPDATE', 'id': version_id,
+    })))
+    logger.info(f"Activated embedding version {version_id} ({version['model']})")
+    return version
+
+
+def retire_version(cur, version_id: int):
+    """Stop writing to a version that's building; the active one can only be replaced"""
+    version = get_version(cur, version_id, lock=True)
+    if version is None:
+        raise ValueError(f"No embedding version {version_id}")
+    if version['state'] == 'active':
+        raise ValueError(f"Embedding version {version_id} is active; activate another version instead")
+    cur.execute("""
+        UPDATE embedding_versions SET state = 'retired', retired_at = coalesce(retired_at, CURRENT_TIMESTAMP)
+        WHERE id = %s
+    """, (version_id,))
+
+
+def adopt_version(cur, model: str, dimensions: int) -> Dict[str, Any]:
+    """
+    Version for embeddings loaded into an empty corpus (snapshot import):
+    an existing one with the same model, else a new one, made active.
+    """
+    cur.execute("LOCK TABLE embedding_versions IN EXCLUSIVE MODE")
+    cur.execute("""
+        SELECT id, model, dimensions, state FROM embedding_versions
+        WHERE model = %s AND dimensions = %s
+        ORDER BY (state = 'active') DESC, id DESC
+        LIMIT 1
+    """, (model, dimensions))
+    row = cur.fetchone()
+    if row is None:
+        cur.execute("""
+            INSERT INTO embedding_versions (model, dimensions) VALUES (%s, %s)
+            RETURNING id, model, dimensions, state
+        """, (model, dimensions))
+        row = cur.fetchone()
+    version = _row_to_version(row)
+    if version['state'] != 'active':
+        # Nothing else is stored, so there's nothing to backfill first
+        version = activate_version(cur, version['id'], plan=[])
+    return version
@@ -0,0 +1,77 @@
+# server\utils\extraction_cache.py
+import json
+import hashlib
+import logging
+from typing import Dict, Optional
+
+from psycopg2.extras import Json
+
+from config.db import get_db_connection
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def extraction_cache_key(transcript_text: str, prompt_version: int, model: str) -> str:
+    """Content address of one Claude extraction"""
+    payload = json.dumps([transcript_text, prompt_version, model], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def load_extraction(cache_key: str) -> Optional[Dict]:
+    """Cached extraction row as a dict, or None"""
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT raw_response, parsed, parser_version
+                FROM transcript_extractions
+                WHERE cache_key = %s
+            """, (cache_key,))
+            row = cur.fetchone()
+    finally:
+        conn.close()
+
+    if row is None:
+        return None
+    return {
+        'raw_response': row[0],
+        'parsed': row[1],
+        'parser_version': row[2],
+    }
+
+
+def store_extraction(cache_key: str, prompt_version: int, model: str, raw_response: str):
+    """Store the raw response as soon as we have it, before parsing can fail"""
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO transcript_extractions
+                    (cache_key, prompt_version, model, raw_response)
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT (cache_key) DO UPDATE SET
+                    raw_response = EXCLUDED.raw_response,
+                    parsed = NULL,
+                    parser_version = NULL,
+                    updated_at = CURRENT_TIMESTAMP
+            """, (cache_key, prompt_version, model, raw_response))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def store_parsed(cache_key: str, parsed: Dict, parser_version: int):
+    """Record the parsed dict for the parser version that produced it"""
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                UPDATE transcript_extractions
+                SET parsed = %s, parser_version = %s, updated_at = CURRENT_TIMESTAMP
+                WHERE cache_key = %s
+            """, (Json(parsed), parser_version, cache_key))
+        conn.commit()
+    finally:
+        conn.close()
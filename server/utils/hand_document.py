@@ -0,0 +1,162 @@
+# server\utils\hand_document.py
+import logging
+from typing import Any, Dict, List, Optional
+
+from psycopg2.extras import Json
+
+from utils.card_features import hand_card_profile
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Bump when the rendering changes; older stored documents get rebuilt
+HAND_DOCUMENT_VERSION = 2
+
+STREETS = ['preflop', 'flop', 'turn', 'river']
+
+# Board field for each street; preflop has no board cards
+STREET_CARDS = {
+    'flop': 'flop_cards',
+    'turn': 'turn_card',
+    'river': 'river_card',
+}
+
+# Fields returned to the client alongside an analysis
+DISPLAY_FIELDS = [
+    'game_location', 'stakes', 'caller_cards',
+    'preflop_action',
+    'flop_cards', 'flop_action',
+    'turn_card', 'turn_action',
+    'river_card', 'river_action',
+]
+
+# transcript_analysis columns a document is rendered from
+SOURCE_FIELDS = DISPLAY_FIELDS + [f'{street}_commentary' for street in STREETS]
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English prose)"""
+    if not text:
+        return 0
+    return max(1, (len(text) + 3) // 4)
+
+
+def street_played(hand: Dict[str, Any], street: str) -> bool:
+    if street == 'preflop':
+        return True
+    return bool(hand.get(STREET_CARDS[street]))
+
+
+def render_header(hand: Dict[str, Any]) -> str:
+    return (
+        f"Game: {hand.get('game_location')}, Stakes: {hand.get('stakes')}\n"
+        f"Hero Cards: {hand.get('caller_cards')}\n"
+    )
+
+
+def render_action(hand: Dict[str, Any], street: str) -> str:
+    if street == 'preflop':
+        return f"PREFLOP: {hand.get('preflop_action')}\n"
+    return (
+        f"{street.upper()}: {hand.get(STREET_CARDS[street])}\n"
+        f"Action: {hand.get(f'{street}_action')}\n"
+    )
+
+
+def render_street_text(hand: Dict[str, Any], street: str) -> Optional[str]:
+    """One street as used for embedding chunks and reranking"""
+    action = hand.get(f'{street}_action', '')
+    commentary = hand.get(f'{street}_commentary', '')
+    if not (action or commentary):
+        return None
+    return f"{street.upper()}: Action: {action} Commentary: {commentary}"
+
+
+def render_rerank_text(hand: Dict[str, Any]) -> str:
+    """Hand as a single line of text for the Voyage reranker"""
+    text_parts = [
+        f"Game: {hand['game_location']}, Stakes: {hand['stakes']}, "
+        f"Hero Cards: {hand['caller_cards']}"
+    ]
+    for street in STREETS:
+        street_text = render_street_text(hand, street)
+        if street_text:
+            text_parts.append(street_text)
+    return " ".join(text_parts)
+
+
+def build_hand_document(hand: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Render everything the query path needs from a transcript_analysis row
+    once, so requests read a single JSONB column instead of re-rendering.
+    """
+    header = render_header(hand)
+    streets: List[Dict[str, Any]] = []
+    prompt_context = header
+    for street in STREETS:
+        if not street_played(hand, street):
+            continue
+        action_text = render_action(hand, street)
+        commentary = hand.get(f'{street}_commentary') or ''
+        streets.append({
+            'street': street,
+            'action_text': action_text,
+            'commentary': commentary,
+            'action_tokens': estimate_tokens(action_text),
+            'commentary_tokens': estimate_tokens(commentary),
+        })
+        prompt_context += action_text
+        if commentary:
+            prompt_context += f"Commentary: {commentary}\n"
+
+    rerank_text = render_rerank_text(hand)
+    return {
+        'version': HAND_DOCUMENT_VERSION,
+        'fields': {field: hand.get(field) for field in DISPLAY_FIELDS},
+        'header': header,
+        'streets': streets,
+        'prompt_context': prompt_context,
+        'rerank_text': rerank_text,
+        # Card masks and structural features for reranking (utils/card_features.py)
+        'cards': hand_card_profile(hand),
+        'token_counts': {
+            'header': estimate_tokens(header),
+            'prompt_context': estimate_tokens(prompt_context),
+            'rerank_text': estimate_tokens(rerank_text),
+        },
+    }
+
+
+def get_hand_document(hand: Dict[str, Any]) -> Dict[str, Any]:
+    """Stored document if current, otherwise render one from the row's columns"""
+    document = hand.get('hand_document')
+    if document and document.get('version') == HAND_DOCUMENT_VERSION:
+        return document
+    return build_hand_document(hand)
+
+
+def refresh_hand_documents(conn, hand_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    """
+    Rebuild and store the documents for the given transcript_analysis rows
+    Returns: dict of hand id -> document
+    """
+    documents = {}
+    with conn.cursor() as cur:
+        cur.execute(
+            f"SELECT id, {', '.join(SOURCE_FIELDS)} FROM transcript_analysis WHERE id = ANY(%s)",
+            (list(hand_ids),)
+        )
+        columns = [desc[0] for desc in cur.description]
+        for row in cur.fetchall():
+            hand = dict(zip(columns, row))
+            documents[hand['id']] = build_hand_document(hand)
+
+        for hand_id, document in documents.items():
+            cur.execute(
+                "UPDATE transcript_analysis SET hand_document = %s WHERE id = %s",
+                (Json(document), hand_id)
+            )
+    conn.commit()
+    logger.info(f"Refreshed {len(documents)} hand documents")
+    return documents
@@ -1,214 +1,302 @@
-from typing import Dict, Optional
+from typing import Dict, Iterable, List, Optional, Tuple
 import re
 
+RANKS = {
+    '2': 'Two', '3': 'Three', '4': 'Four', '5': 'Five',
+    '6': 'Six', '7': 'Seven', '8': 'Eight', '9': 'Nine',
+    '10': 'Ten', 'j': 'Jack', 'q': 'Queen', 'k': 'King',
+    'a': 'Ace'
+}
+
+SUITS = {
+    'h': 'Hearts', 'd': 'Diamonds',
+    'c': 'Clubs', 's': 'Spades',
+    'heart': 'Hearts', 'diamond': 'Diamonds',
+    'club': 'Clubs', 'spade': 'Spades'
+}
+
+# Keyword tables in priority order: when a query mentions several, the first
+# listed wins (the order the original substring scan checked them in)
+POSITIONS = [
+    ('utg', 'UTG'),
+    ('lowjack', 'LowJack'),
+    ('hijack', 'HJ'),
+    ('cutoff', 'cutoff'),
+    ('button', 'button'),
+    ('sb', 'small blind'),
+    ('bb', 'big blind'),
+    ('straddle', 'straddle'),
+    ('+1', '+1'),  # For positions relative to UTG
+    ('+2', '+2'),
+    # Spellings the substring scan never recognised
+    ('lj', 'LowJack'),
+    ('hj', 'HJ'),
+    ('co', 'cutoff'),
+    ('btn', 'button'),
+    ('small blind', 'small blind'),
+    ('big blind', 'big blind'),
+]
+
+GAME_TYPES = [
+    ('cash', 'cash game'),
+    ('tournament', 'tournament'),
+    ('mtt', 'tournament'),
+    ('sng', 'sit-n-go'),
+    ('sit and go', 'sit-n-go'),
+]
+
+VILLAIN_TYPES = [
+    ('maniac', 'aggressive'),
+    ('tight', 'tight'),
+    ('loose', 'loose'),
+    ('passive', 'passive'),
+    ('aggressive', 'aggressive'),
+    ('recreational', 'recreational'),
+    ('reg', 'regular'),
+    ('regular', 'regular'),
+]
+
+
+# Words, with '+' kept as a prefix so 'utg+1' yields 'utg' and '+1'
+TOKEN_PATTERN = re.compile(r'\+?[a-z0-9]+')
+
+# (set of tokens, tokens joined by single spaces and padded with spaces)
+QueryTokens = Tuple[frozenset, str]
+
+
+class KeywordMatcher:
+    """
+    Whole-token keyword lookup. Keywords only match as separate tokens ('bb'
+    doesn't fire inside '100bb' or 'abbey'); multi-word keywords match
+    consecutive tokens. Single-word lookups are one set intersection.
+    """
+
+    def __init__(self, table: List[Tuple[str, str]], plurals: bool = True):
+        self.values = {}
+        self.priority = {}
+        # Surface form (including plurals) -> keyword
+        self.words: Dict[str, str] = {}
+        self.phrases: List[Tuple[str, str, str]] = []
+        for index, (keyword, value) in enumerate(table):
+            self.values[keyword] = value
+            self.priority[keyword] = index
+            forms = [keyword, keyword + 's'] if plurals else [keyword]
+            if ' ' in keyword:
+                # (first word, padded form) pairs; the first word gates the substring check
+                self.phrases.extend((keyword.split()[0], f' {form} ', keyword) for form in forms)
+            else:
+                self.words.update((form, keyword) for form in forms)
+        self.word_set = frozenset(self.words)
+
+    def find(self, tokens: QueryTokens) -> Optional[str]:
+        """Value of the highest-priority keyword among the tokens, or None"""
+        token_set, joined = tokens
+        found = [self.words[word] for word in self.word_set & token_set]
+        found += [
+            keyword for first, padded, keyword in self.phrases
+            if first in token_set and padded in joined
+        ]
+        if not found:
+            return None
+        return self.values[min(found, key=self.priority.__getitem__)]
+
+
+POSITION_MATCHER = KeywordMatcher(POSITIONS, plurals=False)
+GAME_TYPE_MATCHER = KeywordMatcher(GAME_TYPES)
+VILLAIN_MATCHER = KeywordMatcher(VILLAIN_TYPES)
+
+PAIRS_PATTERN = re.compile(r'(two black|two red) (aces|kings|queens|jacks)')
+CARDS_PATTERN = re.compile(r'(\w+) of (\w+) and (\w+) of (\w+)')
+STACK_PATTERN = re.compile(r'(\d+)\s*bb|(\$\d+)\s*stack')
+# Each pattern is only run when a literal it requires is in the query
+STAKES_PATTERNS = [
+    (('/',), re.compile(r'\$?\d+/\$?\d+/?\$?\d*')),  # Matches 2/3/5 or 2/3
+    (('buy',), re.compile(r'\$\d+\s*(?:max\s*)?(?:buy[\s-]*in)')),  # Matches $800 max buy-in
+    (('nl', 'limit'), re.compile(r'(?:nl|pot\s*limit)\s*\d+')),  # Matches NL100 or pot limit 200
+]
+PLAYERS_PATTERN = re.compile(r'(\d+)[- ](?:handed|player)')
+PREFLOP_ACTION_PATTERNS = [
+    (('open',), re.compile(r'(?:utg|hj|co|btn|sb|bb)\s+opens?\s+to\s+\$?\d+')),
+    (('bet',), re.compile(r'(?:3bet|three[- ]?bet)\s+to\s+\$?\d+')),
+    (('flat', 'call'), re.compile(r'(?:flat|call)(?:s|ed)?\s+(?:the\s+)?\$?\d+')),
+    (('raise',), re.compile(r'raise[ds]?\s+to\s+\$?\d+')),
+]
+
+
+def _tokens(text: str) -> QueryTokens:
+    tokens = TOKEN_PATTERN.findall(text)
+    return frozenset(tokens), f" {' '.join(tokens)} "
+
+
+def _cards(text: str) -> Optional[str]:
+    # Handle special patterns
+    if 'two ' in text:
+        match = PAIRS_PATTERN.search(text)
+        if match:
+            color, rank = match.groups()
+            rank = HandQueryParser.normalize_rank(rank.rstrip('s'))  # Remove plural
+            if color == 'two black':
+                return f"{rank} of Clubs and {rank} of Spades"
+            return f"{rank} of Hearts and {rank} of Diamonds"
+
+    # Standard "X of Y and A of B" pattern
+    if ' of ' in text:
+        match = CARDS_PATTERN.search(text)
+        if match:
+            rank1, suit1, rank2, suit2 = match.groups()
+            card1 = f"{HandQueryParser.normalize_rank(rank1)} of {HandQueryParser.normalize_suit(suit1)}"
+            card2 = f"{HandQueryParser.normalize_rank(rank2)} of {HandQueryParser.normalize_suit(suit2)}"
+            return f"{card1} and {card2}"
+
+    return None
+
+
+def _stack_size(text: str) -> Optional[str]:
+    if 'bb' not in text and 'stack' not in text:
+        return None
+    match = STACK_PATTERN.search(text)
+    if match:
+        bb_size, dollar_size = match.groups()
+        return bb_size if bb_size else dollar_size
+    return None
+
+
+def _game_info(text: str, tokens: QueryTokens) -> Dict[str, str]:
+    game_info = {}
+
+    for literals, pattern in STAKES_PATTERNS:
+        if not any(literal in text for literal in literals):
+            continue
+        match = pattern.search(text)
+        if match:
+            game_info['stakes'] = match.group(0)
+            break
+
+    game_type = GAME_TYPE_MATCHER.find(tokens)
+    if game_type is not None:
+        game_info['game_type'] = game_type
+
+    # Additional info
+    if 'straddl' in text:
+        game_info['straddle'] = True
+
+    if 'mandatory' in text:
+        game_info['mandatory_straddle'] = True
+
+    return game_info
+
+
+def _player_info(text: str, tokens: QueryTokens) -> Dict[str, str]:
+    player_info = {}
+
+    if 'handed' in text or 'player' in text:
+        match = PLAYERS_PATTERN.search(text)
+        if match:
+            player_info['num_players'] = match.group(1)
+
+    villain_type = VILLAIN_MATCHER.find(tokens)
+    if villain_type is not None:
+        player_info['villain_type'] = villain_type
+
+    return player_info
+
+
+def _action_history(text: str) -> Dict[str, str]:
+    action_history = {}
+
+    for literals, pattern in PREFLOP_ACTION_PATTERNS:
+        if not any(literal in text for literal in literals):
+            continue
+        match = pattern.search(text)
+        if match:
+            action_history['preflop_action'] = match.group(0)
+            break
+
+    return action_history
+
+
 class HandQueryParser:
-    """Parses poker queries into structured format matching transcript data"""
-    
+    """
+    Parses poker queries into structured format matching transcript data.
+    Patterns are compiled at import; parse_query lowercases and tokenizes the
+    query once and the module-level helpers share that work.
+    """
+
     @staticmethod
     def parse_position(query: str) -> Optional[str]:
         """Extract position information"""
-        positions = {
-            'utg': 'UTG',
-            'lowjack': 'LowJack',
-            'hijack': 'HJ',
-            'cutoff': 'cutoff',
-            'button': 'button',
-            'sb': 'small blind',
-            'bb': 'big blind',
-            'straddle': 'straddle',
-            '+1': '+1',  # For positions relative to UTG
-            '+2': '+2'
-        }
-        
-        # Look for position mentions in query
-        query_lower = query.lower()
-        for short, full in positions.items():
-            if short in query_lower:
-                return full
-        return None
-    
+        return POSITION_MATCHER.find(_tokens(query.lower()))
+
     @staticmethod
     def normalize_rank(rank: str) -> str:
         """Normalize card rank to proper format"""
-        ranks = {
-            '2': 'Two', '3': 'Three', '4': 'Four', '5': 'Five',
-            '6': 'Six', '7': 'Seven', '8': 'Eight', '9': 'Nine',
-            '10': 'Ten', 'j': 'Jack', 'q': 'Queen', 'k': 'King',
-            'a': 'Ace'
-        }
-        return ranks.get(rank.lower(), rank.title())
+        return RANKS.get(rank.lower(), rank.title())
 
     @staticmethod
     def normalize_suit(suit: str) -> str:
         """Normalize card suit to proper format"""
-        suits = {
-            'h': 'Hearts', 'd': 'Diamonds',
-            'c': 'Clubs', 's': 'Spades',
-            'heart': 'Hearts', 'diamond': 'Diamonds',
-            'club': 'Clubs', 'spade': 'Spades'
-        }
-        return suits.get(suit.lower(), suit.title())
+        return SUITS.get(suit.lower(), suit.title())
 
     @staticmethod
     def parse_cards(query: str) -> Optional[str]:
         """Extract card information in proper English format"""
-        query = query.lower()
-        
-        # Handle special patterns
-        pairs_pattern = r'(two black|two red) (aces|kings|queens|jacks)'
-        match = re.search(pairs_pattern, query)
-        if match:
-            color, rank = match.groups()
-            rank = rank.rstrip('s')  # Remove plural
-            if color == 'two black':
-                return f"{HandQueryParser.normalize_rank(rank)} of Clubs and {HandQueryParser.normalize_rank(rank)} of Spades"
-            if color == 'two red':
-                return f"{HandQueryParser.normalize_rank(rank)} of Hearts and {HandQueryParser.normalize_rank(rank)} of Diamonds"
-        
-        # Standard "X of Y and A of B" pattern
-        pattern = r'(\w+) of (\w+) and (\w+) of (\w+)'
-        match = re.search(pattern, query)
-        if match:
-            rank1, suit1, rank2, suit2 = match.groups()
-            card1 = f"{HandQueryParser.normalize_rank(rank1)} of {HandQueryParser.normalize_suit(suit1)}"
-            card2 = f"{HandQueryParser.normalize_rank(rank2)} of {HandQueryParser.normalize_suit(suit2)}"
-            return f"{card1} and {card2}"
-        
-        return None
+        return _cards(query.lower())
 
     @staticmethod
     def parse_stack_size(query: str) -> Optional[str]:
         """Extract stack size information"""
-        pattern = r'(\d+)\s*bb|(\$\d+)\s*stack'
-        match = re.search(pattern, query.lower())
-        if match:
-            bb_size, dollar_size = match.groups()
-            return bb_size if bb_size else dollar_size
-        return None
+        return _stack_size(query.lower())
 
     @staticmethod
     def parse_game_info(query: str) -> Dict[str, str]:
         """Extract game information"""
-        game_info = {}
-        
-        # Stakes patterns
-        stakes_patterns = [
-            r'\$?\d+/\$?\d+/?\$?\d*',  # Matches 2/3/5 or 2/3
-            r'\$\d+\s*(?:max\s*)?(?:buy[\s-]*in)',  # Matches $800 max buy-in
-            r'(?:nl|pot\s*limit)\s*\d+',  # Matches NL100 or pot limit 200
-        ]
-        
-        for pattern in stakes_patterns:
-            match = re.search(pattern, query.lower())
-            if match:
-                game_info['stakes'] = match.group(0)
-                break
-        
-        # Game type
-        game_types = {
-            'cash': 'cash game',
-            'tournament': 'tournament',
-            'mtt': 'tournament',
-            'sng': 'sit-n-go',
-            'sit and go': 'sit-n-go',
-        }
-        
-        for key, value in game_types.items():
-            if key in query.lower():
-                game_info['game_type'] = value
-                break
-        
-        # Additional info
-        if 'straddle' in query.lower():
-            game_info['straddle'] = True
-        
-        if 'mandatory' in query.lower():
-            game_info['mandatory_straddle'] = True
-            
-        return game_info
+        text = query.lower()
+        return _game_info(text, _tokens(text))
 
     @staticmethod
     def parse_player_info(query: str) -> Dict[str, str]:
         """Extract player-related information"""
-        player_info = {}
-        
-        # Number of players
-        players_pattern = r'(\d+)[- ](?:handed|player)'
-        match = re.search(players_pattern, query.lower())
-        if match:
-            player_info['num_players'] = match.group(1)
-        
-        # Villain types/tendencies
-        villains = {
-            'maniac': 'aggressive',
-            'tight': 'tight',
-            'loose': 'loose',
-            'passive': 'passive',
-            'aggressive': 'aggressive',
-            'recreational': 'recreational',
-            'reg': 'regular'
-        }
-        
-        for key, value in villains.items():
-            if key in query.lower():
-                player_info['villain_type'] = value
-                break
-                
-        return player_info
+        text = query.lower()
+        return _player_info(text, _tokens(text))
 
     @staticmethod
     def parse_action_history(query: str) -> Dict[str, str]:
         """Extract any action history mentioned in query"""
-        action_history = {}
-        
-        # Preflop actions
-        preflop_patterns = {
-            'open': r'(?:utg|hj|co|btn|sb|bb)\s+opens?\s+to\s+\$?\d+',
-            '3bet': r'(?:3bet|three[- ]?bet)\s+to\s+\$?\d+',
-            'call': r'(?:flat|call)(?:s|ed)?\s+(?:the\s+)?\$?\d+',
-            'raise': r'raise[ds]?\s+to\s+\$?\d+'
-        }
-        
-        for action_type, pattern in preflop_patterns.items():
-            match = re.search(pattern, query.lower())
-            if match:
-                action_history['preflop_action'] = match.group(0)
-                break
-                
-        return action_history
+        return _action_history(query.lower())
 
     def parse_query(self, query: str) -> Dict:
         """Parse full query into structured format matching transcript data"""
+        text = query.lower()
+        tokens = _tokens(text)
         result = {}
-        
-        # Check position
-        position = self.parse_position(query)
+
+        position = POSITION_MATCHER.find(tokens)
         if position is not None:
             result['position'] = position
-            
-        # Check hero cards
-        hero_cards = self.parse_cards(query)
+
+        hero_cards = _cards(text)
         if hero_cards is not None:
             result['hero_cards'] = hero_cards
-            
-        # Check stack size
-        stack_size = self.parse_stack_size(query)
+
+        stack_size = _stack_size(text)
         if stack_size is not None:
             result['stack_size'] = stack_size
-            
-        # Check game info
-        game_info = self.parse_game_info(query)
+
+        game_info = _game_info(text, tokens)
         if game_info:  # Only add if dictionary is not empty
             result['game_info'] = game_info
-            
-        # Check player info
-        player_info = self.parse_player_info(query)
+
+        player_info = _player_info(text, tokens)
         if player_info:  # Only add if dictionary is not empty
             result['player_info'] = player_info
-            
-        # Check action history
-        action_history = self.parse_action_history(query)
+
+        action_history = _action_history(text)
         if action_history:  # Only add if dictionary is not empty
             result['action_history'] = action_history
-            
-        return result
\ No newline at end of file
+
+        return result
+
+    def parse_many(self, queries: Iterable[str]) -> List[Dict]:
+        """Parse a batch of queries, one result dict per query in input order"""
+        parse_query = self.parse_query
+        return [parse_query(query) for query in queries]
@@ -0,0 +1,471 @@
+# server\utils\job_ledger.py
+import os
+import csv
+import zlib
+import socket
+import logging
+from typing import Dict, Iterable, List, Optional, Set
+
+from psycopg2.extras import Json, execute_values
+
+from config.db import get_db_connection
+from utils.embedding_plan import embedding_plan
+from utils.embedding_versions import live_versions
+from utils.read_transcript_from_yt import extract_video_id
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+JOB_STATES = ('queued', 'fetching', 'extracting', 'done', 'failed')
+
+# Default lease: long enough for one fetch + Claude extraction
+DEFAULT_LEASE_SECONDS = 900
+DEFAULT_MAX_ATTEMPTS = 3
+
+# Condition on transcript_analysis ta: the hand lacks one of the embedding
+# types in %(plan)s for one of the embedding versions in %(versions)s. Types
+# the hand has no chunk for (e.g. river commentary) are recorded in
+# embedding_skips when it's embedded and don't count as missing.
+# Near-duplicates of another hand are never embedded; search returns the original.
+MISSING_PLANNED_EMBEDDINGS = """ta.duplicate_of IS NULL AND EXISTS (
+    SELECT 1
+    FROM unnest(%(plan)s::text[]) AS planned(embedding_type)
+    CROSS JOIN unnest(%(versions)s::int[]) AS live(embedding_version)
+    WHERE NOT EXISTS (
+        SELECT 1 FROM hand_embeddings he
+        WHERE he.hand_analysis_id = ta.id
+          AND he.embedding_type = planned.embedding_type
+          AND he.embedding_version = live.embedding_version
+    )
+    AND NOT EXISTS (
+        SELECT 1 FROM embedding_skips es
+        WHERE es.hand_analysis_id = ta.id
+          AND es.embedding_type = planned.embedding_type
+          AND es.embedding_version = live.embedding_version
+    )
+)"""
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def parse_shard(value: str):
+    """'i/N' -> (i, N), for splitting work statically across N processes"""
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise ValueError(f"Shard must look like i/N, got '{value}'")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Shard index must be in [0, {count}), got {index}")
+    return index, count
+
+
+def in_shard(key, shard) -> bool:
+    """Stable assignment of a url (or hand id) to one of N shards"""
+    if shard is None:
+        return True
+    index, count = shard
+    if isinstance(key, int):
+        return key % count == index
+    return zlib.crc32(key.encode('utf-8')) % count == index
+
+
+def claim_leases(
+        cur,
+        table: str,
+        key_column: str,
+        working_state: str,
+        worker_id: str,
+        limit: int = 1,
+        lease_seconds: int = DEFAULT_LEASE_SECONDS,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS
+    ) -> List:
+    """
+    Claim up to `limit` jobs from a jobs table with SELECT ... FOR UPDATE SKIP
+    LOCKED, so concurrent workers never pick the same row. Claimable jobs are
+    queued ones, failed ones with attempts left, and in-progress ones whose
+    lease expired (their worker died).
+    Returns the claimed keys.
+    """
+    cur.execute(f"""
+        UPDATE {table}
+        SET state = %s,
+            attempts = attempts + 1,
+            lease_owner = %s,
+            lease_expires_at = CURRENT_TIMESTAMP + make_interval(secs => %s),
+            started_at = CURRENT_TIMESTAMP,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE {key_column} IN (
+            SELECT {key_column}
+            FROM {table}
+            WHERE (state = 'queued')
+               OR (state = 'failed' AND attempts < %s)
+               OR (state NOT IN ('queued', 'done', 'failed')
+                   AND lease_expires_at < CURRENT_TIMESTAMP)
+            ORDER BY queued_at
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING {key_column}
+    """, (working_state, worker_id, lease_seconds, max_attempts, limit))
+    return [row[0] for row in cur.fetchall()]
+
+
+class JobLedger:
+    """
+    Transactional record of every video ingest, one row per url/video_id.
+    Replaces the completed_analyses.csv bookkeeping in analyze_transcripts.py.
+    """
+
+    def done_keys(self) -> Set[str]:
+        """
+        Urls and video ids that already have an analysis, for O(1) membership
+        checks. Video ids catch the same video linked under a different url.
+        """
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT url, video_id FROM ingest_jobs WHERE state = 'done'")
+                keys = set()
+                for url, video_id in cur.fetchall():
+                    keys.add(url)
+                    if video_id:
+                        keys.add(video_id)
+                return keys
+        finally:
+            conn.close()
+
+    @staticmethod
+    def is_done(url: str, done_keys: Set[str]) -> bool:
+        return url in done_keys or extract_video_id(url) in done_keys
+
+    def enqueue(self, urls: Iterable[str]) -> int:
+        """Add urls as queued jobs; urls or video ids already in the ledger are left alone"""
+        rows = [(url, extract_video_id(url)) for url in urls]
+        if not rows:
+            return 0
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                inserted = len(execute_values(cur, """
+                    INSERT INTO ingest_jobs (url, video_id)
+                    VALUES %s
+                    ON CONFLICT DO NOTHING
+                    RETURNING id
+                """, rows, fetch=True))
+            conn.commit()
+            return inserted
+        finally:
+            conn.close()
+
+    def submit(self, url: str) -> Optional[Dict]:
+        """
+        Queue a single url for the background worker. Resubmitting a failed
+        job re-queues it with fresh attempts; any other existing job is
+        returned unchanged.
+        Returns: {'job_id', 'state'}, or None if the url has no video id
+        """
+        video_id = extract_video_id(url)
+        if not video_id:
+            return None
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    INSERT INTO ingest_jobs (url, video_id)
+                    VALUES (%s, %s)
+                    ON CONFLICT DO NOTHING
+                    RETURNING id, state
+                """, (url, video_id))
+                row = cur.fetchone()
+                if row is None:
+                    cur.execute("""
+                        UPDATE ingest_jobs
+                        SET state = CASE WHEN state = 'failed' THEN 'queued' ELSE state END,
+                            attempts = CASE WHEN state = 'failed' THEN 0 ELSE attempts END,
+                            updated_at = CURRENT_TIMESTAMP
+                        WHERE url = %s OR video_id = %s
+                        RETURNING id, state
+                    """, (url, video_id))
+                    row = cur.fetchone()
+            conn.commit()
+            return {'job_id': row[0], 'state': row[1]}
+        finally:
+            conn.close()
+
+    def get_job(self, job_id: int) -> Optional[Dict]:
+        """Status of one ingest job, including its hand's embedding progress"""
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT
+                        ij.id AS job_id,
+                        ij.url,
+                        ij.video_id,
+                        ij.state,
+                        ij.attempts,
+                        ij.analysis_id,
+                        COALESCE(ij.analysis_ids, ARRAY_REMOVE(ARRAY[ij.analysis_id], NULL)) AS analysis_ids,
+                        ij.last_error,
+                        ij.timings,
+                        ij.queued_at,
+                        ij.started_at,
+                        ij.finished_at,
+                        (
+                            -- One state for all of the video's hands
+                            SELECT CASE
+                                WHEN bool_or(ej.state = 'failed') THEN 'failed'
+                                WHEN bool_and(ej.state = 'done') THEN 'done'
+                                WHEN bool_or(ej.state = 'embedding') THEN 'embedding'
+                                ELSE 'queued'
+                            END
+                            FROM embedding_jobs ej
+                            WHERE ej.hand_analysis_id = ANY(COALESCE(ij.analysis_ids, ARRAY[ij.analysis_id]))
+                            HAVING count(*) > 0
+                        ) AS embedding_state
+                    FROM ingest_jobs ij
+                    WHERE ij.id = %s
+                """, (job_id,))
+                row = cur.fetchone()
+                if row is None:
+                    return None
+                columns = [desc[0] for desc in cur.description]
+                return dict(zip(columns, row))
+        finally:
+            conn.close()
+
+    def set_state(self, url: str, state: str):
+        """Move a job to a working state; entering 'fetching' counts as a new attempt"""
+        if state not in JOB_STATES:
+            raise ValueError(f"Unknown job state: {state}")
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    UPDATE ingest_jobs
+                    SET state = %s,
+                        attempts = attempts + CASE WHEN %s = 'fetching' THEN 1 ELSE 0 END,
+                        started_at = CASE WHEN %s = 'fetching' THEN CURRENT_TIMESTAMP ELSE started_at END,
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE url = %s
+                """, (state, state, state, url))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def fail(self, url: str, error: str, timings: Optional[Dict[str, float]] = None):
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    UPDATE ingest_jobs
+                    SET state = 'failed',
+                        lease_owner = NULL,
+                        lease_expires_at = NULL,
+                        last_error = %s,
+                        timings = COALESCE(timings, '{}'::jsonb) || %s,
+                        finished_at = CURRENT_TIMESTAMP,
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE url = %s
+                """, (error, Json(timings or {}), url))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def claim(self, worker_id: str, limit: int = 1, lease_seconds: int = DEFAULT_LEASE_SECONDS) -> List[str]:
+        """Lease up to `limit` ingest jobs for this worker; returns their urls"""
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                urls = claim_leases(
+                    cur, 'ingest_jobs', 'url', 'fetching', worker_id,
+                    limit=limit, lease_seconds=lease_seconds
+                )
+            conn.commit()
+            return urls
+        finally:
+            conn.close()
+
+    @staticmethod
+    def existing_analysis(cur, url: str) -> Optional[List[int]]:
+        """
+        analysis ids of a finished job, locking its ledger row so a concurrent
+        ingest of the same url waits for this transaction
+        """
+        cur.execute("""
+            SELECT analysis_id, analysis_ids
+            FROM ingest_jobs
+            WHERE url = %s
+            FOR UPDATE
+        """, (url,))
+        row = cur.fetchone()
+        if row is None or row[0] is None:
+            return None
+        return row[1] or [row[0]]
+
+    @staticmethod
+    def mark_done(cur, url: str, analysis_ids: List[int], timings: Optional[Dict[str, float]] = None):
+        """
+        Record a finished ingest and the hands it produced on the caller's
+        cursor, so it commits in the same transaction as the
+        transcript_analysis inserts
+        """
+        cur.execute("""
+            INSERT INTO ingest_jobs (url, video_id, state, attempts, analysis_id, analysis_ids, timings, finished_at)
+            VALUES (%s, %s, 'done', 1, %s, %s, %s, CURRENT_TIMESTAMP)
+            ON CONFLICT (url) DO UPDATE SET
+                state = 'done',
+                lease_owner = NULL,
+                lease_expires_at = NULL,
+                analysis_id = EXCLUDED.analysis_id,
+                analysis_ids = EXCLUDED.analysis_ids,
+                last_error = NULL,
+                timings = COALESCE(ingest_jobs.timings, '{}'::jsonb) || EXCLUDED.timings,
+                finished_at = CURRENT_TIMESTAMP,
+                updated_at = CURRENT_TIMESTAMP
+        """, (url, extract_video_id(url), analysis_ids[0], list(analysis_ids), Json(timings or {})))
+
+    def import_completed_csv(self, csv_path: str) -> int:
+        """One-off migration of the legacy completed_analyses.csv into the ledger"""
+        try:
+            with open(csv_path, newline='') as csvfile:
+                rows = [
+                    (row['yt_url'], extract_video_id(row['yt_url']), int(row['analysis_id']))
+                    for row in csv.DictReader(csvfile)
+                    if row.get('yt_url') and row.get('analysis_id')
+                ]
+        except FileNotFoundError:
+            return 0
+        if not rows:
+            return 0
+
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                imported = len(execute_values(cur, """
+                    INSERT INTO ingest_jobs (url, video_id, analysis_id, state, attempts, finished_at)
+                    VALUES %s
+                    ON CONFLICT DO NOTHING
+                    RETURNING id
+                """, rows, template="(%s, %s, %s, 'done', 1, CURRENT_TIMESTAMP)", fetch=True))
+            conn.commit()
+        finally:
+            conn.close()
+        logger.info(f"Imported {imported} completed analyses from {csv_path}")
+        return imported
+
+
+class EmbeddingJobLedger:
+    """Embedding backlog as leasable jobs, one row per transcript_analysis hand"""
+
+    def enqueue_backlog(self) -> int:
+        """
+        Queue every analyzed hand missing a planned embedding type in a live
+        embedding version. Finished hands are queued again when the plan or a
+        new version needs more of them.
+        """
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                versions = [version['id'] for version in live_versions(cur)]
+                cur.execute(f"""
+                    INSERT INTO embedding_jobs (hand_analysis_id)
+                    SELECT ta.id
+                    FROM transcript_analysis ta
+                    WHERE {MISSING_PLANNED_EMBEDDINGS}
+                    ON CONFLICT (hand_analysis_id) DO UPDATE SET
+                        state = 'queued',
+                        attempts = 0,
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE embedding_jobs.state = 'done'
+                """, {'plan': embedding_plan(), 'versions': versions})
+                queued = cur.rowcount
+            conn.commit()
+            return queued
+        finally:
+            conn.close()
+
+    def enqueue(self, hand_ids: Iterable[int]) -> int:
+        """Queue specific hands; hands already in the ledger are left alone"""
+        rows = [(hand_id,) for hand_id in hand_ids]
+        if not rows:
+            return 0
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                inserted = len(execute_values(cur, """
+                    INSERT INTO embedding_jobs (hand_analysis_id)
+                    VALUES %s
+                    ON CONFLICT DO NOTHING
+                    RETURNING hand_analysis_id
+                """, rows, fetch=True))
+            conn.commit()
+            return inserted
+        finally:
+            conn.close()
+
+    def claim(self, worker_id: str, limit: int = 10, lease_seconds: int = DEFAULT_LEASE_SECONDS) -> List[int]:
+        """Lease up to `limit` hands for this worker; returns their ids"""
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                hand_ids = claim_leases(
+                    cur, 'embedding_jobs', 'hand_analysis_id', 'embedding', worker_id,
+                    limit=limit, lease_seconds=lease_seconds
+                )
+            conn.commit()
+            return hand_ids
+        finally:
+            conn.close()
+
+    @staticmethod
+    def mark_done(cur, hand_id: int):
+        """Record finished embeddings on the caller's cursor, committing with them"""
+        cur.execute("""
+            INSERT INTO embedding_jobs (hand_analysis_id, state, attempts, finished_at)
+            VALUES (%s, 'done', 1, CURRENT_TIMESTAMP)
+            ON CONFLICT (hand_analysis_id) DO UPDATE SET
+                state = 'done',
+                lease_owner = NULL,
+                lease_expires_at = NULL,
+                last_error = NULL,
+                finished_at = CURRENT_TIMESTAMP,
+                updated_at = CURRENT_TIMESTAMP
+        """, (hand_id,))
+
+    @staticmethod
+    def mark_not_applicable(cur, hand_id: int, version_id: int, embedding_types: Iterable[str]):
+        """Record planned types the hand has no chunk for, on the caller's cursor"""
+        rows = [(hand_id, version_id, embedding_type) for embedding_type in embedding_types]
+        if rows:
+            execute_values(cur, """
+                INSERT INTO embedding_skips (hand_analysis_id, embedding_version, embedding_type)
+                VALUES %s
+                ON CONFLICT DO NOTHING
+            """, rows)
+
+    def fail(self, hand_id: int, error: str):
+        """
+        Record a failed attempt. Hands embedded outside a claim (e.g. by the
+        ingest worker) get their row here, so claim() retries them.
+        """
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    INSERT INTO embedding_jobs (hand_analysis_id, state, attempts, last_error, finished_at)
+                    VALUES (%s, 'failed', 1, %s, CURRENT_TIMESTAMP)
+                    ON CONFLICT (hand_analysis_id) DO UPDATE SET
+                        state = 'failed',
+                        lease_owner = NULL,
+                        lease_expires_at = NULL,
+                        last_error = EXCLUDED.last_error,
+                        finished_at = CURRENT_TIMESTAMP,
+                        updated_at = CURRENT_TIMESTAMP
+                """, (hand_id, error))
+            conn.commit()
+        finally:
+            conn.close()
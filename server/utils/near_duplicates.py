@@ -0,0 +1,232 @@
+# server\utils\near_duplicates.py
+import re
+import hashlib
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+from psycopg2.extras import Json, execute_values
+
+from config import settings
+from utils.card_features import parse_cards
+from utils.hand_document import SOURCE_FIELDS
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# The same hand shows up in clips, recaps and re-uploads. Each hand gets two
+# MinHash signatures, stored in hand_fingerprints:
+#   transcript - word shingles of the transcript span it was extracted from
+#                (see utils/transcript_segmenter.py), so a re-upload can be
+#                skipped before paying for Claude
+#   hand       - word shingles of the extracted action and commentary plus
+#                the structured fields (hole cards, board, stakes)
+# LSH splits each signature into bands; hands sharing any band hash are
+# candidates, confirmed by the estimated Jaccard similarity.
+#
+# Changing any of these invalidates stored signatures; rerun
+# processing_scripts/dedupe_hands.py --apply afterwards.
+NUM_PERMUTATIONS = 128
+NUM_BANDS = 16
+ROWS_PER_BAND = NUM_PERMUTATIONS // NUM_BANDS
+SHINGLE_WORDS = 5
+MINHASH_SEED = 1
+# Each structured field counts as this many shingles, so identical cards and
+# board outweigh differently worded commentary
+FIELD_WEIGHT = 8
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_rng = np.random.RandomState(MINHASH_SEED)
+_PERM_A = _rng.randint(1, 1 << 32, size=NUM_PERMUTATIONS, dtype=np.uint64)
+_PERM_B = _rng.randint(0, 1 << 32, size=NUM_PERMUTATIONS, dtype=np.uint64)
+
+WORD_PATTERN = re.compile(r'[a-z0-9]+')
+NUMBER_PATTERN = re.compile(r'\d+(?:\.\d+)?')
+
+# hand_fingerprints columns for each signature kind
+KINDS = {
+    'transcript': ('transcript_signature', 'transcript_bands'),
+    'hand': ('hand_signature', 'hand_bands'),
+}
+
+
+def _hash32(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=4).digest(), 'big')
+
+
+def text_shingles(text: Optional[str]) -> List[str]:
+    """Overlapping SHINGLE_WORDS-word shingles of lowercased words"""
+    words = WORD_PATTERN.findall((text or '').lower())
+    if len(words) <= SHINGLE_WORDS:
+        return [' '.join(words)] if words else []
+    return [' '.join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)]
+
+
+def hand_fields(hand: Dict[str, Any]) -> Dict[str, Any]:
+    """Normalised hole cards, board and stakes of a transcript_analysis row"""
+    board = []
+    for field in ('flop_cards', 'turn_card', 'river_card'):
+        board += [card for card in parse_cards(hand.get(field)) if card not in board]
+    return {
+        'hero': sorted(parse_cards(hand.get('caller_cards'))[:2]),
+        'board': board[:5],
+        'stakes': '/'.join(NUMBER_PATTERN.findall(hand.get('stakes') or '')),
+    }
+
+
+def fields_conflict(a: Optional[Dict[str, Any]], b: Optional[Dict[str, Any]]) -> bool:
+    """
+    True when two hands can't be the same hand: different hole cards, boards
+    that disagree on a street both have, or different stakes. Missing fields
+    never conflict, since a clip may cut off before the river.
+    """
+    if not a or not b:
+        return False
+    if len(a['hero']) == 2 and len(b['hero']) == 2 and a['hero'] != b['hero']:
+        return True
+    shared = min(len(a['board']), len(b['board']))
+    if shared >= 3:
+        # Flop order isn't meaningful; turn and river are compared where both have them
+        if set(a['board'][:3]) != set(b['board'][:3]) or a['board'][3:shared] != b['board'][3:shared]:
+            return True
+    return bool(a['stakes'] and b['stakes'] and a['stakes'] != b['stakes'])
+
+
+def minhash(shingles: Iterable[str]) -> Optional[np.ndarray]:
+    """uint32 MinHash signature of a set of shingles, None if it's empty"""
+    hashes = np.array(sorted({_hash32(shingle) for shingle in shingles}), dtype=np.uint64)
+    if not len(hashes):
+        return None
+    # Universal hashing (a * x + b) mod p; uint64 wrap-around is intended
+    with np.errstate(over='ignore'):
+        permuted = (hashes[:, None] * _PERM_A + _PERM_B) % _MERSENNE_PRIME
+    return (permuted & _MAX_HASH).min(axis=0).astype(np.uint32)
+
+
+def band_hashes(signature: np.ndarray) -> List[int]:
+    """One signed 64-bit hash per LSH band, distinct across bands"""
+    bands = []
+    for band in range(NUM_BANDS):
+        rows = signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        digest = hashlib.blake2b(bytes([band]) + rows.tobytes(), digest_size=8).digest()
+        bands.append(int.from_bytes(digest, 'big', signed=True))
+    return bands
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Estimated Jaccard similarity of the two shingle sets"""
+    return float(np.mean(a == b))
+
+
+def _fingerprint(shingles: Iterable[str]) -> Optional[Dict[str, Any]]:
+    signature = minhash(shingles)
+    if signature is None:
+        return None
+    return {'signature': signature, 'bands': band_hashes(signature)}
+
+
+def transcript_fingerprint(transcript_text: Optional[str]) -> Optional[Dict[str, Any]]:
+    """{signature, bands} of a transcript, None if it has no words"""
+    return _fingerprint(text_shingles(transcript_text))
+
+
+def hand_fingerprint(hand: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """{signature, bands, fields} of an extracted hand, None if it's empty"""
+    fields = hand_fields(hand)
+    text = ' '.join(str(hand[field]) for field in SOURCE_FIELDS if hand.get(field))
+    shingles = text_shingles(text)
+    for name, value in (('hero', fields['hero']), ('board', fields['board']), ('stakes', fields['stakes'])):
+        if value:
+            shingles += [f"{name}={value}#{copy}" for copy in range(FIELD_WEIGHT)]
+    fingerprint = _fingerprint(shingles)
+    if fingerprint is not None:
+        fingerprint['fields'] = fields
+    return fingerprint
+
+
+def signature_from_bytes(value) -> np.ndarray:
+    return np.frombuffer(bytes(value), dtype=np.uint32)
+
+
+def find_duplicate(
+    cur,
+    kind: str,
+    fingerprint: Optional[Dict[str, Any]],
+    threshold: float = settings.NEAR_DUPLICATE_THRESHOLD
+) -> Optional[int]:
+    """
+    Canonical id of the stored hand most similar to fingerprint, if it
+    reaches threshold. Hands flagged as duplicates resolve to their original.
+    """
+    if fingerprint is None:
+        return None
+    signature_column, bands_column = KINDS[kind]
+    cur.execute(f"""
+        SELECT COALESCE(ta.duplicate_of, ta.id), f.{signature_column}, f.fields
+        FROM hand_fingerprints f
+        JOIN transcript_analysis ta ON ta.id = f.hand_analysis_id
+        WHERE f.{bands_column} && %s::bigint[]
+    """, (fingerprint['bands'],))
+    best_id, best_similarity = None, threshold
+    for canonical_id, signature, fields in cur.fetchall():
+        if kind == 'hand' and fields_conflict(fingerprint.get('fields'), fields):
+            continue
+        score = similarity(fingerprint['signature'], signature_from_bytes(signature))
+        if score >= best_similarity:
+            best_id, best_similarity = canonical_id, score
+    if best_id is not None:
+        logger.info(f"Near-duplicate {kind} of hand {best_id} (similarity {best_similarity:.2f})")
+    return best_id
+
+
+def fingerprint_row(
+    hand_id: int,
+    transcript: Optional[Dict[str, Any]],
+    hand: Optional[Dict[str, Any]]
+) -> tuple:
+    """hand_fingerprints values for store_fingerprints"""
+    return (
+        hand_id,
+        transcript['signature'].tobytes() if transcript else None,
+        transcript['bands'] if transcript else None,
+        hand['signature'].tobytes() if hand else None,
+        hand['bands'] if hand else None,
+        Json(hand['fields']) if hand else None,
+    )
+
+
+def store_fingerprints(cur, rows: Sequence[tuple]):
+    """
+    Upsert fingerprint_row tuples on the caller's cursor. A missing
+    signature keeps the stored one, e.g. when the transcript isn't cached.
+    """
+    execute_values(cur, """
+        INSERT INTO hand_fingerprints
+            (hand_analysis_id, transcript_signature, transcript_bands, hand_signature, hand_bands, fields)
+        VALUES %s
+        ON CONFLICT (hand_analysis_id) DO UPDATE SET
+            transcript_signature = COALESCE(EXCLUDED.transcript_signature, hand_fingerprints.transcript_signature),
+            transcript_bands = COALESCE(EXCLUDED.transcript_bands, hand_fingerprints.transcript_bands),
+            hand_signature = COALESCE(EXCLUDED.hand_signature, hand_fingerprints.hand_signature),
+            hand_bands = COALESCE(EXCLUDED.hand_bands, hand_fingerprints.hand_bands),
+            fields = COALESCE(EXCLUDED.fields, hand_fingerprints.fields),
+            updated_at = CURRENT_TIMESTAMP
+    """, rows, template="(%s, %s, %s::bigint[], %s, %s::bigint[], %s)")
+
+
+def collapse_duplicates(hands: List[Dict[str, Any]], limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Keep the first (closest) hand of each duplicate group from search results
+    ordered best first. Each hand carries canonical_id, which is removed.
+    """
+    seen = set()
+    collapsed = []
+    for hand in hands:
+        canonical_id = hand.pop('canonical_id', hand.get('id'))
+        if canonical_id in seen:
+            continue
+        seen.add(canonical_id)
+        collapsed.append(hand)
+    return collapsed if limit is None else collapsed[:limit]
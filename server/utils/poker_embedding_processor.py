@@ -1,18 +1,31 @@
 from typing import Dict, List, Tuple
-import pandas as pd
-import numpy as np
 import voyageai
 
 import logging
 
+from config import settings
+from utils.hand_document import STREETS, render_street_text
+from utils.resilience import get_breaker, retry_call
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Voyage errors worth retrying; invalid requests and auth failures are not
+VOYAGE_RETRYABLE_ERRORS = (
+    voyageai.error.Timeout,
+    voyageai.error.APIConnectionError,
+    voyageai.error.RateLimitError,
+    voyageai.error.ServerError,
+    voyageai.error.ServiceUnavailableError,
+    voyageai.error.TryAgain,
+)
+
 class PokerEmbeddingProcessor:
     def __init__(self, api_key: str):
         self.api_key = api_key
         self.client = voyageai.Client(api_key=self.api_key)
+        self.breaker = get_breaker('voyage')
     
     def create_street_based_chunks(self, hand: Dict) -> List[str]:
         """Street-based chunking strategy"""
@@ -24,15 +37,10 @@ class PokerEmbeddingProcessor:
         chunks.append(('context', context))
     
         # Street chunks
-        streets = ['preflop', 'flop', 'turn', 'river']
-        for street in streets:
-            action = hand.get(f'{street}_action', '')
-            commentary = hand.get(f'{street}_commentary', '')
-            if action or commentary:
-                chunks.append((
-                    street,
-                    f"{street.upper()}: Action: {action} Commentary: {commentary}"
-                ))
+        for street in STREETS:
+            street_text = render_street_text(hand, street)
+            if street_text:
+                chunks.append((street, street_text))
         
         return chunks
     
@@ -91,7 +99,7 @@ class PokerEmbeddingProcessor:
     def get_embeddings(
             self,
             chunks: List[Tuple[str, str]],
-            model: str = "voyage-3-large",
+            model: str = settings.DEFAULT_EMBEDDING_MODEL,
             batch_size: int = 128,
             input_type: str = "document"  # Default to document for hand storage
         ) -> Dict[str, List[float]]:
@@ -100,7 +108,8 @@ class PokerEmbeddingProcessor:
         
         Args:
             chunks: List of tuples containing (chunk_type, chunk_text)
-            model: Model to use for embeddings (default: voyage-3-large)
+            model: Model to use for embeddings; must match the embedding
+                version the vectors are stored or searched under
             batch_size: Number of chunks to process in each batch
             input_type: Type of input for embedding ("query" or "document")
                 - "query": Optimized for short search queries
@@ -121,10 +130,13 @@ class PokerEmbeddingProcessor:
             batch_chunk_types = chunk_types[i:i + batch_size]
             
             try:
-                result = self.client.embed(
+                result = retry_call(
+                    self.client.embed,
                     texts=batch,
                     model=model,
-                    input_type=input_type
+                    input_type=input_type,
+                    breaker=self.breaker,
+                    retry_on=VOYAGE_RETRYABLE_ERRORS
                 )
                 
                 for chunk_type, embedding in zip(batch_chunk_types, result.embeddings):
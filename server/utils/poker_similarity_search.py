@@ -1,44 +1,108 @@
 import numpy as np
 from typing import List, Dict, Tuple
-from sklearn.metrics.pairwise import cosine_similarity
-import voyageai
 from data.pwds import Pwds
+from config import settings
+from utils.card_features import StructuralScorer, hand_card_profile
+from utils.hand_document import get_hand_document
+from utils.embedding_plan import STRATEGY_CHUNKERS, split_type
 
+STRATEGIES = tuple(STRATEGY_CHUNKERS)
+
+
+def cosine_similarity(a, b) -> float:
+    """Cosine similarity of two vectors (0 when either is all zeros)"""
+    a = np.asarray(a, dtype=np.float32)
+    b = np.asarray(b, dtype=np.float32)
+    norms = np.linalg.norm(a) * np.linalg.norm(b)
+    return float(a @ b / norms) if norms else 0.0
 
 def handle_query(query):
     pass
 
 class PokerSimilaritySearch:
-    def __init__(self, embedding_processor):
+    def __init__(self, embedding_processor, model: str = settings.DEFAULT_EMBEDDING_MODEL):
         self.processor = embedding_processor
+        # Stored and query vectors all come from this model
+        self.model = model
         self.hand_embeddings = {}
         self.hand_data = {}
-        self.vo = voyageai.Client(api_key=Pwds.VOYAGE_AI_API_KEY)
+        self._vo = None
+
+    @property
+    def vo(self):
+        """Voyage client for the reranker, created the first time it's needed"""
+        if self._vo is None:
+            import voyageai
+            self._vo = voyageai.Client(api_key=Pwds.VOYAGE_AI_API_KEY)
+        return self._vo
     
     def add_hand(self, hand_id: str, hand_data: Dict):
         """Process and store a new hand with all three embedding strategies"""
-        self.hand_data[hand_id] = hand_data
+        # Render the hand document once so reranking doesn't rebuild it per query
+        self.hand_data[hand_id] = {**hand_data, 'hand_document': get_hand_document(hand_data)}
         
         # Store embeddings for each strategy
         self.hand_embeddings[hand_id] = {
             'street_based': self.processor.get_embeddings(
-                self.processor.create_street_based_chunks(hand_data)
+                self.processor.create_street_based_chunks(hand_data), model=self.model
             ),
             'component_based': self.processor.get_embeddings(
-                self.processor.create_component_based_chunks(hand_data)
+                self.processor.create_component_based_chunks(hand_data), model=self.model
             ),
             'hybrid': self.processor.get_embeddings(
-                self.processor.create_hybrid_chunks(hand_data)
+                self.processor.create_hybrid_chunks(hand_data), model=self.model
             )
         }
     
+    def follow_corpus(self, load_hands):
+        """
+        Keep the store current from the corpus change feed instead of reloading.
+        The feed only carries the active embedding version, so self.model
+        should be that version's model.
+        load_hands(ids) returns {hand_id: hand_data} for hands to (re)load.
+        """
+        from utils.corpus_feed import subscribe
+        subscribe(lambda change: self.apply_corpus_change(change, load_hands))
+
+    def apply_corpus_change(self, change: Dict, load_hands):
+        """Apply one batch from utils.corpus_feed: only the changed vectors and hands"""
+        if change.get('version_switched'):
+            # Vectors from the old model can't be compared with queries from
+            # the new one; the store has to be rebuilt from the new version
+            from utils.embedding_versions import active_version
+            self.model = active_version()['model']
+            self.hand_embeddings.clear()
+            return
+        for hand_id in change['deleted_hands']:
+            self.hand_data.pop(hand_id, None)
+            self.hand_embeddings.pop(hand_id, None)
+        for row in change['deleted_embeddings']:
+            parts = split_type(row['type'] or '')
+            if parts and row['hand_id'] in self.hand_embeddings:
+                self.hand_embeddings[row['hand_id']][parts[0]].pop(parts[1], None)
+
+        new_hands = {row['hand_id'] for row in change['embeddings']} - set(self.hand_data)
+        to_load = new_hands | {hand_id for hand_id in change['hands'] if hand_id in self.hand_data}
+        for hand_id, hand_data in load_hands(sorted(to_load)).items():
+            self.hand_data[hand_id] = {**hand_data, 'hand_document': get_hand_document(hand_data)}
+
+        for row in change['embeddings']:
+            parts = split_type(row['type'] or '')
+            if parts is None or row['hand_id'] not in self.hand_data:
+                continue
+            strategies = self.hand_embeddings.setdefault(
+                row['hand_id'], {strategy: {} for strategy in STRATEGIES}
+            )
+            strategies[parts[0]][parts[1]] = row['vector']
+
     def find_similar_hands(
         self,
         query_hand: Dict,
         strategy: str = 'hybrid',
         n_results: int = 5,
         weights: Dict[str, float] = None,
-        use_reranker: bool = True
+        use_reranker: bool = True,
+        structural_weight: float = settings.STRUCTURAL_RERANK_WEIGHT
     ) -> List[Tuple[str, float]]:
         """
         Find similar hands using specified strategy and optional weights
@@ -49,6 +113,8 @@ class PokerSimilaritySearch:
             n_results: Number of results to return
             weights: Optional weights for different chunk types
             use_reranker: Whether to use Voyage's reranker for final ranking
+            structural_weight: Share of card-structure similarity blended into
+                the embedding similarity before candidates are picked
         """
         
         # Get query embeddings using specified strategy
@@ -59,7 +125,7 @@ class PokerSimilaritySearch:
         else:  # hybrid
             query_chunks = self.processor.create_hybrid_chunks(query_hand)
             
-        query_embeddings = self.processor.get_embeddings(query_chunks)
+        query_embeddings = self.processor.get_embeddings(query_chunks, model=self.model)
         
         # Calculate similarities
         similarities = {}
@@ -71,10 +137,13 @@ class PokerSimilaritySearch:
             for chunk_type in query_embeddings:
                 if chunk_type in strategy_embeddings:
                     sim = cosine_similarity(
-                        [query_embeddings[chunk_type]],
-                        [strategy_embeddings[chunk_type]]
-                    )[0][0]
+                        query_embeddings[chunk_type],
+                        strategy_embeddings[chunk_type]
+                    )
                     chunk_similarities[chunk_type] = sim
+            if not chunk_similarities:
+                # Vectors still arriving from the corpus feed
+                continue
             
             # Weighted average of similarities
             if weights is None:
@@ -93,6 +162,18 @@ class PokerSimilaritySearch:
             
             similarities[hand_id] = weighted_sim
         
+        # Blend in card-structure similarity, scored for every hand at once
+        if structural_weight > 0 and similarities:
+            hand_ids = list(similarities)
+            scorer = StructuralScorer([
+                self.hand_data[hand_id]['hand_document']['cards'] for hand_id in hand_ids
+            ])
+            structural = scorer.score(hand_card_profile(query_hand))
+            for hand_id, score in zip(hand_ids, structural):
+                similarities[hand_id] = (
+                    (1 - structural_weight) * similarities[hand_id] + structural_weight * float(score)
+                )
+        
         # Get top candidates using embedding similarity
         top_candidates = sorted(
             similarities.items(),
@@ -129,17 +210,4 @@ class PokerSimilaritySearch:
     
     def _hand_to_text(self, hand: Dict) -> str:
         """Convert hand data to text format for reranking"""
-        text_parts = [
-            f"Game: {hand['game_location']}, Stakes: {hand['stakes']}, "
-            f"Hero Cards: {hand['caller_cards']}"
-        ]
-        
-        for street in ['preflop', 'flop', 'turn', 'river']:
-            action = hand.get(f'{street}_action', '')
-            commentary = hand.get(f'{street}_commentary', '')
-            if action or commentary:
-                text_parts.append(
-                    f"{street.upper()}: Action: {action} Commentary: {commentary}"
-                )
-        
-        return " ".join(text_parts)
\ No newline at end of file
+        return get_hand_document(hand)['rerank_text']
@@ -0,0 +1,228 @@
+# server\utils\preflop_grid.py
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from psycopg2.extras import Json
+
+from config import settings
+from utils.context_packer import detect_query_street
+from utils.hand_query_parser import POSITIONS, RANKS as PARSER_RANKS, SUITS as PARSER_SUITS, TOKEN_PATTERN
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+RANKS = 'AKQJT98765432'
+
+RANK_NAMES = {
+    'A': 'Ace', 'K': 'King', 'Q': 'Queen', 'J': 'Jack', 'T': 'Ten',
+    '9': 'Nine', '8': 'Eight', '7': 'Seven', '6': 'Six',
+    '5': 'Five', '4': 'Four', '3': 'Three', '2': 'Two',
+}
+RANK_BY_NAME = {name: rank for rank, name in RANK_NAMES.items()}
+
+# Position as HandQueryParser reports it -> how the canonical query spells it
+# so that it parses back to the same position
+GRID_POSITIONS = {
+    'UTG': 'utg',
+    '+1': '+1',
+    '+2': '+2',
+    'LowJack': 'lowjack',
+    'HJ': 'hijack',
+    'cutoff': 'cutoff',
+    'button': 'button',
+    'small blind': 'sb',
+    'big blind': 'bb',
+}
+
+GRID_STAKES = ['1/2', '1/3', '2/5', '5/10']
+
+# Cells are precomputed for the default /api/analyze result count only
+GRID_NUM_RESULTS = 5
+
+# Words a query may use to spell out its hero cards, besides the card names
+CARD_WORDS = frozenset(
+    [word.lower() for word in list(PARSER_RANKS) + list(PARSER_RANKS.values())]
+    + [word.lower() for word in list(PARSER_SUITS) + list(PARSER_SUITS.values())]
+    + ['of', 'and', 'black', 'red', 'aces', 'kings', 'queens', 'jacks']
+)
+# Filler that doesn't change the spot. Anything else the query says (villain
+# action, stack depth, reads) isn't in the canned answer, so it goes live:
+# "Ace of Spades and King of Spades on the button at 2/5" is a grid hit,
+# "... at 2/5, villain raises" is not.
+GRID_FILLER_WORDS = frozenset([
+    'i', 'im', 'm', 'me', 'my', 'we', 'hero', 'you', 'have', 'has', 'had', 'hold', 'holding', 'with',
+    'dealt', 'get', 'got', 'on', 'in', 'at', 'from', 'the', 'a', 'an', 'first',
+    'how', 'what', 'should', 'do', 'to', 'play', 'playing', 'it', 'this', 'hand',
+    'preflop', 'pre', 'nl', 'nlh', 'live', 'stakes', 'position',
+])
+
+GridCell = Tuple[str, str, str]
+
+
+def hand_classes() -> List[str]:
+    """The 169 starting hand classes: pairs, suited and offsuit combinations"""
+    classes = []
+    for i, high in enumerate(RANKS):
+        for j, low in enumerate(RANKS):
+            if i == j:
+                classes.append(high + low)
+            elif i < j:
+                classes.append(f"{high}{low}s")
+                classes.append(f"{high}{low}o")
+    return classes
+
+
+def grid_cells(positions: Optional[List[str]] = None, stakes: Optional[List[str]] = None) -> List[GridCell]:
+    return [
+        (hand_class, position, stake)
+        for hand_class in hand_classes()
+        for position in (positions or list(GRID_POSITIONS))
+        for stake in (stakes or GRID_STAKES)
+    ]
+
+
+def hand_class(hero_cards: str) -> Optional[str]:
+    """'Ace of Spades and King of Hearts' -> 'AKo'; None if it isn't two known cards"""
+    cards = []
+    for card in hero_cards.split(' and '):
+        parts = card.split(' of ')
+        if len(parts) != 2 or parts[0] not in RANK_BY_NAME:
+            return None
+        cards.append((RANK_BY_NAME[parts[0]], parts[1]))
+    if len(cards) != 2:
+        return None
+    (rank1, suit1), (rank2, suit2) = sorted(cards, key=lambda card: RANKS.index(card[0]))
+    if rank1 == rank2:
+        return rank1 + rank2
+    return f"{rank1}{rank2}{'s' if suit1 == suit2 else 'o'}"
+
+
+def normalize_stakes(stakes: str) -> str:
+    return stakes.replace('$', '').replace(' ', '').strip('/')
+
+
+def grid_query(cell: GridCell) -> str:
+    """Canonical query text for a cell; HandQueryParser parses it back to the cell"""
+    hand, position, stakes = cell
+    if len(hand) == 2:
+        suits = ('Spades', 'Hearts')
+    else:
+        suits = ('Spades', 'Spades') if hand[2] == 's' else ('Spades', 'Hearts')
+    cards = f"{RANK_NAMES[hand[0]]} of {suits[0]} and {RANK_NAMES[hand[1]]} of {suits[1]}"
+    return f"{cards} preflop from {GRID_POSITIONS[position]} at {stakes}"
+
+
+def _only_cell_words(query: str, cell: GridCell) -> bool:
+    """True when every word of the query spells the cell's cards, position or stakes, or is filler"""
+    hand, position, stakes = cell
+    allowed = set(CARD_WORDS) | GRID_FILLER_WORDS
+    allowed.update(TOKEN_PATTERN.findall(grid_query(cell).lower()))
+    for keyword, value in POSITIONS:
+        if value == position:
+            allowed.update(keyword.split())
+    words = TOKEN_PATTERN.findall(query.lower().replace('pre-flop', 'preflop'))
+    return all(word in allowed for word in words)
+
+
+def grid_cell(query: str, parsed_query: Dict) -> Optional[GridCell]:
+    """
+    The cell a query exactly matches: a preflop spot described by hero cards,
+    position and stakes, with no other words beyond a little filler
+    """
+    if set(parsed_query) - {'hero_cards', 'position', 'game_info'}:
+        return None
+    game_info = parsed_query.get('game_info', {})
+    if set(game_info) - {'stakes'} or 'stakes' not in game_info:
+        return None
+    if parsed_query.get('position') not in GRID_POSITIONS or not parsed_query.get('hero_cards'):
+        return None
+    if detect_query_street(query) != 'preflop':
+        return None
+    hand = hand_class(parsed_query['hero_cards'])
+    stakes = normalize_stakes(game_info['stakes'])
+    if hand is None or stakes not in GRID_STAKES:
+        return None
+    cell = (hand, parsed_query['position'], stakes)
+    return cell if _only_cell_words(query, cell) else None
+
+
+def corpus_version(cur) -> str:
+    """
+    Changes whenever searched embeddings (SEARCH_EMBEDDING_TYPE) are written,
+    or another embedding version is activated. Reads the corpus_generations
+    row the hand_embeddings trigger bumps, so it's cheap on the query path.
+    """
+    cur.execute("""
+        SELECT v.id, coalesce(g.generation, 0)
+        FROM embedding_versions v
+        LEFT JOIN corpus_generations g
+            ON g.embedding_version = v.id AND g.embedding_type = %s
+        WHERE v.state = 'active'
+    """, (settings.SEARCH_EMBEDDING_TYPE,))
+    row = cur.fetchone()
+    if row is None:
+        return "none"
+    embedding_version, generation = row
+    return f"v{embedding_version}-g{generation}"
+
+
+def load_grid_analysis(conn, cell: GridCell, num_results: int) -> Optional[Dict[str, Any]]:
+    """
+    Stored response payload for a cell, or None. A payload computed against
+    another corpus version (hands or embeddings changed since the last
+    build_preflop_grid run) is a miss.
+    """
+    if num_results != GRID_NUM_RESULTS:
+        return None
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT payload, corpus_version
+            FROM preflop_grid_analyses
+            WHERE hand_class = %s AND position = %s AND stakes = %s
+        """, cell)
+        row = cur.fetchone()
+        if row is None:
+            return None
+        payload, version = row
+        if version != corpus_version(cur):
+            logger.debug(f"Stale preflop grid cell {cell}: computed for {version}")
+            return None
+    return payload
+
+
+def stored_hand_ids(conn) -> Dict[GridCell, List[int]]:
+    """Retrieved hand ids behind every stored cell, for incremental refreshes"""
+    with conn.cursor() as cur:
+        cur.execute("SELECT hand_class, position, stakes, hand_ids FROM preflop_grid_analyses")
+        return {(row[0], row[1], row[2]): row[3] for row in cur.fetchall()}
+
+
+def store_grid_analysis(conn, cell: GridCell, query: str, hand_ids: List[int], payload: Dict[str, Any], version: str):
+    with conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO preflop_grid_analyses
+                (hand_class, position, stakes, query, hand_ids, payload, corpus_version)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+            ON CONFLICT (hand_class, position, stakes) DO UPDATE SET
+                query = EXCLUDED.query,
+                hand_ids = EXCLUDED.hand_ids,
+                payload = EXCLUDED.payload,
+                corpus_version = EXCLUDED.corpus_version,
+                computed_at = CURRENT_TIMESTAMP
+        """, (*cell, query, hand_ids, Json(payload), version))
+    conn.commit()
+
+
+def mark_current(conn, cells: List[GridCell], version: str):
+    """Cells whose retrieval didn't change are still valid for the new corpus"""
+    if not cells:
+        return
+    with conn.cursor() as cur:
+        cur.execute("""
+            UPDATE preflop_grid_analyses g
+            SET corpus_version = %s
+            FROM unnest(%s::text[], %s::text[], %s::text[]) AS c(hand_class, position, stakes)
+            WHERE g.hand_class = c.hand_class AND g.position = c.position AND g.stakes = c.stakes
+        """, (version, [c[0] for c in cells], [c[1] for c in cells], [c[2] for c in cells]))
+    conn.commit()
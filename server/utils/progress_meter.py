@@ -0,0 +1,55 @@
+# server\utils\progress_meter.py
+import time
+import logging
+from typing import Optional
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class ProgressMeter:
+    """Counts finished items and logs throughput and ETA every `log_every` items"""
+
+    def __init__(self, label: str, total: Optional[int] = None, log_every: int = 5):
+        self.label = label
+        self.total = total
+        self.log_every = log_every
+        self.succeeded = 0
+        self.failed = 0
+        self.start = time.monotonic()
+
+    @property
+    def processed(self) -> int:
+        return self.succeeded + self.failed
+
+    def rate_per_minute(self) -> float:
+        elapsed = time.monotonic() - self.start
+        return self.processed / elapsed * 60 if elapsed > 0 else 0.0
+
+    def record(self, success: bool = True):
+        if success:
+            self.succeeded += 1
+        else:
+            self.failed += 1
+        if self.processed % self.log_every == 0:
+            self.log()
+
+    def log(self):
+        message = (
+            f"{self.label}: {self.processed} processed "
+            f"({self.succeeded} ok, {self.failed} failed), "
+            f"{self.rate_per_minute():.1f}/min"
+        )
+        rate = self.rate_per_minute()
+        if self.total and rate > 0:
+            remaining = max(0, self.total - self.processed)
+            message += f", {remaining} left, ETA {remaining / rate:.1f} min"
+        logger.info(message)
+
+    def summary(self):
+        elapsed = time.monotonic() - self.start
+        logger.info(
+            f"{self.label} finished: {self.succeeded} ok, {self.failed} failed "
+            f"in {elapsed / 60:.1f} min ({self.rate_per_minute():.1f}/min)"
+        )
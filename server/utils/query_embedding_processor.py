@@ -1,18 +1,30 @@
 from typing import Dict, List, Tuple, Optional
 import logging
 import voyageai
+from config import settings
 from utils.hand_query_parser import HandQueryParser
+from utils.poker_embedding_processor import VOYAGE_RETRYABLE_ERRORS
+from utils.resilience import (
+    CircuitOpenError, Deadline, DeadlineExceeded, LatencyTracker, ResponseCache,
+    get_breaker, hedged_call, retry_call
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Shared across instances so hedging and fallbacks see every embed call in the worker
+_embed_latency = LatencyTracker()
+_embedding_cache = ResponseCache()
+
 class QueryEmbeddingProcessor:
     def __init__(self, api_key: str):
         """Initialize the query embedding processor"""
         self.api_key = api_key
-        self.client = voyageai.Client(api_key=self.api_key)
+        # Bound each HTTP call so a hedged loser doesn't hold a thread forever
+        self.client = voyageai.Client(api_key=self.api_key, timeout=settings.EMBED_STAGE_SECONDS)
         self.parser = HandQueryParser()
+        self.breaker = get_breaker('voyage')
 
     def _create_situation_chunk(self, parsed_query: Dict) -> str:
         """Create the situation chunk from parsed query"""
@@ -105,66 +117,147 @@ class QueryEmbeddingProcessor:
         Create chunks for the query that match the transcript embedding structure
         """
         try:
-            # Parse the query
-            parsed_query = self.parser.parse_query(query)
-            
-            chunks = []
-            
-            # Add situation chunk
-            situation = self._create_situation_chunk(parsed_query)
-            chunks.append(('situation', situation))
-            
-            # Add action sequence chunk
-            action_sequence = self._create_action_sequence_chunk(parsed_query)
-            chunks.append(('action_sequence', action_sequence))
-            
-            # Add decision point chunks
-            chunks.extend(self._create_decision_chunks(parsed_query))
-            
-            return chunks
-            
+            return self.chunks_from_parsed(self.parser.parse_query(query))
         except Exception as e:
             logger.error(f"Error creating query chunks: {str(e)}")
             raise
 
+    def chunks_from_parsed(self, parsed_query: Dict) -> List[Tuple[str, str]]:
+        """Query chunks for an already parsed query"""
+        chunks = []
+        
+        # Add situation chunk
+        situation = self._create_situation_chunk(parsed_query)
+        chunks.append(('situation', situation))
+        
+        # Add action sequence chunk
+        action_sequence = self._create_action_sequence_chunk(parsed_query)
+        chunks.append(('action_sequence', action_sequence))
+        
+        # Add decision point chunks
+        chunks.extend(self._create_decision_chunks(parsed_query))
+        
+        return chunks
+
+    def _embed_texts(self, texts: List[str], model: str, deadline: Optional[Deadline] = None):
+        """
+        Embed texts with hedging on slow responses and jittered retries on
+        transient failures, all within the stage deadline
+        """
+        def hedged_embed():
+            return hedged_call(
+                self.client.embed,
+                texts=texts,
+                model=model,
+                input_type="query",  # Always use query type for search queries
+                tracker=_embed_latency,
+                deadline=deadline
+            )
+
+        return retry_call(
+            hedged_embed,
+            deadline=deadline,
+            breaker=self.breaker,
+            retry_on=VOYAGE_RETRYABLE_ERRORS + (DeadlineExceeded,)
+        )
+
     def get_query_embeddings(
             self,
             query: str,
-            model: str = "voyage-3-large"
+            model: str = settings.DEFAULT_EMBEDDING_MODEL,
+            deadline: Optional[Deadline] = None,
+            chunk_types: Optional[List[str]] = None
         ) -> Optional[Dict[str, List[float]]]:
         """
-        Generate embeddings for the query matching transcript embedding structure
+        Generate embeddings for the query matching transcript embedding structure.
+        chunk_types limits which chunks are embedded, e.g. ['situation'].
         """
+        cache_key = (model, query, tuple(chunk_types) if chunk_types else None)
         try:
             # Create chunks
-            chunks = self.create_query_chunks(query)
+            chunks = [
+                (chunk_type, text) for chunk_type, text in self.create_query_chunks(query)
+                if chunk_types is None or chunk_type in chunk_types
+            ]
             
             # Generate embeddings
             texts = [text for _, text in chunks]
             chunk_types = [chunk_type for chunk_type, _ in chunks]
             
             embeddings = {}
-            result = self.client.embed(
-                texts=texts,
-                model=model,
-                input_type="query"  # Always use query type for search queries
-            )
+            result = self._embed_texts(texts, model, deadline)
             
             for chunk_type, embedding in zip(chunk_types, result.embeddings):
                 embeddings[chunk_type] = embedding
                 
+            _embedding_cache.put(cache_key, embeddings)
             return embeddings
             
+        except (CircuitOpenError, DeadlineExceeded) + VOYAGE_RETRYABLE_ERRORS as e:
+            cached = _embedding_cache.get(cache_key)
+            if cached is not None:
+                logger.warning(f"Voyage unavailable ({e}), serving cached query embeddings")
+                return cached
+            logger.error(f"Error generating query embeddings: {str(e)}")
+            return None
         except Exception as e:
             logger.error(f"Error generating query embeddings: {str(e)}")
             return None
 
-    def embed_query(self, query: str) -> Optional[Dict[str, List[float]]]:
+    def embed_queries(
+            self,
+            queries: List[str],
+            chunk_types: Optional[List[str]] = None,
+            model: str = settings.DEFAULT_EMBEDDING_MODEL,
+            deadline: Optional[Deadline] = None
+        ) -> List[Optional[Dict[str, List[float]]]]:
+        """
+        Embed many queries with as few Voyage requests as possible (one, unless
+        the texts exceed the per-request limit).
+        chunk_types limits which chunks are embedded, e.g. ['situation'].
+        Returns one embeddings dict per query, None where chunking failed.
+        """
+        texts = []
+        owners = []
+        for index, parsed_query in enumerate(self.parser.parse_many(queries)):
+            try:
+                chunks = self.chunks_from_parsed(parsed_query)
+            except Exception as e:
+                logger.error(f"Error creating query chunks: {str(e)}")
+                continue
+            for chunk_type, text in chunks:
+                if chunk_types is None or chunk_type in chunk_types:
+                    texts.append(text)
+                    owners.append((index, chunk_type))
+
+        results: List[Optional[Dict[str, List[float]]]] = [None] * len(queries)
+        try:
+            for start in range(0, len(texts), settings.VOYAGE_MAX_BATCH_TEXTS):
+                batch = texts[start:start + settings.VOYAGE_MAX_BATCH_TEXTS]
+                result = self._embed_texts(batch, model, deadline)
+                for (index, chunk_type), embedding in zip(owners[start:start + len(batch)], result.embeddings):
+                    if results[index] is None:
+                        results[index] = {}
+                    results[index][chunk_type] = embedding
+        except Exception as e:
+            logger.error(f"Error generating batch query embeddings: {str(e)}")
+            return [None] * len(queries)
+
+        return results
+
+    def embed_query(
+            self,
+            query: str,
+            deadline: Optional[Deadline] = None,
+            chunk_types: Optional[List[str]] = None,
+            model: str = settings.DEFAULT_EMBEDDING_MODEL
+        ) -> Optional[Dict[str, List[float]]]:
         """
-        Main method to generate embeddings for a query
+        Main method to generate embeddings for a query.
+        model must be the model of the embedding version being searched.
         """
         try:
-            return self.get_query_embeddings(query)
+            return self.get_query_embeddings(query, model=model, deadline=deadline, chunk_types=chunk_types)
         except Exception as e:
             logger.error(f"Failed to embed query: {str(e)}")
             return None
\ No newline at end of file
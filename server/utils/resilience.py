@@ -0,0 +1,278 @@
+# server\utils\resilience.py
+import time
+import random
+import logging
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, Dict, Optional, Tuple, Type
+
+from config import settings
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised when a call is rejected because the provider's breaker is open"""
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a stage runs out of its share of the request budget"""
+
+
+class ProviderUnavailable(RuntimeError):
+    """Raised when a provider call still fails with a transient error after every retry"""
+
+
+class Deadline:
+    """Absolute point in time by which a request (or one stage of it) must finish"""
+
+    def __init__(self, seconds: Optional[float]):
+        self.expires_at = None if seconds is None else time.monotonic() + seconds
+
+    def remaining(self) -> Optional[float]:
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+    def stage(self, max_seconds: float) -> 'Deadline':
+        """Deadline for one stage: its own cap, but never past the parent budget"""
+        remaining = self.remaining()
+        return Deadline(max_seconds if remaining is None else min(max_seconds, remaining))
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+    closed -> open after `failure_threshold` failures; open -> half_open after
+    `reset_timeout`, where a single probe call decides whether to close again.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = None, reset_timeout: float = None):
+        self.name = name
+        self.failure_threshold = failure_threshold or settings.BREAKER_FAILURE_THRESHOLD
+        self.reset_timeout = reset_timeout or settings.BREAKER_RESET_SECONDS
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = 'half_open'
+                self._probe_in_flight = False
+            if self.state == 'half_open' and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != 'closed':
+                logger.info(f"Circuit '{self.name}' closed")
+            self.state = 'closed'
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def release(self):
+        """
+        End a call that says nothing about the provider's health (e.g. a bad
+        request, or a deadline spent before the first attempt) without
+        recording an outcome, so a half-open breaker can admit another probe
+        """
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                if self.state != 'open':
+                    logger.warning(f"Circuit '{self.name}' opened after {self.failures} failures")
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """Process-wide breaker per provider, shared by every client instance"""
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name)
+        return _breakers[name]
+
+
+class LatencyTracker:
+    """Rolling window of call latencies used to pick the hedging delay"""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.samples = deque(maxlen=window)
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self.samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        with self._lock:
+            if len(self.samples) < self.min_samples:
+                return None
+            ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+        return ordered[index]
+
+
+class ResponseCache:
+    """Small thread-safe LRU of last-known-good responses for degraded serving"""
+
+    def __init__(self, max_size: int = None):
+        self.max_size = max_size or settings.FALLBACK_CACHE_SIZE
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._items:
+                return None
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+
+def backoff_delay(attempt: int, base_delay: float, max_delay: float) -> float:
+    """Full-jitter exponential backoff"""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+def retry_call(
+        func: Callable,
+        *args,
+        attempts: int = None,
+        base_delay: float = None,
+        max_delay: float = None,
+        deadline: Optional[Deadline] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        retry_on: Tuple[Type[BaseException], ...] = (Exception,),
+        **kwargs
+    ) -> Any:
+    """
+    Call func with jittered exponential retries.
+
+    Fails fast with CircuitOpenError while the breaker is open, and with
+    DeadlineExceeded once the next backoff would run past the deadline.
+    The breaker sees one outcome per call, not per attempt, so a single
+    request retrying through a blip can't open it on its own.
+    """
+    attempts = attempts or settings.RETRY_ATTEMPTS
+    base_delay = settings.RETRY_BASE_DELAY if base_delay is None else base_delay
+    max_delay = settings.RETRY_MAX_DELAY if max_delay is None else max_delay
+    deadline = deadline or Deadline(None)
+
+    if breaker is not None and not breaker.allow():
+        raise CircuitOpenError(f"Circuit '{breaker.name}' is open")
+
+    last_error = None
+    try:
+        for attempt in range(attempts):
+            if deadline.expired():
+                raise DeadlineExceeded(f"Deadline exceeded before attempt {attempt + 1}")
+            try:
+                result = func(*args, **kwargs)
+            except retry_on as e:
+                last_error = e
+                if attempt == attempts - 1:
+                    break
+                delay = backoff_delay(attempt, base_delay, max_delay)
+                remaining = deadline.remaining()
+                if remaining is not None and delay >= remaining:
+                    raise DeadlineExceeded(f"Deadline exceeded after attempt {attempt + 1}: {e}") from e
+                logger.warning(f"Attempt {attempt + 1}/{attempts} failed: {e}. Retrying in {delay:.2f}s")
+                time.sleep(delay)
+            else:
+                if breaker is not None:
+                    breaker.record_success()
+                return result
+        raise last_error
+    except BaseException:
+        if breaker is not None:
+            if last_error is not None:
+                breaker.record_failure()
+            else:
+                breaker.release()
+        raise
+
+
+_hedge_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='hedge')
+
+
+def hedged_call(
+        func: Callable,
+        *args,
+        tracker: LatencyTracker,
+        deadline: Optional[Deadline] = None,
+        max_hedges: int = 1,
+        **kwargs
+    ) -> Any:
+    """
+    Run func and, if it hasn't returned by the tracked p95 latency, fire a
+    duplicate request. The first successful response wins; losers are left to
+    finish in the background.
+    """
+    deadline = deadline or Deadline(None)
+    hedge_delay = tracker.percentile(95) or settings.HEDGE_DEFAULT_DELAY
+    hedge_delay = max(settings.HEDGE_MIN_DELAY, hedge_delay)
+
+    def timed():
+        start = time.monotonic()
+        result = func(*args, **kwargs)
+        tracker.record(time.monotonic() - start)
+        return result
+
+    pending = {_hedge_executor.submit(timed)}
+    hedges_left = max_hedges
+    last_error = None
+
+    while pending:
+        remaining = deadline.remaining()
+        if remaining is not None and remaining <= 0:
+            break
+        timeout = hedge_delay if hedges_left else None
+        if remaining is not None:
+            timeout = remaining if timeout is None else min(timeout, remaining)
+
+        done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                return future.result()
+            except Exception as e:
+                last_error = e
+
+        # Either the timer fired or a request failed: hedge if we still can
+        if hedges_left and (not done or not pending):
+            hedges_left -= 1
+            pending.add(_hedge_executor.submit(timed))
+            logger.debug(f"Hedging request after {hedge_delay:.2f}s")
+
+    if last_error is not None and not pending:
+        raise last_error
+    raise DeadlineExceeded("Hedged call did not complete before the deadline")
@@ -0,0 +1,185 @@
+# server\utils\semantic_cache.py
+import time
+import random
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config import settings
+from utils.corpus_feed import corpus_version
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Log the running hit rate every this many lookups
+HIT_RATE_LOG_EVERY = 100
+
+
+def query_signature(parsed_query: Dict, num_results: int, embedding_version: Optional[int] = None) -> Optional[Tuple]:
+    """
+    Structured fields two queries must share before their vectors are compared.
+    The embedding version is part of it: vectors from different models aren't comparable.
+    None means the query isn't cacheable: without parsed hero cards the
+    situation embedding says too little about the hand.
+    """
+    if not parsed_query.get('hero_cards'):
+        return None
+    return (
+        parsed_query.get('hero_cards'),
+        parsed_query.get('position'),
+        parsed_query.get('game_info', {}).get('stakes'),
+        parsed_query.get('action_history', {}).get('preflop_action'),
+        num_results,
+        embedding_version,
+    )
+
+
+class SemanticCache:
+    """
+    Approximate result cache for /api/analyze, keyed on the query's situation
+    embedding. A lookup hits when an earlier query with the same signature
+    is within the cosine threshold. Entries are evicted least recently used,
+    expire after the TTL, and are dropped as soon as the corpus feed reports
+    new or changed hands.
+    """
+
+    def __init__(
+            self,
+            max_size: int = settings.SEMANTIC_CACHE_SIZE,
+            threshold: float = settings.SEMANTIC_CACHE_THRESHOLD,
+            ttl_seconds: float = settings.SEMANTIC_CACHE_TTL_SECONDS,
+            audit_rate: float = settings.SEMANTIC_CACHE_AUDIT_RATE
+        ):
+        self.max_size = max_size
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.audit_rate = audit_rate
+        self._lock = threading.Lock()
+        # Unit vectors, one row per slot; allocated on the first put
+        self._vectors: Optional[np.ndarray] = None
+        self._valid = np.zeros(max_size, dtype=bool)
+        self._expires = np.zeros(max_size)
+        self._entries: List[Optional[Dict[str, Any]]] = [None] * max_size
+        # slot -> None, least recently used first
+        self._lru: 'OrderedDict[int, None]' = OrderedDict()
+        self.stats = {'lookups': 0, 'hits': 0, 'audits': 0, 'false_hits': 0, 'evictions': 0}
+
+    @staticmethod
+    def _unit(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, query: str, vector, signature: Optional[Tuple]) -> Optional[Dict[str, Any]]:
+        """
+        Closest cached entry for the vector, or None.
+        Returns: {'slot', 'payload', 'query', 'similarity'}
+        """
+        if signature is None:
+            return None
+        with self._lock:
+            self.stats['lookups'] += 1
+            hit = None
+            if self._vectors is not None and self._valid.any():
+                now = time.time()
+                version = corpus_version()
+                expired = self._valid & (self._expires <= now)
+                for slot in np.flatnonzero(self._valid):
+                    if expired[slot] or self._entries[slot]['corpus_version'] != version:
+                        self._drop(int(slot))
+
+                candidates = [
+                    slot for slot in np.flatnonzero(self._valid)
+                    if self._entries[slot]['signature'] == signature
+                ]
+                if candidates:
+                    similarities = self._vectors[candidates] @ self._unit(vector)
+                    best = int(np.argmax(similarities))
+                    if similarities[best] >= self.threshold:
+                        slot = int(candidates[best])
+                        self._lru.move_to_end(slot)
+                        entry = self._entries[slot]
+                        entry['hits'] += 1
+                        self.stats['hits'] += 1
+                        hit = {
+                            'slot': slot,
+                            'payload': entry['payload'],
+                            'query': entry['query'],
+                            'similarity': float(similarities[best]),
+                        }
+            self._log_hit_rate()
+
+        if hit is not None:
+            # Audit trail for judging false hits after the fact
+            logger.info(
+                f"Semantic cache hit (similarity {hit['similarity']:.4f}): "
+                f"{query!r} served from {hit['query']!r}"
+            )
+        return hit
+
+    def put(self, query: str, vector, signature: Optional[Tuple], payload: Dict[str, Any], version: Optional[int] = None):
+        """version: corpus version the payload was retrieved from (default: current)"""
+        if signature is None:
+            return
+        unit = self._unit(vector)
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_size, unit.shape[0]), dtype=np.float32)
+            if len(self._lru) >= self.max_size:
+                slot, _ = self._lru.popitem(last=False)
+                self._valid[slot] = False
+                self._entries[slot] = None
+                self.stats['evictions'] += 1
+            else:
+                slot = int(np.flatnonzero(~self._valid)[0])
+            self._vectors[slot] = unit
+            self._valid[slot] = True
+            self._expires[slot] = time.time() + self.ttl_seconds
+            self._entries[slot] = {
+                'query': query,
+                'signature': signature,
+                'payload': payload,
+                'corpus_version': corpus_version() if version is None else version,
+                'hits': 0,
+            }
+            self._lru[slot] = None
+
+    def should_audit(self) -> bool:
+        """Sample hits for shadow verification against a fresh retrieval"""
+        return random.random() < self.audit_rate
+
+    def record_audit(self, hit: Dict[str, Any], query: str, matched: bool):
+        """Log the audit outcome; a false hit evicts the entry that produced it"""
+        with self._lock:
+            self.stats['audits'] += 1
+            if not matched:
+                self.stats['false_hits'] += 1
+                entry = self._entries[hit['slot']]
+                if entry is not None and entry['query'] == hit['query']:
+                    self._drop(hit['slot'])
+            audits, false_hits = self.stats['audits'], self.stats['false_hits']
+        if not matched:
+            logger.warning(
+                f"Semantic cache false hit (similarity {hit['similarity']:.4f}): "
+                f"{query!r} retrieved different hands than {hit['query']!r} "
+                f"({false_hits}/{audits} audited hits false)"
+            )
+
+    def _drop(self, slot: int):
+        self._valid[slot] = False
+        self._entries[slot] = None
+        self._lru.pop(slot, None)
+
+    def _log_hit_rate(self):
+        lookups = self.stats['lookups']
+        if lookups % HIT_RATE_LOG_EVERY == 0:
+            logger.info(
+                f"Semantic cache: {self.stats['hits']}/{lookups} hits "
+                f"({self.stats['hits'] / lookups:.1%}), {len(self._lru)} entries, "
+                f"{self.stats['evictions']} evictions, "
+                f"{self.stats['false_hits']}/{self.stats['audits']} audited hits false"
+            )
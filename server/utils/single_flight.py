@@ -0,0 +1,175 @@
+# server\utils\single_flight.py
+import os
+import re
+import time
+import random
+import socket
+import hashlib
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict
+
+from psycopg2.extras import Json
+
+from config import settings
+from config.db import get_db_connection
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_query(query: str) -> str:
+    """Case, whitespace and trailing punctuation don't change the answer"""
+    return _WHITESPACE.sub(' ', query.lower()).strip().rstrip('?.!').strip()
+
+
+def flight_key(*parts) -> str:
+    return hashlib.sha256('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key so only one runs.
+
+    Within a worker, followers wait on the leader's Future; an uncontended
+    call touches nothing but that. With SINGLE_FLIGHT_SHARED, coalescing also
+    spans workers (gunicorn processes): the analysis_flights table elects one
+    leader per key and followers poll it for the leader's result. If the
+    flight table is unavailable each worker just computes for itself.
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def worker_id(self) -> str:
+        # Read per call: gunicorn may fork workers after this object is built
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def do(self, key: str, fn: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        with self._lock:
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._in_flight[key] = future
+
+        if not leader:
+            logger.debug(f"Joining in-process flight {key[:12]}")
+            return future.result()
+
+        try:
+            result = self._do_shared(key, fn) if settings.SINGLE_FLIGHT_SHARED else fn()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def _do_shared(self, key: str, fn: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        """Cross-worker coalescing through the analysis_flights table"""
+        try:
+            is_leader = self._try_lead(key)
+        except Exception as e:
+            logger.warning(f"Flight table unavailable, computing locally: {str(e)}")
+            return fn()
+
+        if not is_leader:
+            result = self._wait_for_leader(key)
+            if result is not None:
+                logger.info(f"Served flight {key[:12]} from another worker's result")
+                return result
+            # Leader failed or ran out of time; fall through and compute ourselves
+
+        try:
+            result = fn()
+        except Exception:
+            self._finish(key, 'failed', None)
+            raise
+        self._finish(key, 'done', result)
+        return result
+
+    def _try_lead(self, key: str) -> bool:
+        """
+        Become the leader unless another worker is running this key, or
+        finished it moments ago (in which case its result is served)
+        """
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    INSERT INTO analysis_flights (flight_key, state, leader, started_at)
+                    VALUES (%s, 'running', %s, CURRENT_TIMESTAMP)
+                    ON CONFLICT (flight_key) DO UPDATE SET
+                        state = 'running',
+                        leader = EXCLUDED.leader,
+                        result = NULL,
+                        started_at = CURRENT_TIMESTAMP,
+                        finished_at = NULL
+                    WHERE (analysis_flights.state = 'running'
+                           AND analysis_flights.started_at < CURRENT_TIMESTAMP - make_interval(secs => %s))
+                       OR (analysis_flights.state = 'failed')
+                       OR (analysis_flights.state = 'done'
+                           AND analysis_flights.finished_at < CURRENT_TIMESTAMP - make_interval(secs => %s))
+                    RETURNING flight_key
+                """, (key, self.worker_id, settings.SINGLE_FLIGHT_STALE_SECONDS, settings.SINGLE_FLIGHT_RESULT_TTL))
+                is_leader = cur.fetchone() is not None
+            conn.commit()
+            return is_leader
+        finally:
+            conn.close()
+
+    def _wait_for_leader(self, key: str):
+        """Poll for the leader's result; None if it failed or took too long"""
+        deadline = time.monotonic() + settings.SINGLE_FLIGHT_WAIT_SECONDS
+        conn = get_db_connection()
+        try:
+            while time.monotonic() < deadline:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        "SELECT state, result FROM analysis_flights WHERE flight_key = %s",
+                        (key,)
+                    )
+                    row = cur.fetchone()
+                conn.commit()
+                if row is None or row[0] == 'failed':
+                    return None
+                if row[0] == 'done':
+                    return row[1]
+                time.sleep(settings.SINGLE_FLIGHT_POLL_SECONDS)
+            return None
+        except Exception as e:
+            logger.warning(f"Error waiting for flight {key[:12]}: {str(e)}")
+            return None
+        finally:
+            conn.close()
+
+    def _finish(self, key: str, state: str, result):
+        try:
+            conn = get_db_connection()
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        UPDATE analysis_flights
+                        SET state = %s, result = %s, finished_at = CURRENT_TIMESTAMP
+                        WHERE flight_key = %s AND leader = %s
+                    """, (state, Json(result) if result is not None else None, key, self.worker_id))
+                    # Occasionally drop old flights so the table stays small
+                    if random.random() < 0.01:
+                        cur.execute("""
+                            DELETE FROM analysis_flights
+                            WHERE finished_at < CURRENT_TIMESTAMP - INTERVAL '1 day'
+                        """)
+                conn.commit()
+            finally:
+                conn.close()
+        except Exception as e:
+            logger.warning(f"Error recording flight {key[:12]}: {str(e)}")
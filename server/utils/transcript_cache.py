@@ -0,0 +1,148 @@
+# server\utils\transcript_cache.py
+import json
+import zlib
+import hashlib
+import logging
+from typing import Dict, Iterable, Optional, Set
+
+import psycopg2
+
+from config.db import get_db_connection
+from utils.read_transcript_from_yt import extract_video_id, get_transcript
+from utils.resilience import ResponseCache
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Only the default language is cached; other languages go straight to YouTube
+CACHED_LANGUAGE = 'en'
+
+# Hot transcripts are kept decoded in memory in front of the table
+_memory_cache = ResponseCache(max_size=64)
+
+
+def _compress(value) -> bytes:
+    return zlib.compress(json.dumps(value).encode('utf-8'), 6)
+
+
+def _decompress(value) -> object:
+    return json.loads(zlib.decompress(bytes(value)).decode('utf-8'))
+
+
+def transcript_etag(formatted_transcript: str) -> str:
+    return hashlib.sha256(formatted_transcript.encode('utf-8')).hexdigest()
+
+
+def load_cached_transcript(video_id: str) -> Optional[Dict]:
+    """Cached transcript in get_transcript's result format, or None"""
+    cached = _memory_cache.get(video_id)
+    if cached is not None:
+        return cached
+
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT language, segments_gz, formatted_gz, etag
+                FROM youtube_transcripts
+                WHERE video_id = %s AND formatted_gz IS NOT NULL
+            """, (video_id,))
+            row = cur.fetchone()
+    finally:
+        conn.close()
+
+    if row is None:
+        return None
+    language, segments_gz, formatted_gz, etag = row
+    result = {
+        'success': True,
+        'video_id': video_id,
+        'language': language,
+        'transcript': _decompress(segments_gz),
+        'formatted_transcript': _decompress(formatted_gz),
+        'etag': etag,
+    }
+    _memory_cache.put(video_id, result)
+    return result
+
+
+def store_transcript(url: Optional[str], result: Dict):
+    """Upsert a successful get_transcript result into youtube_transcripts"""
+    video_id = result['video_id']
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO youtube_transcripts
+                    (video_id, video_url, language, segments_gz, formatted_gz, etag)
+                VALUES (%s, %s, %s, %s, %s, %s)
+                ON CONFLICT (video_id) DO UPDATE SET
+                    language = EXCLUDED.language,
+                    segments_gz = EXCLUDED.segments_gz,
+                    formatted_gz = EXCLUDED.formatted_gz,
+                    etag = EXCLUDED.etag,
+                    updated_at = CURRENT_TIMESTAMP
+            """, (
+                video_id,
+                url or f"https://www.youtube.com/watch?v={video_id}",
+                result.get('language'),
+                psycopg2.Binary(_compress(result['transcript'])),
+                psycopg2.Binary(_compress(result['formatted_transcript'])),
+                result['etag'],
+            ))
+        conn.commit()
+    finally:
+        conn.close()
+    _memory_cache.put(video_id, result)
+
+
+def get_cached_transcript(url=None, video_id=None, language='en', refresh=False) -> Dict:
+    """
+    Read-through cache in front of read_transcript_from_yt.get_transcript.
+    Returns the same dict as get_transcript plus an 'etag' for successful results.
+    """
+    if url and not video_id:
+        video_id = extract_video_id(url)
+    if not video_id:
+        return {
+            'success': False,
+            'error': 'No valid video ID found'
+        }
+
+    use_cache = language == CACHED_LANGUAGE
+    if use_cache and not refresh:
+        try:
+            cached = load_cached_transcript(video_id)
+            if cached is not None:
+                return cached
+        except Exception as e:
+            # A cache failure should never block fetching the transcript
+            logger.warning(f"Transcript cache read failed for {video_id}: {str(e)}")
+
+    result = get_transcript(video_id=video_id, language=language)
+    if not result['success']:
+        return result
+
+    result['etag'] = transcript_etag(result['formatted_transcript'])
+    if use_cache:
+        try:
+            store_transcript(url, result)
+        except Exception as e:
+            logger.warning(f"Transcript cache write failed for {video_id}: {str(e)}")
+    return result
+
+
+def cached_video_ids(video_ids: Iterable[str]) -> Set[str]:
+    """Subset of video_ids that already have a cached transcript"""
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT video_id
+                FROM youtube_transcripts
+                WHERE video_id = ANY(%s) AND formatted_gz IS NOT NULL
+            """, (list(video_ids),))
+            return {row[0] for row in cur.fetchall()}
+    finally:
+        conn.close()
@@ -0,0 +1,151 @@
+# server\utils\transcript_segmenter.py
+import re
+import logging
+from typing import Any, Dict, List, Optional, Sequence
+
+from utils.card_features import mentions_cards, parse_cards
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Cheap local pre-processing ahead of Claude extraction: split a video's
+# transcript segments into one span per hand and drop intro/outro chatter, so
+# each hand is extracted on its own from a much smaller prompt.
+
+# Phrases that name a new hand, and always open one
+HAND_START_PATTERN = re.compile(
+    r"\b(?:next hand|first hand|second hand|third hand|fourth hand|fifth hand|last hand|final hand"
+    r"|another hand|new hand|one more hand"
+    r"|hand (?:number|#)\s*\w+|hand (?:one|two|three|four|five|six|seven|eight|nine|ten|\d+)\b"
+    r"|let'?s (?:get|go|jump|dive) (?:in)?to (?:the|a|this|our) (?:next |first )?hand)",
+    re.IGNORECASE
+)
+# Transitions that may open a new hand, but are just as often said between
+# streets ("moving on to the turn"): like a caption gap, they only start a
+# new hand when what follows names cards the hand before didn't
+SOFT_START_PATTERN = re.compile(
+    r"\b(?:moving on|on to the next|next up)\b"
+    r"(?!\s+(?:to\s+)?(?:the\s+)?(?:pre-?flop|flop|turn|river|showdown|street|card|action)\b)",
+    re.IGNORECASE
+)
+# Channel chatter that's never part of a hand
+FILLER_PATTERN = re.compile(
+    r"\b(?:subscribe|subscribed|patreon|like (?:and|&) (?:sub|comment)|smash (?:that|the) like"
+    r"|thanks? (?:you )?(?:so much )?for watching|see you (?:next time|guys|in the next)"
+    r"|links? (?:is |are )?in the description|description below|sponsor(?:ed)?|merch"
+    r"|discount code|promo code|use code|welcome back|hey (?:guys|everybody|everyone)"
+    r"|what'?s up (?:guys|everybody|everyone)|notification bell|comment below)\b",
+    re.IGNORECASE
+)
+# Vocabulary that marks a line as being about the hand
+POKER_PATTERN = re.compile(
+    r"\b(?:pre-?flop|flop|turn|river|board|raise[sd]?|raising|re-?raise[sd]?|(?:3|4|three|four)-?bet"
+    r"|call(?:s|ed|ing)?|check(?:s|ed|ing)?|bet(?:s|ting)?|fold(?:s|ed)?|all[- ]in|shove[sd]?|jam(?:s|med)?"
+    r"|pot|blinds?|straddle|button|cutoff|hijack|lojack|utg|under the gun|stack|effective|villain"
+    r"|limp(?:s|ed)?|open(?:s|ed)? (?:to|for)|pocket \w+|suited|offsuit|stakes)\b"
+    r"|\$\d+|\b\d+\s*/\s*\d+\b",
+    re.IGNORECASE
+)
+
+# A new span also starts after this much silence between caption segments
+# (often an edit cut between hands)
+GAP_SECONDS = 20.0
+# Spans with fewer hand-related lines than this are chatter: folded into the
+# hand before them, or dropped if no hand came before
+MIN_POKER_LINES = 3
+
+
+def _is_poker(text: str) -> bool:
+    return bool(POKER_PATTERN.search(text)) or mentions_cards(text)
+
+
+def _is_filler(text: str) -> bool:
+    return bool(FILLER_PATTERN.search(text)) and not _is_poker(text)
+
+
+def text_segments(transcript_text: str) -> List[Dict[str, Any]]:
+    """Caption-like segments from formatted transcript text (one per line, no timestamps)"""
+    return [{'text': line, 'start': None, 'duration': None} for line in transcript_text.splitlines() if line.strip()]
+
+
+def _span(lines: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    start = lines[0].get('start')
+    last = lines[-1]
+    end = last['start'] + (last.get('duration') or 0) if last.get('start') is not None else None
+    return {
+        'start': start,
+        'end': end,
+        'text': '\n'.join(line['text'].strip() for line in lines),
+    }
+
+
+def segment_hands(segments: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Split transcript segments ({text, start, duration} as returned by
+    get_transcript) into hands: [{start, end, text}] in video order.
+    Boundaries are phrases naming a hand, and long caption gaps or soft
+    transitions followed by cards not yet seen in the hand. Filler lines
+    and the lead-in before each hand are dropped; a short span after a hand
+    is kept with it as commentary.
+    A transcript with no detectable hand comes back whole, minus filler, so
+    extraction never sees less than the old single-prompt path would.
+    """
+    lines = [segment for segment in segments if (segment.get('text') or '').strip()]
+    if not lines:
+        return []
+
+    # (lines, opened by a phrase naming a hand rather than a gap or soft cue)
+    spans, current, cued, previous_end = [], [], True, None
+    for line in lines:
+        start = line.get('start')
+        gap = start is not None and previous_end is not None and start - previous_end > GAP_SECONDS
+        cue = bool(HAND_START_PATTERN.search(line['text']))
+        if current and (gap or cue or SOFT_START_PATTERN.search(line['text'])):
+            spans.append((current, cued))
+            current, cued = [], cue
+        if start is not None:
+            previous_end = start + (line.get('duration') or 0)
+        if not _is_filler(line['text']):
+            current.append(line)
+    if current:
+        spans.append((current, cued))
+
+    hands = []
+    for span, cued in spans:
+        is_hand = sum(1 for line in span if _is_poker(line['text'])) >= MIN_POKER_LINES
+        if is_hand and hands and not cued:
+            # A pause or "moving on" mid-hand is common; only a span naming
+            # cards the hand before hasn't starts a new hand
+            seen = set(parse_cards('\n'.join(line['text'] for line in hands[-1])))
+            is_hand = any(set(parse_cards(line['text'])) - seen for line in span)
+        if is_hand:
+            # Lead-in before the first hand-related line is chatter
+            while not _is_poker(span[0]['text']):
+                span = span[1:]
+            hands.append(span)
+        elif hands:
+            hands[-1] = hands[-1] + span
+
+    if not hands:
+        kept = [line for line in lines if not _is_filler(line['text'])] or lines
+        return [_span(kept)]
+    return [_span(span) for span in hands]
+
+
+def trimmed_fraction(segments: Sequence[Dict[str, Any]], hands: Sequence[Dict[str, Any]]) -> float:
+    """Share of the transcript's characters that segmentation left out"""
+    total = sum(len(segment.get('text') or '') for segment in segments)
+    kept = sum(len(hand['text']) for hand in hands)
+    return round(max(0.0, 1 - kept / total), 3) if total else 0.0
+
+
+def find_hand(segments: Sequence[Dict[str, Any]], start: Optional[float]) -> Optional[Dict[str, Any]]:
+    """The hand segment_hands finds at start seconds, or the only hand if start is None"""
+    hands = segment_hands(segments)
+    if start is None:
+        return hands[0] if len(hands) == 1 else None
+    for hand in hands:
+        if hand['start'] is not None and abs(hand['start'] - start) < 0.01:
+            return hand
+    return None
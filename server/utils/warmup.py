@@ -0,0 +1,165 @@
+# server\utils\warmup.py
+import os
+import time
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+from config import settings
+from config.db import get_db_connection, get_pool
+from utils.corpus_feed import start_corpus_feed
+from utils.embedding_partitions import search_index
+from utils.embedding_versions import active_version
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+WARMUP_QUERY = "Ace of Spades and King of Spades on the button at 2/5"
+
+_lock = threading.Lock()
+_state: Dict[str, Any] = {'pid': None, 'status': 'cold', 'steps': {}, 'started_at': None, 'finished_at': None}
+
+
+def _step(name: str, fn, required: bool = False):
+    """Run one warm-up step, recording its duration and outcome"""
+    start = time.monotonic()
+    try:
+        detail = fn()
+        _state['steps'][name] = {'ok': True, 'seconds': round(time.monotonic() - start, 3), 'detail': detail}
+        return detail
+    except Exception as e:
+        _state['steps'][name] = {'ok': False, 'seconds': round(time.monotonic() - start, 3), 'error': str(e)}
+        log = logger.error if required else logger.warning
+        log(f"Warm-up step '{name}' failed: {str(e)}")
+        if required:
+            raise
+        return None
+
+
+def _open_pool():
+    """Check out and return DB_POOL_MIN connections so they're open before traffic"""
+    get_pool()
+    connections = []
+    try:
+        for _ in range(max(settings.DB_POOL_MIN, 1)):
+            connections.append(get_db_connection())
+            with connections[-1].cursor() as cur:
+                cur.execute("SELECT 1")
+    finally:
+        for conn in connections:
+            conn.close()
+    return f"{len(connections)} connections"
+
+
+def _warm_claude():
+    from controllers.analysis_controller import get_claude_service
+    get_claude_service().warm_up()
+
+
+def _warm_voyage() -> Optional[List[float]]:
+    """Embed a representative query; also returns a real vector for the probe"""
+    from controllers.analysis_controller import get_query_processor
+    embeddings = get_query_processor().embed_query(
+        WARMUP_QUERY, chunk_types=['situation'], model=active_version()['model']
+    )
+    return (embeddings or {}).get('situation')
+
+
+def _vector_probe(query_vector: Optional[List[float]]):
+    """One nearest-neighbour search to pull vector index pages into cache"""
+    from controllers.analysis_controller import get_similar_hands
+    version = active_version()
+    if query_vector is None:
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "SELECT embedding::text FROM hand_embeddings WHERE embedding_version = %s LIMIT 1",
+                    (version['id'],)
+                )
+                row = cur.fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return 'no embeddings to probe'
+        query_vector = row[0]
+    hands = get_similar_hands(query_vector, version['id'], num_results=5)
+    return f"{len(hands)} hands"
+
+
+def _pg_prewarm():
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            # Only the index the query path searches
+            index = search_index(cur, settings.SEARCH_EMBEDDING_TYPE, active_version()['id'])
+            if index is None:
+                return 'no vector index to prewarm'
+            cur.execute("SELECT pg_prewarm(%s)", (index,))
+            blocks = cur.fetchone()[0]
+        conn.commit()
+        return f"{index}: {blocks} blocks"
+    finally:
+        conn.close()
+
+
+def warm_up():
+    """
+    Get a fresh worker ready for traffic: open the DB pool, start the corpus
+    change feed, open keep-alive connections to Anthropic and Voyage, and run
+    a vector search (optionally pg_prewarm-ing the index). Only a DB failure
+    leaves the worker not ready; provider failures are logged and handled per
+    request by the breakers.
+    """
+    _state['status'] = 'warming'
+    _state['started_at'] = time.time()
+    try:
+        _step('db_pool', _open_pool, required=True)
+        if settings.CORPUS_FEED_ENABLED:
+            _step('corpus_feed', start_corpus_feed)
+        query_vector = None
+        if settings.WARMUP_PROVIDERS:
+            _step('anthropic', _warm_claude)
+            query_vector = _step('voyage', _warm_voyage)
+            if query_vector is not None:
+                _state['steps']['voyage']['detail'] = f"{len(query_vector)} dimensions"
+        if settings.WARMUP_PG_PREWARM:
+            _step('pg_prewarm', _pg_prewarm)
+        _step('vector_probe', lambda: _vector_probe(query_vector), required=True)
+        _state['status'] = 'ready'
+    except Exception:
+        _state['status'] = 'failed'
+    finally:
+        _state['finished_at'] = time.time()
+        elapsed = _state['finished_at'] - _state['started_at']
+        logger.info(f"Worker {os.getpid()} warm-up {_state['status']} in {elapsed:.2f}s: {_state['steps']}")
+
+
+def start_warm_up(retry_failed: bool = False) -> bool:
+    """
+    Start warm-up in a background thread once per process (again after a
+    failure if retry_failed). Returns True if a warm-up was started.
+    """
+    with _lock:
+        pid = os.getpid()
+        if _state['pid'] == pid and not (retry_failed and _state['status'] == 'failed'):
+            return False
+        _state.update({'pid': pid, 'status': 'warming', 'steps': {}, 'started_at': None, 'finished_at': None})
+    threading.Thread(target=warm_up, name='worker-warm-up', daemon=True).start()
+    return True
+
+
+def readiness() -> Dict[str, Any]:
+    """Warm-up status for the readiness endpoint"""
+    if _state['pid'] != os.getpid():
+        # Not started by the gunicorn hook (e.g. the Flask dev server)
+        start_warm_up()
+    else:
+        start_warm_up(retry_failed=True)
+    return {
+        'ready': _state['status'] == 'ready',
+        'status': _state['status'],
+        'pid': os.getpid(),
+        'steps': dict(_state['steps']),
+    }